@@ -12,7 +12,7 @@ from typing import Awaitable
 import shlex
 import ast
 from .agent_manager import AgentManager
-from .file_system_manager import FileSystemManager
+from .file_system_manager import FileSystemManager, FileWriteEvent
 from .command_executor import CommandExecutor
 from .memory_manager import MemoryManager
 from .code_intelligence_service import CodeIntelligenceService
@@ -263,9 +263,11 @@ class AdaptiveAgent:
             self.logger.info(
                 f"CASE Agent: Step {step_num + 1}/{max_steps} for feature '{feature_description[:50]}...'"
             )
-            # Create a snapshot at the start of the loop. This captures the state
-            # that a subsequent ROLLBACK action will revert to.
-            last_known_good_snapshot = await self.file_system_manager.create_snapshot()
+            # In snapshot mode, create a snapshot at the start of the loop. This captures
+            # the state that a subsequent ROLLBACK action will revert to. In journal mode,
+            # `_execute_action` opens a journal checkpoint instead.
+            if not self._uses_journal_rollback():
+                last_known_good_snapshot = await self.file_system_manager.create_snapshot()
 
             framework_rules_str, code_context_str, work_history_str, content_availability_note = await self.context_manager.get_context_for_prompt()
 
@@ -441,7 +443,14 @@ class AdaptiveAgent:
                     raise RuntimeError(f"Feature failed after {rollback_count} rollbacks, indicating a persistent strategic error.")
 
                 self.logger.warning("CASE agent initiated a ROLLBACK action.")
-                if not last_known_good_snapshot:
+                if self._uses_journal_rollback():
+                    reverted_files = await asyncio.to_thread(self.file_system_manager.rollback_last_checkpoint)
+                    if not reverted_files:
+                        self.context_manager.add_work_history(f"Action: {action}, Result: FAILED. The previous action made no file changes to revert.")
+                    else:
+                        self.context_manager.add_work_history(f"Action: {action}, Reason: {rollback_reason}, Result: Reverted {len(reverted_files)} file(s) changed by the previous action: {reverted_files[:5]}.")
+                        self.logger.info("Rollback complete. Proceeding to the next step with the restored state.")
+                elif not last_known_good_snapshot:
                     self.context_manager.add_work_history(f"Action: {action}, Result: FAILED. No previous state snapshot was available.")
                 else:
                     await self.file_system_manager.write_snapshot(last_known_good_snapshot) # type: ignore
@@ -702,15 +711,26 @@ class AdaptiveAgent:
                 except Exception as e:
                     self.logger.warning(f"Could not preload configuration file '{filepath}': {e}")
 
+    def _uses_journal_rollback(self) -> bool:
+        """True if the file system manager undoes actions via its rollback journal."""
+        return getattr(self.file_system_manager, "rollback_mode", None) == "journal"
+
     async def _execute_action(
         self, action: str, params: dict, modified_files_set: set[str]
     ) -> tuple[str, str | None]:
         """Executes a single action decided by the LLM."""
         modified_path = None
-        # --- NEW: Create a snapshot before file operations for rollback consistency ---
-        # This snapshot is used for the diff view in the UI after a successful patch.
-        last_known_good_snapshot = await self.file_system_manager.create_snapshot()
-        self.logger.debug("Created pre-action snapshot for potential rollback.")
+        # --- NEW: Record the pre-action state for rollback consistency ---
+        # In journal mode, a checkpoint collects the pre-image of every file this action
+        # touches; otherwise a snapshot is taken. Either one provides the original
+        # content for the diff view in the UI after a successful patch.
+        last_known_good_snapshot: Dict[str, Any] = {}
+        if self._uses_journal_rollback():
+            self.file_system_manager.begin_checkpoint(f"{action}:{params.get('file_path') or params.get('command') or ''}")
+            self.logger.debug("Started journal checkpoint for potential rollback.")
+        else:
+            last_known_good_snapshot = await self.file_system_manager.create_snapshot()
+            self.logger.debug("Created pre-action snapshot for potential rollback.")
 
         if action == "WRITE_FILE":
             file_path: str = params["file_path"]
@@ -730,13 +750,13 @@ class AdaptiveAgent:
 
             processed_content = await self._handle_placeholders_in_code(content)
 
-            self.file_system_manager.write_file(file_path, processed_content)
+            write_event = self.file_system_manager.write_file(file_path, processed_content)
             # After writing the file, update our understanding of the project state.
             if file_path.endswith("models.py"):
                 await self._update_defined_models_from_content(file_path, processed_content)
             elif "settings.py" in file_path: # type: ignore
                 await self._update_registered_apps_from_content(file_path, processed_content)
-            await self._update_project_structure_map(file_path, processed_content) # This was the missing await
+            await self._update_project_structure_map(file_path, processed_content, write_event=write_event) # This was the missing await
             modified_path = file_path
             return f"Successfully wrote to file {file_path}", modified_path
         elif action == "PATCH_FILE":
@@ -759,30 +779,39 @@ class AdaptiveAgent:
                 self.file_system_manager.apply_patch, file_path, patch_content
             )
 
-            # --- FIX: Send diff data to UI, whether from strict or fuzzy patch ---
-            # If patch_result is None, it means a strict patch was successful but didn't return data.
-            # We construct the diff data manually. If it's a dict, it came from a successful fuzzy patch.
+            # --- FIX: Send diff data to UI, whatever strategy applied the patch ---
+            # Every patch strategy (SEARCH/REPLACE, strict and fuzzy unified diff) returns the
+            # original and modified content along with its `write_event`. The diff is only
+            # rebuilt from disk if a patch ever reports success without that data.
             if patch_result and isinstance(patch_result, dict):
                 diff_data = patch_result
-                self.logger.info(f"Received diff data from successful fuzzy patch for '{file_path}'.")
+                self.logger.info(f"Received diff data from the patch engine for '{file_path}'.")
             else:
-                # This path is taken for successful strict patches which don't return data.
-                self.logger.info(f"Constructing diff data manually for successful strict patch on '{file_path}'.")
+                self.logger.warning(f"Patch engine returned no diff data for '{file_path}'; reading it back from disk.")
                 diff_data = {
                     'filepath': file_path,
-                    'original_content': self.file_system_manager.read_file(file_path, from_snapshot=last_known_good_snapshot),
+                    'original_content': (
+                        self.file_system_manager.get_pre_image_text(file_path)
+                        if self._uses_journal_rollback()
+                        else self.file_system_manager.read_file(file_path, from_snapshot=last_known_good_snapshot)
+                    ),
                     'modified_content': self.file_system_manager.read_file(file_path)
                 }
 
+            # The patch engine's post-write event carries the new content, its hash and the
+            # module parsed while validating the patch, so nothing is read or parsed again.
+            write_event = diff_data.pop('write_event', None)
             if diff_data:
                 self.progress_callback({'display_code_diff': True, **diff_data})
 
             # After patching, update our understanding of the project state.
+            if isinstance(write_event, FileWriteEvent):
+                updated_content, updated_hash = write_event.content, write_event.sha256
+            else:
+                updated_content, updated_hash = self.file_system_manager.read_file_with_hash(file_path)
             if "settings.py" in file_path:
-                updated_content = self.file_system_manager.read_file(file_path)
                 await self._update_registered_apps_from_content(file_path, updated_content) # type: ignore
-            updated_content = self.file_system_manager.read_file(file_path)
-            await self._update_project_structure_map(file_path, updated_content)
+            await self._update_project_structure_map(file_path, updated_content, updated_hash, write_event=write_event)
             modified_path = file_path
             return f"Successfully patched file {file_path}", modified_path
         elif action == "GET_FULL_FILE_CONTENT":
@@ -818,18 +847,11 @@ class AdaptiveAgent:
                 full_command_str = command_base
             processed_command = await self._handle_placeholders_in_code(full_command_str)
 
-            # To detect new files created by commands (e.g., `manage.py startapp`),
-            # we get a snapshot of the file system before and after execution.
-            excluded_dirs = {"venv", ".venv", "node_modules", ".git", "__pycache__", ".vebgen"}
-            
-            def get_project_files():
-                files = set()
-                for p in self.file_system_manager.project_root.rglob("*"):
-                    if p.is_file() and not any(part in excluded_dirs for part in p.parts):
-                        files.add(p.relative_to(self.file_system_manager.project_root).as_posix())
-                return files
-
-            files_before = get_project_files()
+            # To detect files created or changed by commands (e.g., `manage.py startapp`),
+            # bring the file index up to date now; the refresh after the command then
+            # reports exactly what the command did, re-listing only changed directories.
+            file_index = self.file_system_manager.file_index
+            file_index.refresh()
 
             command_to_run: str
             if isinstance(processed_command, list):
@@ -869,8 +891,21 @@ class AdaptiveAgent:
                     f"Command '{processed_command}' failed with exit code {result['exit_code']}. Error: {error_summary}"
                 )
 
-            files_after = get_project_files()
-            newly_found_files = list(files_after - files_before)
+            command_changes = file_index.refresh()
+            newly_found_files = sorted(command_changes.created)
+            if command_changes.modified or command_changes.deleted:
+                self.logger.info(
+                    f"Command modified {len(command_changes.modified)} and removed {len(command_changes.deleted)} existing file(s)."
+                )
+            # Deleted or moved-away files and directories must not linger in the parse cache.
+            for removed_dir in command_changes.deleted_dirs:
+                self.code_intelligence_service.handle_directory_removed(removed_dir)
+            for removed_path in command_changes.deleted:
+                self.code_intelligence_service.handle_file_removed(removed_path)
+
+            if newly_found_files and self._uses_journal_rollback():
+                # Journal the created files so a ROLLBACK of this command removes them.
+                self.file_system_manager.record_created_files(newly_found_files)
 
             # --- BUG FIX: Add all new files to the set and return only the last one as the "primary" modification ---
             if newly_found_files:
@@ -880,15 +915,13 @@ class AdaptiveAgent:
                     # We update the checksum here, and the state is saved after
                     modified_files_set.add(file_path_str) # Add to the main set
                     # all new files have been processed.
-                    if self.project_state:
-                        file_hash = self.file_system_manager.get_file_hash(file_path_str)
-                        if file_hash:
-                            self.project_state.file_checksums[file_path_str] = file_hash
-                            self.logger.debug(f"Updated checksum for new file: {file_path_str}")
+                    content, file_hash = self.file_system_manager.read_file_with_hash(file_path_str)
+                    if self.project_state and file_hash:
+                        self.project_state.file_checksums[file_path_str] = file_hash
+                        self.logger.debug(f"Updated checksum for new file: {file_path_str}")
                     # --- END BUG FIX #11 --- # type: ignore
-                    content = self.file_system_manager.read_file(file_path_str)
                     self.logger.info(f"New file found: {file_path_str}. Analyzing...")
-                    await self._update_project_structure_map(file_path_str, content)
+                    await self._update_project_structure_map(file_path_str, content, file_hash)
                 
                 if newly_found_files:
                     modified_path = newly_found_files[-1] # Set last modified to the last new file found
@@ -968,14 +1001,29 @@ class AdaptiveAgent:
 
 
 
-    async def _update_project_structure_map(self, file_path_str: str, content: Optional[str] = None):
-        """Updates the project_structure_map in ProjectState after a file is modified."""
+    async def _update_project_structure_map(self, file_path_str: str, content: Optional[str] = None, file_hash: Optional[str] = None, write_event: Optional[FileWriteEvent] = None):
+        """
+        Updates the project_structure_map in ProjectState after a file is modified.
+
+        `content` and `file_hash` (the hash of the file's bytes, recorded as its
+        checksum) may be passed by callers that have just read the file, so it is
+        not read or hashed again. A `write_event` from the FileSystemManager
+        supersedes both and is handed to the code intelligence service as is,
+        together with the hash of its content and any module parsed by the patch engine.
+        """
+        if not isinstance(write_event, FileWriteEvent):
+            write_event = None
+        elif content is None or content == write_event.content:
+            content, file_hash = write_event.content, write_event.sha256
+        else:
+            write_event = None  # The caller's content differs from what was written.
         if not self.project_state or not self.code_intelligence_service:
             self.logger.warning("Cannot update structure map: ProjectState or CodeIntelligenceService not available.")
             return
 
         try:
-            content = self.file_system_manager.read_file(file_path_str)
+            if content is None:
+                content, file_hash = self.file_system_manager.read_file_with_hash(file_path_str)
             if content is None: # type: ignore
                 self.logger.warning(f"Cannot update structure map: File content for '{file_path_str}' is empty or could not be read.")
                 return
@@ -989,7 +1037,11 @@ class AdaptiveAgent:
                 self.memory_manager.save_project_state,
                 self.project_state
             )
-            parsed_file_info = self.code_intelligence_service.parse_file(file_path_str, content)
+            if write_event is not None:
+                parsed_file_info = self.code_intelligence_service.handle_file_written(write_event)
+            else:
+                # `file_hash` covers the bytes on disk, not `content`, so the service hashes the text itself.
+                parsed_file_info = self.code_intelligence_service.parse_file(file_path_str, content)
 
             if parsed_file_info:
                 # Determine app_name based on the file's path relative to project_root
@@ -1015,7 +1067,7 @@ class AdaptiveAgent:
                     self.memory_manager.save_project_state,
                     self.project_state
                 )
-                file_hash = self.file_system_manager.get_file_hash(file_path_str)
+                file_hash = file_hash or self.file_system_manager.get_file_hash(file_path_str)
                 if file_hash:
                     self.project_state.file_checksums[file_path_str] = file_hash
                 await asyncio.to_thread(
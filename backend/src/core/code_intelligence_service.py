@@ -3,8 +3,10 @@ from __future__ import annotations
 import logging
 from pathlib import Path
 from typing import Dict, Any, List, Optional, Tuple, Literal, Set
+import dataclasses
 import hashlib
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import multiprocessing
 import ast
 from collections import defaultdict
 import re
@@ -36,12 +38,24 @@ from .project_models import (
 from .project_models import CeleryBeatSchedule
 # --- NEW: Import performance monitoring decorator ---
 from .performance_monitor import time_function
+from .file_view import FileView
+from .file_system_manager import FileWriteEvent
+from .parse_cache import MemoryParseCache, ParseCache
 
 logger = logging.getLogger(__name__)
 
 # --- Constants for Crash Prevention ---
 MAX_FILE_SIZE_BYTES = 5 * 1024 * 1024  # 5 MB
 MAX_LINE_COUNT = 50000  # 50,000 lines
+# JSON documents larger than this are not fully decoded, so their validity is not reported.
+JSON_FULL_PARSE_MAX_BYTES = 2 * 1024 * 1024  # 2 MB
+
+# Stamps persisted parse results; bump it whenever the structure `parse_file` produces changes.
+PARSER_VERSION = "1"
+# Budget for the in-memory parse cache, in estimated bytes (see MemoryParseCache).
+PARSE_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 64 MB
+# Files shipped to a worker process at a time by `parse_files_in_parallel(use_processes=True)`.
+PARALLEL_PARSE_CHUNK_SIZE = 16
 
 # Common binary file extensions to skip parsing immediately
 BINARY_FILE_EXTENSIONS = {
@@ -54,6 +68,45 @@ BINARY_FILE_EXTENSIONS = {
     '.db', '.sqlite3', '.dat'
 }
 
+@dataclasses.dataclass
+class ParsedPythonModule:
+    """
+    A Python file parsed once by `parse_file` and shared by every extractor.
+
+    `classes` and `functions` index the module's top-level definitions by name (the
+    first definition of a name wins). If the file does not parse, `tree` is an empty
+    module and `syntax_error` holds the error.
+    """
+    tree: ast.Module
+    classes: Dict[str, ast.ClassDef]
+    functions: Dict[str, ast.FunctionDef | ast.AsyncFunctionDef]
+    syntax_error: Optional[Exception] = None
+
+    @classmethod
+    def parse(cls, content: str, file_path_str: str, tree: Optional[ast.Module] = None) -> "ParsedPythonModule":
+        """Parses `content` (unless `tree` is already its parsed module) and indexes its definitions."""
+        syntax_error: Optional[Exception] = None
+        if tree is None:
+            try:
+                tree = ast.parse(content, filename=file_path_str)
+            except (SyntaxError, ValueError) as e:
+                tree, syntax_error = ast.Module(body=[], type_ignores=[]), e
+        classes: Dict[str, ast.ClassDef] = {}
+        functions: Dict[str, ast.FunctionDef | ast.AsyncFunctionDef] = {}
+        for node in tree.body:
+            if isinstance(node, ast.ClassDef):
+                classes.setdefault(node.name, node)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                functions.setdefault(node.name, node)
+        return cls(tree, classes, functions, syntax_error)
+
+    def checked_tree(self) -> ast.Module:
+        """Returns the tree, re-raising the parse error if the file did not parse."""
+        if self.syntax_error is not None:
+            raise self.syntax_error
+        return self.tree
+
+
 class CodeIntelligenceService:
     """
     Provides deep code analysis by parsing source files into structured data models.
@@ -64,12 +117,53 @@ class CodeIntelligenceService:
     as text. This enables highly precise and context-aware modifications. For other
     file types, it uses heuristics and regular expressions.
     """
-    def __init__(self, project_root: str | Path):
+    def __init__(self, project_root: str | Path, persistent_cache: bool = True, memory_cache_max_bytes: int = PARSE_CACHE_MAX_BYTES):
+        """
+        Args:
+            project_root: The root directory of the project being analyzed.
+            persistent_cache: Whether parse results are also kept under `.vebgen/parse_cache/`
+                              so they survive restarts.
+            memory_cache_max_bytes: The size budget of the in-memory parse cache.
+        """
         self.project_root = Path(project_root).resolve()
         logger.info(f"CodeIntelligenceService initialized for project root: {self.project_root}")
         # --- NEW: In-memory cache for incremental parsing ---
-        # Maps file_path -> (content_hash, parsed_data)
-        self.in_memory_cache: Dict[str, Tuple[str, Optional[FileStructureInfo]]] = {}
+        # Maps file_path -> (content_hash, parsed_data), evicting least recently used entries past its budget.
+        self.in_memory_cache = MemoryParseCache(memory_cache_max_bytes)
+        # Backs the in-memory cache across sessions, keyed by content hash and PARSER_VERSION.
+        self.parse_cache: Optional[ParseCache] = ParseCache(self.project_root, PARSER_VERSION) if persistent_cache else None
+        # Top-level packages of the project, with the project root's mtime they were listed at
+        # and a digest of the set (part of the cache key of Python files, see `_cache_key`).
+        self._project_apps: Optional[Set[str]] = None
+        self._project_apps_mtime_ns: Optional[int] = None
+        self._project_apps_digest: str = ""
+
+    def get_project_apps(self) -> Set[str]:
+        """
+        Returns the names of the project's top-level packages (directories with an `__init__.py`).
+
+        The listing is cached and rebuilt when the project root's modification time
+        changes (a top-level entry was added, removed or renamed) or after
+        `invalidate_project_apps`, so classifying an import is a set lookup rather
+        than a directory scan.
+        """
+        try:
+            root_mtime_ns = self.project_root.stat().st_mtime_ns
+        except OSError:
+            return set()
+        if self._project_apps is None or root_mtime_ns != self._project_apps_mtime_ns:
+            try:
+                self._project_apps = {p.name for p in self.project_root.iterdir() if p.is_dir() and (p / '__init__.py').exists()}
+            except OSError as e:
+                logger.warning(f"Could not list project apps in {self.project_root}: {e}")
+                return set()
+            self._project_apps_mtime_ns = root_mtime_ns
+            self._project_apps_digest = hashlib.sha256("\0".join(sorted(self._project_apps)).encode('utf-8')).hexdigest()[:16]
+        return self._project_apps
+
+    def invalidate_project_apps(self) -> None:
+        """Forces the next `get_project_apps` call to list the project root again."""
+        self._project_apps = None
 
     def run_static_checks(self, file_paths: List[str]) -> Tuple[bool, str]:
         """
@@ -106,14 +200,11 @@ class CodeIntelligenceService:
             if not full_path.is_file():
                 return "[File not found for summary]"
             
-            lines_read = []
-            truncated = False
-            with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
-                for i, line in enumerate(f):
-                    if i >= max_lines:
-                        truncated = True
-                        break
-                    lines_read.append(line)
+            # A memory-mapped view decodes only the lines we return, however large the file is.
+            with FileView(full_path) as view:
+                if view.is_binary:
+                    return f"[Binary file, {view.size} bytes]"
+                lines_read, truncated = view.head_lines(max_lines)
             summary = "".join(lines_read).strip()
             if truncated:
                 summary += "\n... [truncated]"
@@ -328,13 +419,13 @@ class CodeIntelligenceService:
         return items
 
 
-    def _determine_import_type(self, module_name: str, project_apps: Optional[List[str]] = None, level: int = 0) -> Literal["stdlib", "third_party", "local_app", "project_app", "unknown"]:
+    def _determine_import_type(self, module_name: str, project_apps: Optional[Set[str]] = None, level: int = 0) -> Literal["stdlib", "third_party", "local_app", "project_app", "unknown"]:
         """
         Classifies a Python import using heuristics (stdlib, third-party, local).
 
         Args:
             module_name: The name of the module being imported.
-            project_apps: A list of known Django app names in the project.
+            project_apps: The names of the project's Django apps (see `get_project_apps`).
 
         Returns:
             A literal string classifying the import type.
@@ -352,10 +443,9 @@ class CodeIntelligenceService:
 
         # Check for project apps (if provided)
         if project_apps:
-            # Exact match for project app
-            if module_name in project_apps:
+            # The app itself or a module inside it (e.g. `polls.models`).
+            if module_name.split('.', 1)[0] in project_apps:
                 return "project_app"
-            # Relative import within the same project app structure
         # Heuristic: If it's not stdlib and not a relative import, it's likely a third-party package.
         # This part is complex and often requires knowledge of the venv.
         # A simple heuristic: if it's not stdlib and doesn't start with '.', it might be third-party.
@@ -364,13 +454,14 @@ class CodeIntelligenceService:
 
         return "unknown"
     @time_function
-    def _parse_python_ast(self, content: str, file_path_str: str) -> Tuple[List[PythonFileImport], List[PythonFunction], List[PythonClass]]:
+    def _parse_python_ast(self, content: str, file_path_str: str, tree: Optional[ast.Module] = None) -> Tuple[List[PythonFileImport], List[PythonFunction], List[PythonClass]]:
         """
         Parses Python file content into its core components (imports, functions, classes) using AST.
 
         Args:
             content: The source code of the Python file.
             file_path_str: The path to the file (used for logging).
+            tree: An already parsed module for `content`, if the caller has one.
 
         Returns:
             A tuple containing lists of parsed imports, functions, and classes.
@@ -380,11 +471,13 @@ class CodeIntelligenceService:
         functions = []
         
         classes = []        
-        
+        project_apps = self.get_project_apps()
+
         try:
             # Ensure content is a string
             # The `ast` module parses the code into a tree of nodes.
-            tree = ast.parse(content, filename=file_path_str)
+            if tree is None:
+                tree = ast.parse(content, filename=file_path_str)
             # We iterate through the top-level nodes in the file's body.
             for node in tree.body:
                 if isinstance(node, ast.Import):
@@ -401,9 +494,7 @@ class CodeIntelligenceService:
                     for alias in node.names:
                         names_data.append({"name": alias.name, "as_name": alias.asname})
                     # Try to classify the import type (stdlib, third-party, local).
-                    # Simplified project_apps list for this context; ideally, it's passed in or discovered
-                    current_project_apps = [p.name for p in self.project_root.iterdir() if p.is_dir() and (p / '__init__.py').exists()]
-                    import_type = self._determine_import_type(node.module if node.module else "", project_apps=current_project_apps, level=level)
+                    import_type = self._determine_import_type(node.module if node.module else "", project_apps=project_apps, level=level)
                     imports.append(PythonFileImport(module=module_name, names=names_data, level=level, type=import_type))
                 elif isinstance(node, ast.FunctionDef):
                     # If it's a function, use our helper to extract its details.
@@ -691,9 +782,16 @@ class CodeIntelligenceService:
             An error message string if validation fails, otherwise None.
         """
         # 1. File Size Protection
-        file_size = len(content.encode('utf-8', errors='ignore'))
-        if file_size > MAX_FILE_SIZE_BYTES:
-            return f"File size ({file_size / 1024:.1f} KB) exceeds maximum of {MAX_FILE_SIZE_BYTES / 1024:.1f} KB."
+        # A character takes at most 4 bytes in UTF-8, so the content only has to be
+        # measured exactly when it is close to the limit; ASCII text is measured by length.
+        char_count = len(content)
+        if char_count * 4 > MAX_FILE_SIZE_BYTES:
+            if char_count > MAX_FILE_SIZE_BYTES or content.isascii():
+                file_size = char_count
+            else:
+                file_size = len(content.encode('utf-8', errors='ignore'))
+            if file_size > MAX_FILE_SIZE_BYTES:
+                return f"File size ({file_size / 1024:.1f} KB) exceeds maximum of {MAX_FILE_SIZE_BYTES / 1024:.1f} KB."
 
         # 2. Line Count Protection
         line_count = content.count('\n') + 1
@@ -719,6 +817,50 @@ class CodeIntelligenceService:
         # All checks passed
         return None
 
+    def _open_file_view(self, file_path_str: str, content: str) -> Optional[FileView]:
+        """
+        Opens a memory-mapped view of a project file, but only if the file on disk
+        can hold `content` (its byte size is between 1 and 4 bytes per character).
+        Returns None if the file is missing or evidently differs from `content`.
+        """
+        try:
+            full_path = (self.project_root / file_path_str).resolve()
+            if not full_path.is_file():
+                return None
+            view = FileView(full_path)
+        except OSError:
+            return None
+        if not (len(content) <= view.size <= 4 * len(content)):
+            view.close()
+            return None
+        return view
+
+    def _summarize_json_file(self, file_path_str: str, content: str) -> str:
+        """
+        Summarizes a JSON data file. Small documents are validated with `json.loads`;
+        large ones (fixtures, data dumps) are only checked for a matching outer
+        `{...}` / `[...]` via the head and tail of a file view, without decoding them,
+        and are reported as not validated rather than valid.
+        """
+        view = self._open_file_view(file_path_str, content)
+        try:
+            size_bytes = view.size if view else len(content)
+            if size_bytes > JSON_FULL_PARSE_MAX_BYTES:
+                head = (view.head(64) if view else content[:64]).lstrip()
+                tail = (view.tail(64) if view else content[-64:]).rstrip()
+                if (head[:1], tail[-1:]) in {("{", "}"), ("[", "]")}:
+                    return (f"JSON file, approx {size_bytes//1024}KB (structure not validated: "
+                            f"larger than the {JSON_FULL_PARSE_MAX_BYTES//1024}KB parse limit).")
+                return "Invalid JSON file."
+        finally:
+            if view:
+                view.close()
+        try:
+            json.loads(content)
+            return f"JSON data file, approx {size_bytes//1024}KB."
+        except json.JSONDecodeError:
+            return "Invalid JSON file."
+
     def _extract_summary_from_code(self, code_content: str) -> Optional[str]:
         """
         Extracts a special summary comment block from generated code.
@@ -731,12 +873,12 @@ class CodeIntelligenceService:
         return None
 
     @time_function
-    def _parse_django_migration_file(self, content: str, file_path_str: str) -> Optional[DjangoMigrationDetails]:
+    def _parse_django_migration_file(self, module: ParsedPythonModule, file_path_str: str) -> Optional[DjangoMigrationDetails]:
         """
         Parses a Django migration file to extract its dependencies and operations list.
         """
         try:
-            tree = ast.parse(content, filename=file_path_str)
+            tree = module.checked_tree()
             dependencies: List[Tuple[str, str]] = []
             operations: List[DjangoMigrationOperation] = []
 
@@ -824,10 +966,10 @@ class CodeIntelligenceService:
         )
 
     @time_function
-    def _parse_django_templatetag_file(self, content: str, file_path_str: str) -> Optional[DjangoTemplateTagFileDetails]:
+    def _parse_django_templatetag_file(self, module: ParsedPythonModule, file_path_str: str) -> Optional[DjangoTemplateTagFileDetails]:
         """Parses a Django templatetags file to find custom tags and filters."""
         try:
-            tree = ast.parse(content, filename=file_path_str)
+            tree = module.checked_tree()
             tags_and_filters: List[DjangoTemplateTag] = []
 
             for node in ast.walk(tree):
@@ -863,10 +1005,10 @@ class CodeIntelligenceService:
             return None
 
     @time_function
-    def _parse_django_signal_file(self, content: str, file_path_str: str, functions: List[PythonFunction]) -> Optional[DjangoSignalFileDetails]:
+    def _parse_django_signal_file(self, module: ParsedPythonModule, file_path_str: str, functions: List[PythonFunction]) -> Optional[DjangoSignalFileDetails]:
         """Parses a signals.py file to find @receiver decorators."""
         try:
-            tree = ast.parse(content, filename=file_path_str)
+            tree = module.checked_tree()
             receivers: List[DjangoSignalReceiver] = []
 
             for func_def_node in ast.walk(tree):
@@ -901,10 +1043,10 @@ class CodeIntelligenceService:
             return None
 
     @time_function
-    def _parse_celery_task_file(self, content: str, file_path_str: str, functions: List[PythonFunction]) -> Optional[CeleryTaskFileDetails]:
+    def _parse_celery_task_file(self, module: ParsedPythonModule, file_path_str: str, functions: List[PythonFunction]) -> Optional[CeleryTaskFileDetails]:
         """Parses a tasks.py file to find Celery tasks."""
         try:
-            tree = ast.parse(content, filename=file_path_str)
+            tree = module.checked_tree()
             celery_tasks: List[CeleryTask] = []
             
             # --- NEW: Helper to check for self.retry() in a function body ---
@@ -943,10 +1085,10 @@ class CodeIntelligenceService:
             return None
 
     @time_function
-    def _parse_graphql_schema_file(self, content: str, file_path_str: str, classes: List[PythonClass]) -> Optional[GraphQLSchemaDetails]:
+    def _parse_graphql_schema_file(self, module: ParsedPythonModule, file_path_str: str, classes: List[PythonClass]) -> Optional[GraphQLSchemaDetails]:
         """Parses a graphene-django schema.py file."""
         try:
-            tree = ast.parse(content, filename=file_path_str)
+            module.checked_tree()
             queries: List[GraphQLType] = []
             mutations: List[GraphQLType] = []
             object_types: List[GraphQLType] = []
@@ -959,7 +1101,7 @@ class CodeIntelligenceService:
                 if not (is_query or is_mutation or is_object_type):
                     continue # Not a Graphene class, skip
 
-                class_ast_node = next((n for n in ast.walk(tree) if isinstance(n, ast.ClassDef) and n.name == cls_obj.name), None)
+                class_ast_node = module.classes.get(cls_obj.name)
                 if not class_ast_node:
                     continue
 
@@ -990,26 +1132,59 @@ class CodeIntelligenceService:
             logger.warning(f"Could not parse GraphQL schema file {file_path_str}: {e}")
             return None
 
+    def handle_file_written(self, event: FileWriteEvent) -> Optional[FileStructureInfo]:
+        """
+        Post-write hook: parses a file the FileSystemManager has just written, using
+        the content, hash and (for patched Python files) the parsed module carried by
+        the event, so the file is neither read nor hashed nor parsed again.
+        """
+        return self.parse_file(event.path, event.content, tree=event.parsed_ast, content_hash=event.content_sha256)
+
+    def handle_file_removed(self, file_path_str: str) -> None:
+        """Post-delete hook: forgets the cached parse of a deleted (or renamed-away) file."""
+        self.in_memory_cache.invalidate(file_path_str)
+        if self.parse_cache is not None:
+            self.parse_cache.discard(file_path_str)
+        file_parts = Path(file_path_str).parts
+        if len(file_parts) == 2 and file_parts[1] == "__init__.py":
+            self.invalidate_project_apps()
+
+    def handle_directory_removed(self, dir_path_str: str) -> None:
+        """Post-delete hook: forgets the cached parses of every file under a deleted (or renamed-away) directory."""
+        dropped = self.in_memory_cache.invalidate_prefix(dir_path_str)
+        if dropped:
+            logger.debug(f"Dropped {dropped} cached parse result(s) under removed directory '{dir_path_str}'.")
+        if len(Path(dir_path_str).parts) == 1:
+            self.invalidate_project_apps()
+
     @time_function
-    def parse_file(self, file_path_str: str, content: str) -> Optional[FileStructureInfo]:
+    def parse_file(self, file_path_str: str, content: str, tree: Optional[ast.Module] = None, content_hash: Optional[str] = None) -> Optional[FileStructureInfo]:
         """
         The main dispatcher method. It analyzes a file's content and routes it to the
         appropriate specialized parser based on its name and content, returning a
         structured `FileStructureInfo` object.
+
+        `tree` may be passed for Python files that the caller has already parsed
+        (e.g. the patch engine's syntax validation), so they are not parsed again.
+        `content_hash` may be passed by callers that already know the SHA256 of
+        `content.encode('utf-8')`, so the content is not hashed again for the cache
+        lookup. It must be the hash of this exact text, not of the file's bytes on
+        disk (which may differ in line endings or encoding).
         """
+        # A new top-level `__init__.py` turns its directory into a project app without touching the root's mtime.
+        file_parts = Path(file_path_str).parts
+        if len(file_parts) == 2 and file_parts[1] == "__init__.py":
+            self.invalidate_project_apps()
+
         # --- NEW: Incremental Cache Logic ---
         try:
-            content_hash = "" # Initialize to prevent UnboundLocalError
-            # 1. Calculate the hash of the file content.
-            content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+            # 1. Calculate the hash of the file content (unless the caller already has it).
+            content_hash = content_hash or hashlib.sha256(content.encode('utf-8')).hexdigest()
 
             # 2. Check for a cache hit.
-            if file_path_str in self.in_memory_cache:
-                cached_hash, cached_data = self.in_memory_cache[file_path_str]
-                if cached_hash == content_hash:
-                    logger.debug(f"Cache hit for '{file_path_str}'. Skipping re-parsing.")
-                    return cached_data
-            logger.debug(f"Cache miss for '{file_path_str}'. Proceeding with full parse.")
+            found, cached_data = self._lookup_cached_result(file_path_str, content_hash, len(content))
+            if found:
+                return cached_data
         except Exception as e:
             logger.error(f"Error during cache check for '{file_path_str}': {e}. Parsing file directly.")
         # --- END: Incremental Cache Logic ---
@@ -1023,7 +1198,7 @@ class CodeIntelligenceService:
             # Create the info object and immediately return it, also caching the "skipped" result.
             skipped_info = FileStructureInfo(file_type="unknown", raw_content_summary=f"Skipped: {validation_error}")
             if content_hash: # Only cache if hash was calculated
-                self.in_memory_cache[file_path_str] = (content_hash, skipped_info)
+                self._cache_result(file_path_str, content_hash, skipped_info, len(content))
             return skipped_info
 
         # This is the main dispatcher method for the service.
@@ -1039,8 +1214,11 @@ class CodeIntelligenceService:
 
         # --- Python File Parsing Logic ---
         if filename.endswith(".py"): # type: ignore
-            # First, perform a general AST parse for any Python file.
-            imports, functions, classes = self._parse_python_ast(content, file_path_str)
+            # Parse the file once; every extractor below works on this tree and its definition index.
+            py_module = ParsedPythonModule.parse(content, file_path_str, tree)
+            if py_module.syntax_error is not None:
+                logger.warning(f"Syntax error parsing Python file {file_path_str}: {py_module.syntax_error}")
+            imports, functions, classes = self._parse_python_ast(content, file_path_str, py_module.tree)
             py_details = PythonFileDetails(imports=imports, functions=functions, classes=classes)
             file_info.python_details = py_details # Default to python
             file_info.file_type = "python"
@@ -1061,18 +1239,18 @@ class CodeIntelligenceService:
             # --- Django Migration File Parsing ---
             if "migrations" in file_path.parts and not filename.startswith("__init__"): # type: ignore
                 file_info.file_type = "django_migration"
-                file_info.django_migration_details = self._parse_django_migration_file(content, file_path_str)
+                file_info.django_migration_details = self._parse_django_migration_file(py_module, file_path_str)
                 # Continue to parse Python details as well
             
             # --- Django Template Tag File Parsing ---
             if "templatetags" in file_path.parts and not filename.startswith("__init__"):
                 file_info.file_type = "django_templatetag"
-                file_info.django_templatetag_details = self._parse_django_templatetag_file(content, file_path_str)
+                file_info.django_templatetag_details = self._parse_django_templatetag_file(py_module, file_path_str)
             
             # --- Celery Task File Parsing ---
             if filename.startswith("tasks") and filename.endswith(".py"): # type: ignore
                 file_info.file_type = "celery_task"
-                file_info.celery_task_details = self._parse_celery_task_file(content, file_path_str, functions)
+                file_info.celery_task_details = self._parse_celery_task_file(py_module, file_path_str, functions)
 
             # --- Django-Specific Python File Parsing ---
             # --- FIX: More robust detection of model files ---
@@ -1090,7 +1268,7 @@ class CodeIntelligenceService:
                     is_cms_plugin = any(any(f"{alias}.CMSPlugin" in base for alias in cms_aliases) for base in cls.bases)
 
                     if is_django_model or is_mptt_model or is_wagtail_page or is_cms_plugin:
-                        class_ast_node = next((n for n in ast.parse(content).body if isinstance(n, ast.ClassDef) and n.name == cls.name), None)
+                        class_ast_node = py_module.classes.get(cls.name)
                         if class_ast_node:
                             model_fields_extracted, meta_options_extracted = self._parse_django_model_fields(class_ast_node, model_aliases, imports)
                             
@@ -1144,7 +1322,7 @@ class CodeIntelligenceService:
 
                 # --- Parse Function-Based Views (FBVs) ---
                 for func_node in functions: # PythonFunction objects
-                    func_ast_node = next((n for n in ast.parse(content).body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef)) and n.name == func_node.name), None)
+                    func_ast_node = py_module.functions.get(func_node.name)
                     if func_ast_node:
                         analysis_results = self._analyze_django_view_method_body(func_ast_node, content, model_managers, form_aliases)
                         
@@ -1190,9 +1368,9 @@ class CodeIntelligenceService:
                         cbv_aggregations: List[str] = []
 
                         # Analyze specific CBV methods
+                        class_ast_node = py_module.classes.get(cls_node.name)
                         for method_py_obj in cls_node.methods:
                             # Get the actual AST node for the method to walk its body
-                            class_ast_node = next((n for n in ast.parse(content).body if isinstance(n, ast.ClassDef) and n.name == cls_node.name), None)
                             if class_ast_node:
                                 method_ast_node = next((n for n in class_ast_node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef)) and n.name == method_py_obj.name), None)
                                 if method_ast_node:
@@ -1250,8 +1428,7 @@ class CodeIntelligenceService:
                 file_info.file_type = "django_serializer" # type: ignore
                 django_serializers: List[DjangoSerializer] = []
                 try:
-                    tree = ast.parse(content)
-                    for node in tree.body:
+                    for node in py_module.tree.body:
                         if isinstance(node, ast.ClassDef) and any("Serializer" in base for base in [ast.unparse(b) for b in node.bases]):
                             serializer_details = self._parse_django_serializer_class(node, serializer_aliases)
                             django_serializers.append(serializer_details)
@@ -1273,7 +1450,7 @@ class CodeIntelligenceService:
                 # --- New: DRF Router Parsing ---
                 drf_routers: List[DRFRouterRegistration] = []
                 try:
-                    url_tree_for_drf = ast.parse(content)
+                    url_tree_for_drf = py_module.tree
                     for node_item in url_tree_for_drf.body:
                         # Find router = DefaultRouter()
                         if isinstance(node_item, ast.Assign) and isinstance(node_item.value, ast.Call):
@@ -1293,7 +1470,7 @@ class CodeIntelligenceService:
                 # --- End DRF Router Parsing ---
                 includes_parsed = []
                 try:
-                    url_tree = ast.parse(content)
+                    url_tree = py_module.tree
                     for node_item in url_tree.body:
                         if isinstance(node_item, ast.Assign):
                             if any(isinstance(t, ast.Name) and t.id == "urlpatterns" for t in node_item.targets):
@@ -1355,7 +1532,7 @@ class CodeIntelligenceService:
                                      ("Form" in cls_node.name and not any(b.endswith("Form") for b in cls_node.bases)) # Heuristic for forms.Form
 
                     if is_django_form: # cls_node is PythonClass
-                        form_ast_node = next((n for n in ast.parse(content).body if isinstance(n, ast.ClassDef) and n.name == cls_node.name), None)
+                        form_ast_node = py_module.classes.get(cls_node.name)
                         meta_model_name, meta_fields_list = (None, [])
                         if form_ast_node and any(base.endswith("ModelForm") for base in cls_node.bases): # Only parse Meta for ModelForms
                             meta_model_name, meta_fields_list = self._parse_django_form_meta(form_ast_node) # type: ignore
@@ -1378,7 +1555,7 @@ class CodeIntelligenceService:
 
                 admin_classes_details = []
                 try:
-                    admin_tree = ast.parse(content)
+                    admin_tree = py_module.tree
                     for node_item in admin_tree.body:
                         # Case 1: admin.site.register(Question)
                         if isinstance(node_item, ast.Expr) and isinstance(node_item.value, ast.Call) and \
@@ -1448,7 +1625,7 @@ class CodeIntelligenceService:
                 file_info.django_admin_details = DjangoAdminFileDetails(imports=imports, functions=functions, classes=classes, registered_models=registered_models_parsed, admin_classes=admin_classes_details)
             elif filename.startswith("signals"):
                 file_info.file_type = "django_signal"
-                file_info.django_signal_details = self._parse_django_signal_file(content, file_path_str, functions) # type: ignore
+                file_info.django_signal_details = self._parse_django_signal_file(py_module, file_path_str, functions) # type: ignore
             elif filename == "consumers.py":
                 file_info.file_type = "django_channels_consumer"
                 consumers: List[DjangoChannelsConsumer] = []
@@ -1460,8 +1637,7 @@ class CodeIntelligenceService:
                 file_info.file_type = "django_channels_routing"
                 websocket_patterns: List[DjangoURLPattern] = []
                 try:
-                    tree = ast.parse(content) # type: ignore
-                    for node in ast.walk(tree): # type: ignore
+                    for node in ast.walk(py_module.tree): # type: ignore
                         if isinstance(node, ast.Assign) and any(t.id == 'websocket_urlpatterns' for t in node.targets if isinstance(t, ast.Name)): # type: ignore
                             if isinstance(node.value, ast.List): # type: ignore
                                 for elt in node.value.elts: # type: ignore
@@ -1481,7 +1657,7 @@ class CodeIntelligenceService:
                 env_vars_used = {}
                 asset_pipeline_tools: List[str] = []
                 try:
-                    settings_tree = ast.parse(content) # type: ignore
+                    settings_tree = py_module.tree
 
                     # --- NEW: Expanded list of key settings to parse ---
                     key_settings_to_find = {
@@ -1591,7 +1767,7 @@ class CodeIntelligenceService:
                 file_info.django_apps_config_details = py_details
             elif filename == "schema.py":
                 file_info.file_type = "django_graphql_schema"
-                file_info.graphql_schema_details = self._parse_graphql_schema_file(content, file_path_str, classes)
+                file_info.graphql_schema_details = self._parse_graphql_schema_file(py_module, file_path_str, classes)
 
             elif filename.startswith("test_") or filename == "tests.py":
                 file_info.file_type = "django_test" # type: ignore
@@ -1600,7 +1776,7 @@ class CodeIntelligenceService:
                     if any(base in ["TestCase", "APITestCase"] for base in cls_node.bases) or cls_node.name.startswith("Test"):
                         has_setup_test_data = any(m.name == "setUpTestData" for m in cls_node.methods)
                         # Simple regex to check for self.client or self.factory usage
-                        class_source = ast.get_source_segment(content, next(n for n in ast.parse(content).body if isinstance(n, ast.ClassDef) and n.name == cls_node.name)) or ""
+                        class_source = ast.get_source_segment(content, py_module.classes[cls_node.name]) or ""
                         uses_api_client = bool(re.search(r"self\.client\.(get|post|put|delete)", class_source))
                         uses_request_factory = "RequestFactory" in class_source
 
@@ -1643,11 +1819,7 @@ class CodeIntelligenceService:
                 file_info.raw_content_summary = f"CSS file. Parsing failed: {e}"
         elif filename.endswith(".json"): # type: ignore
             file_info.file_type = "json_data"
-            try:
-                json.loads(content)
-                file_info.raw_content_summary = f"JSON data file, approx {len(content)//1024}KB."
-            except json.JSONDecodeError:
-                file_info.raw_content_summary = "Invalid JSON file."
+            file_info.raw_content_summary = self._summarize_json_file(file_path_str, content)
         elif filename.endswith((".txt", ".md", ".log", ".yaml", ".yml", ".ini", ".cfg", ".env")): # type: ignore
             file_info.file_type = "text"
             file_info.raw_content_summary = content[:200] + ("..." if len(content) > 200 else "")
@@ -1656,23 +1828,76 @@ class CodeIntelligenceService:
             file_info.raw_content_summary = f"Unknown file type. Size: {len(content)} bytes."
         
         if content_hash:
-            self.in_memory_cache[file_path_str] = (content_hash, file_info)
+            self._cache_result(file_path_str, content_hash, file_info, len(content))
         return file_info
 
+    def _cache_key(self, file_path_str: str, content_hash: str) -> str:
+        """
+        Returns the key a file's parse result is cached under: its content hash and, for
+        Python files, a digest of the project's apps, since their imports are classified
+        as `project_app` or `third_party` against that set.
+        """
+        if not file_path_str.endswith(".py"):
+            return content_hash
+        self.get_project_apps()
+        return f"{content_hash}:{self._project_apps_digest}"
+
+    def _lookup_cached_result(self, file_path_str: str, content_hash: str, content_length: int) -> Tuple[bool, Optional[FileStructureInfo]]:
+        """
+        Looks a parse result up in the in-memory cache, then in the results persisted by
+        earlier sessions. Returns `(True, result)` on a hit and `(False, None)` on a miss.
+        `content_length` sizes a persisted result promoted to the in-memory cache.
+        """
+        content_hash = self._cache_key(file_path_str, content_hash)
+        found, cached_data = self.in_memory_cache.lookup(file_path_str, content_hash)
+        if found:
+            logger.debug(f"Cache hit for '{file_path_str}'. Skipping re-parsing.")
+            return True, cached_data
+        if self.parse_cache is not None:
+            found, cached_data = self.parse_cache.load(file_path_str, content_hash)
+            if found:
+                logger.debug(f"Persistent cache hit for '{file_path_str}'. Skipping re-parsing.")
+                self.in_memory_cache.store(file_path_str, content_hash, cached_data, content_length)
+                return True, cached_data
+        logger.debug(f"Cache miss for '{file_path_str}'. Proceeding with full parse.")
+        return False, None
+
+    def _cache_result(self, file_path_str: str, content_hash: str, file_info: Optional[FileStructureInfo], content_length: int) -> None:
+        """Records a parse result in the in-memory cache and, if enabled, the persistent one."""
+        content_hash = self._cache_key(file_path_str, content_hash)
+        self.in_memory_cache.store(file_path_str, content_hash, file_info, content_length)
+        if self.parse_cache is not None:
+            self.parse_cache.store(file_path_str, content_hash, file_info)
+
     @time_function
-    def parse_files_in_parallel(self, file_paths_with_content: Dict[str, str], max_workers: int = 4) -> Dict[str, Optional[FileStructureInfo]]:
+    def parse_files_in_parallel(
+        self,
+        file_paths_with_content: Dict[str, str],
+        max_workers: Optional[int] = 4,
+        use_processes: bool = False,
+        chunk_size: int = PARALLEL_PARSE_CHUNK_SIZE,
+    ) -> Dict[str, Optional[FileStructureInfo]]:
         """
-        Parses multiple files concurrently using a thread pool, leveraging the file cache.
+        Parses multiple files concurrently, leveraging the file cache.
+
+        By default a thread pool is used. Parsing is CPU-bound and holds the GIL,
+        so for large scans `use_processes=True` parses in worker processes instead
+        (see `_parse_files_in_processes`), which scales with the number of cores.
 
         Args:
             file_paths_with_content: A dictionary mapping relative file paths to their string content.
-            max_workers: The maximum number of worker threads to use.
+            max_workers: The maximum number of worker threads or processes to use
+                         (None: one worker process per CPU core).
+            use_processes: Whether to parse in a process pool rather than a thread pool.
+            chunk_size: In process mode, how many files are sent to a worker at a time.
         Returns:
             A dictionary mapping each file path to its parsed FileStructureInfo object or None.
         """
         results: Dict[str, Optional[FileStructureInfo]] = {}
         if not file_paths_with_content:
             return results
+        if use_processes:
+            return self._parse_files_in_processes(file_paths_with_content, max_workers, chunk_size)
 
         logger.info(f"Starting parallel parsing for {len(file_paths_with_content)} files with {max_workers} workers.")
 
@@ -1692,3 +1917,97 @@ class CodeIntelligenceService:
         
         logger.info(f"Finished parallel parsing. Processed {len(results)} files.")
         return results
+
+    def _parse_files_in_processes(
+        self, file_paths_with_content: Dict[str, str], max_workers: Optional[int], chunk_size: int
+    ) -> Dict[str, Optional[FileStructureInfo]]:
+        """
+        The process-pool mode of `parse_files_in_parallel`.
+
+        Cache hits are served in this process. The remaining files are sent to
+        worker processes in batches of `chunk_size` (path, content, hash) entries;
+        each worker parses its batch and returns the results as plain
+        `model_dump()` data, which is validated back into `FileStructureInfo`
+        objects and stored in this service's caches. A batch whose worker fails,
+        or every batch if the pool cannot be started, is parsed in this process.
+        A file whose parsing raises is logged and yields None, like in thread mode.
+        """
+        results: Dict[str, Optional[FileStructureInfo]] = {}
+        pending: List[Tuple[str, str, str]] = []
+        for path, content in file_paths_with_content.items():
+            content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+            found, cached_data = self._lookup_cached_result(path, content_hash, len(content))
+            if found:
+                results[path] = cached_data
+            else:
+                pending.append((path, content, content_hash))
+
+        chunk_size = max(1, chunk_size)
+        batches = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        if len(batches) > 1:
+            logger.info(f"Parsing {len(pending)} files in {len(batches)} batches of up to {chunk_size} with a process pool "
+                        f"({len(results)} served from cache).")
+            try:
+                # Workers are spawned rather than forked: this process runs the UI and worker threads.
+                with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"),
+                                         initializer=_init_parse_worker, initargs=(str(self.project_root),)) as executor:
+                    future_to_batch = {executor.submit(_parse_batch_in_worker, batch): batch for batch in batches}
+                    for future in as_completed(future_to_batch):
+                        try:
+                            parsed_batch = future.result()
+                        except Exception as exc:
+                            logger.warning(f"A parse worker failed ({exc}); its {len(future_to_batch[future])} files are parsed in-process.")
+                            continue
+                        for path, content_hash, data, error in parsed_batch:
+                            if error is not None:
+                                # Failed parses are not cached, so the file is tried again next time.
+                                logger.error(f"An exception occurred while parsing '{path}' in a worker process: {error}")
+                                results[path] = None
+                                continue
+                            file_info = FileStructureInfo.model_validate(data) if data is not None else None
+                            self._cache_result(path, content_hash, file_info, len(file_paths_with_content[path]))
+                            results[path] = file_info
+            except (OSError, RuntimeError, NotImplementedError) as exc:
+                logger.warning(f"Could not parse in a process pool ({exc}); parsing in-process instead.")
+
+        # Anything the workers did not return (a single batch, or failed workers) is parsed here.
+        for path, content, content_hash in pending:
+            if path in results:
+                continue
+            try:
+                results[path] = self.parse_file(path, content, content_hash=content_hash)
+            except Exception as exc:
+                logger.error(f"An exception occurred while parsing '{path}': {exc}", exc_info=True)
+                results[path] = None
+
+        logger.info(f"Finished parallel parsing. Processed {len(results)} files.")
+        return results
+
+
+# --- Process-pool workers for `parse_files_in_parallel(use_processes=True)` ---
+
+# Each worker process parses with its own service; caching stays with the parent process.
+_worker_service: Optional[CodeIntelligenceService] = None
+
+
+def _init_parse_worker(project_root: str) -> None:
+    """Creates the worker process's parsing service, without persistent or in-memory caching."""
+    global _worker_service
+    _worker_service = CodeIntelligenceService(project_root, persistent_cache=False, memory_cache_max_bytes=0)
+
+
+def _parse_batch_in_worker(batch: List[Tuple[str, str, str]]) -> List[Tuple[str, str, Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    Parses a batch of (path, content, content hash) entries. Each result is returned as
+    (path, content hash, plain `model_dump()` data, None), or (path, content hash, None,
+    error message) if parsing that file raised, so one bad file does not fail its batch.
+    """
+    parsed_batch = []
+    for path, content, content_hash in batch:
+        try:
+            file_info = _worker_service.parse_file(path, content, content_hash=content_hash)
+        except Exception as exc:
+            parsed_batch.append((path, content_hash, None, f"{type(exc).__name__}: {exc}"))
+            continue
+        parsed_batch.append((path, content_hash, file_info.model_dump() if file_info is not None else None, None))
+    return parsed_batch
@@ -0,0 +1,145 @@
+# backend/src/core/directory_tree.py
+import dataclasses
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .snapshot_store import RACY_WINDOW_NS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class DirectoryNode:
+    """The cached, sorted listing of one directory."""
+    mtime_ns: int
+    # (name, is_dir) pairs: directories first, then case-insensitively by name.
+    entries: List[Tuple[str, bool]]
+    # False if the directory was listed within the racy window of its mtime, in which
+    # case it could change again without its mtime moving and is never reused.
+    trusted: bool
+
+
+class DirectoryTreeCache:
+    """
+    A cache of directory listings used to render the project structure map.
+
+    Each directory is listed at most once and kept as a `DirectoryNode` until it
+    is invalidated. `FileSystemManager` invalidates the affected directories on
+    every write, create and delete it performs. Changes made behind its back
+    (shell commands, the user's editor) are caught by comparing each visited
+    directory's mtime with the cached one, which costs one `stat` per directory
+    rather than one per file. Rendering is then a string join over cached nodes,
+    with depth and width limits applied at render time.
+    """
+
+    def __init__(self, project_root: Path, excluded_dirs: Iterable[str]):
+        """
+        Initializes the DirectoryTreeCache.
+
+        Args:
+            project_root: The resolved project root directory.
+            excluded_dirs: Directory names that are never listed.
+        """
+        self.project_root = project_root
+        self.excluded_dirs = frozenset(excluded_dirs)
+        # Directory path ("" for the root) -> cached node.
+        self._nodes: Dict[str, DirectoryNode] = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self, rel_dir: str) -> None:
+        """Drops the cached listing of a single directory."""
+        with self._lock:
+            self._nodes.pop(rel_dir, None)
+
+    def invalidate_path(self, abs_path: Path) -> None:
+        """
+        Drops the cached listings affected by creating, changing or deleting `abs_path`:
+        its parent directory and, since the write may have created intermediate
+        directories, every ancestor up to the project root.
+        """
+        try:
+            parts = abs_path.relative_to(self.project_root).parts
+        except ValueError:
+            return
+        with self._lock:
+            for depth in range(len(parts)):
+                self._nodes.pop("/".join(parts[:depth]), None)
+
+    def clear(self) -> None:
+        """Drops every cached listing."""
+        with self._lock:
+            self._nodes.clear()
+
+    def _list_dir(self, rel_dir: str) -> Optional[DirectoryNode]:
+        """Returns the current listing of a directory, re-reading it only if its mtime changed."""
+        abs_dir = self.project_root / rel_dir if rel_dir else self.project_root
+        try:
+            mtime_ns = os.stat(abs_dir).st_mtime_ns
+        except OSError:
+            self.invalidate(rel_dir)
+            return None
+
+        with self._lock:
+            node = self._nodes.get(rel_dir)
+        if node is not None and node.trusted and node.mtime_ns == mtime_ns:
+            return node
+
+        entries: List[Tuple[str, bool]] = []
+        try:
+            with os.scandir(abs_dir) as it:
+                for dir_entry in it:
+                    try:
+                        if dir_entry.is_dir(follow_symlinks=False):
+                            if dir_entry.name not in self.excluded_dirs:
+                                entries.append((dir_entry.name, True))
+                        elif dir_entry.is_file():
+                            entries.append((dir_entry.name, False))
+                    except OSError as e:
+                        logger.debug(f"Skipping unreadable entry '{dir_entry.path}' in structure map: {e}")
+        except OSError as e:
+            logger.debug(f"Skipping unreadable directory '{rel_dir}' in structure map: {e}")
+            return None
+        entries.sort(key=lambda item: (not item[1], item[0].lower()))
+
+        node = DirectoryNode(mtime_ns, entries, trusted=time.time_ns() - mtime_ns >= RACY_WINDOW_NS)
+        with self._lock:
+            self._nodes[rel_dir] = node
+        return node
+
+    def render(self, max_depth: int, max_items_per_dir: int, indent_char: str) -> List[str]:
+        """
+        Renders the tree as markdown list lines.
+
+        Args:
+            max_depth: Maximum depth of directories to descend into.
+            max_items_per_dir: Maximum number of entries listed per directory.
+            indent_char: String used for one level of indentation.
+
+        Returns:
+            The markdown lines, without a heading.
+        """
+        lines: List[str] = []
+
+        def _render_dir(rel_dir: str, current_depth: int) -> None:
+            if current_depth > max_depth:
+                return
+            node = self._list_dir(rel_dir)
+            if node is None:
+                return
+            prefix = indent_char * current_depth
+            for name, is_dir in node.entries[:max_items_per_dir]:
+                if is_dir:
+                    lines.append(f"{prefix}- {name}/")
+                    _render_dir(f"{rel_dir}/{name}" if rel_dir else name, current_depth + 1)
+                else:
+                    lines.append(f"{prefix}- {name}")
+            if len(node.entries) > max_items_per_dir:
+                # Add a truncation marker if there are too many items in a directory.
+                lines.append(f"{prefix}- ... (truncated)")
+
+        _render_dir("", 0)
+        return lines
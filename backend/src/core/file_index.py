@@ -0,0 +1,488 @@
+# backend/src/core/file_index.py
+import dataclasses
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .snapshot_store import RACY_WINDOW_NS
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the on-disk layout of the index changes; older files are discarded.
+INDEX_FORMAT_VERSION = 1
+
+
+@dataclasses.dataclass
+class FileIndexEntry:
+    """Metadata the index keeps for a single project file."""
+    size: int
+    mtime_ns: int
+    sha256: Optional[str] = None
+
+
+@dataclasses.dataclass
+class FileIndexChanges:
+    """The set of files that changed between two refreshes of the index."""
+    created: Set[str] = dataclasses.field(default_factory=set)
+    modified: Set[str] = dataclasses.field(default_factory=set)
+    deleted: Set[str] = dataclasses.field(default_factory=set)
+    # Directories that disappeared (deleted or renamed away); their files are also in `deleted`.
+    deleted_dirs: Set[str] = dataclasses.field(default_factory=set)
+
+    def __bool__(self) -> bool:
+        return bool(self.created or self.modified or self.deleted or self.deleted_dirs)
+
+    def merge(self, later: "FileIndexChanges") -> None:
+        """Folds in changes detected after these, so the result describes both intervals."""
+        for rel_path in later.created:
+            if rel_path in self.deleted:
+                self.deleted.discard(rel_path)
+                self.modified.add(rel_path)
+            else:
+                self.created.add(rel_path)
+        for rel_path in later.modified:
+            if rel_path not in self.created:
+                self.modified.add(rel_path)
+        for rel_path in later.deleted:
+            if rel_path in self.created:
+                self.created.discard(rel_path)
+            else:
+                self.modified.discard(rel_path)
+                self.deleted.add(rel_path)
+        self.deleted_dirs |= later.deleted_dirs
+
+    def discard(self, rel_path: str) -> None:
+        """Forgets any change recorded for a path."""
+        self.created.discard(rel_path)
+        self.modified.discard(rel_path)
+        self.deleted.discard(rel_path)
+
+
+class ProjectFileIndex:
+    """
+    A persistent index of every file in the project with its size, mtime and
+    (when known) SHA-256 hash.
+
+    It replaces the separate `os.walk`/`rglob` passes that used to be spread
+    over the code base. The index is kept current in three ways:
+      - `FileSystemManager` reports its own writes and deletes immediately
+        (`note_changed` / `note_removed`).
+      - `refresh()` re-stats the tree and reports what changed on disk behind
+        the manager's back (e.g. files created by shell commands). Callers
+        refresh at well-defined points, such as around a RUN_COMMAND, so each
+        refresh reports exactly the changes since the previous one.
+      - An optional background polling watcher (`start_watcher`) keeps the
+        index current, in which case `ensure_fresh()` costs nothing and queries
+        only pay for what changed. Changes the watcher picks up are held back
+        and reported by the next explicit `refresh()`, so they are never lost
+        to a caller that diffs around a command.
+
+    The index is persisted as JSON under `.vebgen/` so hashes survive restarts.
+    """
+
+    # Directories that are never indexed. Callers apply any stricter filters at query time.
+    EXCLUDED_DIRS = {".git", ".venv", "venv", "__pycache__", "node_modules", ".vebgen"}
+
+    def __init__(self, project_root: Path, index_path: Optional[Path] = None):
+        """
+        Initializes the ProjectFileIndex, loading any previously persisted state.
+
+        Args:
+            project_root: The resolved project root directory.
+            index_path: Where the index is persisted. Defaults to `<project_root>/.vebgen/file_index.json`.
+        """
+        self.project_root = project_root
+        self.index_path = index_path or (project_root / ".vebgen" / "file_index.json")
+        self._files: Dict[str, FileIndexEntry] = {}
+        # Directory path ("" for the root) -> mtime_ns at its last listing, or None if unknown.
+        self._dirs: Dict[str, Optional[int]] = {}
+        # Directory path -> {child name: is_dir}
+        self._children: Dict[str, Dict[str, bool]] = {}
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._scanned = False
+        # Changes found by the watcher that no explicit refresh() has reported yet.
+        self._unreported = FileIndexChanges()
+        self._watcher_thread: Optional[threading.Thread] = None
+        self._watcher_stop = threading.Event()
+        self._load()
+
+    # --- Persistence ---
+
+    def _load(self) -> None:
+        """Loads the persisted index, discarding it if it is unreadable or outdated."""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") != INDEX_FORMAT_VERSION:
+                logger.info("Discarding file index written by an older version.")
+                return
+            for rel_path, (size, mtime_ns, sha256) in data.get("files", {}).items():
+                self._add_file(rel_path, FileIndexEntry(size, mtime_ns, sha256))
+            for rel_dir, mtime_ns in data.get("dirs", {}).items():
+                self._add_dir(rel_dir, mtime_ns)
+            logger.info(f"Loaded file index with {len(self._files)} files from {self.index_path}.")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Could not load file index from {self.index_path}: {e}. It will be rebuilt.")
+            self._files.clear()
+            self._dirs.clear()
+            self._children.clear()
+
+    def save(self) -> None:
+        """Persists the index if it changed since it was last saved."""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                "version": INDEX_FORMAT_VERSION,
+                "files": {p: [e.size, e.mtime_ns, e.sha256] for p, e in self._files.items()},
+                "dirs": dict(self._dirs),
+            }
+            self._dirty = False
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_name(f"{self.index_path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            logger.warning(f"Could not persist file index to {self.index_path}: {e}")
+
+    # --- Internal bookkeeping ---
+
+    @staticmethod
+    def _split(rel_path: str) -> Tuple[str, str]:
+        parent, _, name = rel_path.rpartition("/")
+        return parent, name
+
+    def _add_dir(self, rel_dir: str, mtime_ns: Optional[int]) -> None:
+        self._dirs[rel_dir] = mtime_ns
+        self._children.setdefault(rel_dir, {})
+        if rel_dir:
+            parent, name = self._split(rel_dir)
+            if parent not in self._dirs:
+                self._add_dir(parent, None)
+            self._children[parent][name] = True
+
+    def _add_file(self, rel_path: str, entry: FileIndexEntry) -> None:
+        self._files[rel_path] = entry
+        parent, name = self._split(rel_path)
+        if parent not in self._dirs:
+            self._add_dir(parent, None)
+        self._children[parent][name] = False
+
+    def _remove_file(self, rel_path: str) -> None:
+        self._files.pop(rel_path, None)
+        parent, name = self._split(rel_path)
+        self._children.get(parent, {}).pop(name, None)
+
+    def _remove_dir(self, rel_dir: str, deleted: Optional[Set[str]] = None) -> None:
+        """Removes a directory and everything below it from the index, collecting removed files into `deleted`."""
+        for name, is_dir in list(self._children.get(rel_dir, {}).items()):
+            child = f"{rel_dir}/{name}" if rel_dir else name
+            if is_dir:
+                self._remove_dir(child, deleted)
+            else:
+                self._files.pop(child, None)
+                if deleted is not None:
+                    deleted.add(child)
+        self._children.pop(rel_dir, None)
+        self._dirs.pop(rel_dir, None)
+        if rel_dir:
+            parent, name = self._split(rel_dir)
+            self._children.get(parent, {}).pop(name, None)
+
+    def _relative(self, path: Path) -> str:
+        return path.relative_to(self.project_root).as_posix()
+
+    def _is_excluded(self, rel_path: str) -> bool:
+        return any(part in self.EXCLUDED_DIRS for part in rel_path.split("/"))
+
+    # --- Refreshing ---
+
+    def refresh(self) -> FileIndexChanges:
+        """
+        Brings the index up to date with the disk and reports what changed.
+
+        Change detection is directory-first: every indexed directory is stat'ed,
+        but only directories whose mtime changed since they were last listed are
+        re-listed with `os.scandir` (a file can only be created, deleted or renamed
+        by changing its parent directory's mtime). Files in unchanged directories
+        are stat'ed individually to catch in-place modifications. Excluded
+        directories are pruned before they are ever entered.
+
+        Returns:
+            The files that were created, modified or deleted on disk since the
+            previous refresh, including those the watcher picked up in between
+            (changes reported through `note_changed` / `note_removed` are
+            already reflected and are not repeated).
+        """
+        with self._lock:
+            changes = self._unreported
+            self._unreported = FileIndexChanges()
+            changes.merge(self._scan())
+        return changes
+
+    def _scan(self) -> FileIndexChanges:
+        """Performs one directory-first pass over the tree (see `refresh`) and persists the result."""
+        changes = FileIndexChanges()
+        relisted = 0
+        with self._lock:
+            stack = [""]
+            while stack:
+                rel_dir = stack.pop()
+                abs_dir = self.project_root / rel_dir if rel_dir else self.project_root
+                try:
+                    dir_mtime_ns = os.stat(abs_dir).st_mtime_ns
+                except OSError:
+                    self._remove_dir(rel_dir, changes.deleted)
+                    if rel_dir:
+                        changes.deleted_dirs.add(rel_dir)
+                    continue
+
+                if rel_dir in self._children and self._dirs.get(rel_dir) == dir_mtime_ns:
+                    self._check_unchanged_dir(rel_dir, stack, changes)
+                else:
+                    self._relist_dir(rel_dir, abs_dir, dir_mtime_ns, stack, changes)
+                    relisted += 1
+
+            if changes or not self._scanned:
+                self._dirty = True
+            self._scanned = True
+
+        self.save()
+        if changes:
+            logger.info(
+                f"File index refreshed ({relisted} directories re-listed): {len(changes.created)} created, "
+                f"{len(changes.modified)} modified, {len(changes.deleted)} deleted."
+            )
+        return changes
+
+    def _child_path(self, rel_dir: str, name: str) -> str:
+        return f"{rel_dir}/{name}" if rel_dir else name
+
+    def _update_file(self, rel_path: str, st: os.stat_result, changes: FileIndexChanges) -> None:
+        """Compares a fresh stat against the index and records any difference."""
+        old_entry = self._files.get(rel_path)
+        if old_entry is None:
+            changes.created.add(rel_path)
+        elif (old_entry.size, old_entry.mtime_ns) != (st.st_size, st.st_mtime_ns):
+            changes.modified.add(rel_path)
+        else:
+            return
+        self._add_file(rel_path, FileIndexEntry(st.st_size, st.st_mtime_ns))
+
+    def _check_unchanged_dir(self, rel_dir: str, stack: List[str], changes: FileIndexChanges) -> None:
+        """Handles a directory whose listing is known to be current: stat its files, descend into subdirectories."""
+        for name, is_dir in list(self._children[rel_dir].items()):
+            rel_path = self._child_path(rel_dir, name)
+            if is_dir:
+                stack.append(rel_path)
+                continue
+            try:
+                self._update_file(rel_path, os.stat(self.project_root / rel_path), changes)
+            except OSError:
+                changes.deleted.add(rel_path)
+                self._remove_file(rel_path)
+
+    def _relist_dir(self, rel_dir: str, abs_dir: Path, dir_mtime_ns: int, stack: List[str], changes: FileIndexChanges) -> None:
+        """Re-reads a directory whose mtime changed (or that was never listed)."""
+        listing: Dict[str, bool] = {}
+        try:
+            with os.scandir(abs_dir) as it:
+                for dir_entry in it:
+                    rel_path = self._child_path(rel_dir, dir_entry.name)
+                    try:
+                        if dir_entry.is_dir(follow_symlinks=False):
+                            if dir_entry.name not in self.EXCLUDED_DIRS:
+                                listing[dir_entry.name] = True
+                        elif dir_entry.is_file():
+                            listing[dir_entry.name] = False
+                            self._update_file(rel_path, dir_entry.stat(), changes)
+                    except OSError as e:
+                        logger.debug(f"Skipping unreadable entry '{rel_path}' during index refresh: {e}")
+        except OSError as e:
+            logger.debug(f"Skipping unreadable directory '{rel_dir}' during index refresh: {e}")
+            return
+
+        for name, was_dir in list(self._children.get(rel_dir, {}).items()):
+            if listing.get(name) == was_dir:
+                continue
+            rel_path = self._child_path(rel_dir, name)
+            if was_dir:
+                self._remove_dir(rel_path, changes.deleted)
+                changes.deleted_dirs.add(rel_path)
+            else:
+                changes.deleted.add(rel_path)
+                self._remove_file(rel_path)
+
+        # A directory modified within the racy window could change again without its
+        # mtime moving, so it is recorded as unknown and re-listed next time.
+        trusted = time.time_ns() - dir_mtime_ns >= RACY_WINDOW_NS
+        self._add_dir(rel_dir, dir_mtime_ns if trusted else None)
+        for name, is_dir in listing.items():
+            if is_dir:
+                child = self._child_path(rel_dir, name)
+                if child not in self._dirs:
+                    self._add_dir(child, None)
+                stack.append(child)
+
+    def ensure_fresh(self) -> None:
+        """
+        Makes sure the index reflects the disk before it is queried. This is free
+        while the background watcher is running; otherwise it scans the tree, and
+        the changes found are kept for the next `refresh()` to report.
+        """
+        if self.watcher_running and self._scanned:
+            return
+        with self._lock:
+            self._unreported.merge(self._scan())
+
+    # --- Change notifications from FileSystemManager ---
+
+    def note_changed(self, abs_path: Path, sha256: Optional[str] = None) -> None:
+        """Records that a file was written through the FileSystemManager."""
+        rel_path = self._relative(abs_path)
+        if self._is_excluded(rel_path):
+            return
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            self.note_removed(abs_path)
+            return
+        with self._lock:
+            self._add_file(rel_path, FileIndexEntry(st.st_size, st.st_mtime_ns, sha256))
+            self._unreported.discard(rel_path)
+            self._dirty = True
+
+    def note_removed(self, abs_path: Path) -> None:
+        """Records that a file was deleted through the FileSystemManager."""
+        rel_path = self._relative(abs_path)
+        with self._lock:
+            self._unreported.discard(rel_path)
+            if rel_path in self._files:
+                self._remove_file(rel_path)
+                self._dirty = True
+
+    def record_hash(self, rel_path: str, size: int, mtime_ns: int, sha256: str) -> None:
+        """Stores a known hash for a file if it still matches the indexed metadata."""
+        with self._lock:
+            entry = self._files.get(rel_path)
+            if entry is not None and (entry.size, entry.mtime_ns) == (size, mtime_ns) and entry.sha256 != sha256:
+                entry.sha256 = sha256
+                self._dirty = True
+
+    # --- Queries ---
+
+    def get(self, rel_path: str) -> Optional[FileIndexEntry]:
+        """Returns the indexed metadata for a file, or None if it is not indexed."""
+        with self._lock:
+            return self._files.get(rel_path)
+
+    def files(
+        self,
+        suffixes: Optional[Iterable[str]] = None,
+        excluded_dirs: Iterable[str] = (),
+        excluded_files: Iterable[str] = (),
+        excluded_extensions: Iterable[str] = (),
+    ) -> List[str]:
+        """
+        Lists indexed files, sorted, applying caller-specific filters.
+
+        Args:
+            suffixes: If given, only files with one of these suffixes are returned.
+            excluded_dirs: Directory names; files below any of them are skipped.
+            excluded_files: File names to skip.
+            excluded_extensions: Suffixes to skip.
+
+        Returns:
+            Project-relative POSIX paths.
+        """
+        suffixes = set(suffixes) if suffixes is not None else None
+        excluded_dirs = set(excluded_dirs)
+        excluded_files = set(excluded_files)
+        excluded_extensions = set(excluded_extensions)
+        with self._lock:
+            paths = list(self._files)
+        result = []
+        for rel_path in paths:
+            parts = rel_path.split("/")
+            name = parts[-1]
+            suffix = os.path.splitext(name)[1]
+            if suffixes is not None and suffix not in suffixes:
+                continue
+            if name in excluded_files or suffix in excluded_extensions:
+                continue
+            if excluded_dirs and any(part in excluded_dirs for part in parts[:-1]):
+                continue
+            result.append(rel_path)
+        result.sort()
+        return result
+
+    def list_directory(self, rel_dir: str = "") -> List[Tuple[str, bool]]:
+        """
+        Returns the indexed children of a directory as `(name, is_dir)` pairs,
+        directories first, then case-insensitively by name.
+        """
+        with self._lock:
+            children = list(self._children.get(rel_dir, {}).items())
+        return sorted(children, key=lambda item: (not item[1], item[0].lower()))
+
+    # --- Background watcher ---
+
+    @property
+    def watcher_running(self) -> bool:
+        return self._watcher_thread is not None and self._watcher_thread.is_alive()
+
+    def start_watcher(
+        self,
+        interval: float = 2.0,
+        on_change: Optional[Callable[[FileIndexChanges], None]] = None,
+    ) -> None:
+        """
+        Starts a background thread that polls the tree every `interval` seconds
+        and keeps the index current. Opt-in: nothing starts it by default.
+
+        Each poll scans under the index lock, so it never interleaves with a
+        caller's `refresh()`, and what it finds is held back for that caller.
+
+        Args:
+            interval: Seconds between polls.
+            on_change: Optional callback invoked (on the watcher thread) with
+                       the changes found by each poll that found any.
+        """
+        if self.watcher_running:
+            return
+        self._watcher_stop.clear()
+        if not self._scanned:
+            self.ensure_fresh()
+
+        def _poll():
+            while not self._watcher_stop.wait(interval):
+                try:
+                    with self._lock:
+                        changes = self._scan()
+                        self._unreported.merge(changes)
+                    if changes and on_change:
+                        on_change(changes)
+                except Exception as e:
+                    logger.error(f"File index watcher poll failed: {e}")
+
+        self._watcher_thread = threading.Thread(target=_poll, name="vebgen-file-index-watcher", daemon=True)
+        self._watcher_thread.start()
+        logger.info(f"File index watcher started (polling every {interval}s).")
+
+    def stop_watcher(self) -> None:
+        """Stops the background watcher (if running) and persists the index."""
+        if self._watcher_thread is not None:
+            self._watcher_stop.set()
+            self._watcher_thread.join()
+            self._watcher_thread = None
+            logger.info("File index watcher stopped.")
+        self.save()
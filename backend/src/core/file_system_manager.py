@@ -4,9 +4,19 @@ import logging
 from pathlib import Path
 import os
 import shutil # For potential future use (e.g., deleting directories)
-from typing import List, Optional, Tuple, Dict, Any
+from typing import List, Optional, Tuple, Dict, Any, AsyncIterator, Callable
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from .exceptions import PatchApplyError
+from .snapshot_store import SnapshotStore, SnapshotEntry, RACY_WINDOW_NS, decode_snapshot_text
+from .rollback_journal import RollbackJournal
+from .file_index import ProjectFileIndex
+from .file_transaction import FileTransaction, new_transaction_dir, recover_transactions
+from .file_view import FileView
+from .directory_tree import DirectoryTreeCache
+from .patch_matcher import LineIndex, strip_common_leading_whitespace
+from .line_merge import merge3
+from .performance_monitor import performance_monitor
 import xml.etree.ElementTree as ET
 import time
 from unidiff import PatchSet, UnidiffParseError
@@ -17,7 +27,60 @@ from diff_match_patch import patch_obj
 import textwrap
 logger = logging.getLogger(__name__)
 import hashlib # For file hashing
+import threading
+from collections import OrderedDict
 import re
+import ast
+import dataclasses
+import json
+
+# Django template tags that must be closed by a matching `end<tag>`.
+_TEMPLATE_BLOCK_TAG_RE = re.compile(r'{%-?\s*(end)?(block|if|for|with)\b')
+
+
+def _unbalanced_template_tags(content: str) -> List[str]:
+    """Returns the Django template block tags whose openings and `end` tags don't pair up."""
+    depth: Dict[str, int] = {}
+    for match in _TEMPLATE_BLOCK_TAG_RE.finditer(content):
+        tag = match.group(2)
+        depth[tag] = depth.get(tag, 0) + (-1 if match.group(1) else 1)
+    return sorted(tag for tag, count in depth.items() if count != 0)
+
+
+# Constructs whose misuse is only reported by the compiler (symbol table and code
+# generation), not by the parser: `return`/`yield`/`await` outside a function,
+# `break`/`continue` outside a loop, misplaced `global`/`nonlocal`/`from __future__`
+# or `import *`, a bare `except:` that is not last, walrus targets in comprehensions.
+_COMPILE_CHECKED_TOKENS = (
+    "return", "yield", "await", "async", "break", "continue", "nonlocal", "global",
+    "__future__", "import *", "except", ":=",
+)
+
+
+def _adds_compile_checked_tokens(new_content: str, original_content: str) -> bool:
+    """Returns whether `new_content` has more occurrences of any `_COMPILE_CHECKED_TOKENS` than the original."""
+    return any(new_content.count(token) > original_content.count(token) for token in _COMPILE_CHECKED_TOKENS)
+
+
+@dataclasses.dataclass
+class FileWriteEvent:
+    """
+    Describes a file the FileSystemManager has just written, so consumers such as
+    `CodeIntelligenceService` can use the new state without reading the file back.
+
+    `content` is the text as `read_file` would return it, `sha256` the hash of the
+    bytes on disk, and `parsed_ast` the module the patch engine parsed while
+    validating a Python file (None otherwise). `content_sha256` is the hash of
+    `content` encoded as UTF-8, which is what parse results are cached under; it
+    differs from `sha256` when the bytes on disk use CRLF line endings or another
+    encoding.
+    """
+    path: str
+    content: str
+    sha256: str
+    parsed_ast: Optional[ast.Module] = None
+    content_sha256: Optional[str] = None
+
 
 class FileSystemManager:
     """
@@ -29,23 +92,55 @@ class FileSystemManager:
     can access or modify files outside of the designated project root.
     """
     FUZZY_MATCH_THRESHOLD = 0.82
-
-    def __init__(self, project_root_path: str | Path):
+    # Similarity required by the structural layer. It is lower than FUZZY_MATCH_THRESHOLD because
+    # the window is not found by similarity alone: it must lie in a definition with the SEARCH
+    # block's name (and nested definitions), indentation is ignored, and a match is refused if a
+    # second candidate scores within STRUCTURAL_AMBIGUITY_EPSILON (0.05) of it. That lets it accept
+    # a stale copy of a function the fuzzy layer rejects, without ever picking between look-alikes.
+    STRUCTURAL_MATCH_THRESHOLD = 0.75
+    # Lines (windows scored x window size) the fuzzy layer and the error suggestion may compare per block.
+    SEARCH_REPLACE_SCAN_BUDGET = 2_000_000
+    # How many lines a unified-diff hunk may be off by and still be spliced without diff-match-patch.
+    UNIFIED_DIFF_MAX_OFFSET = 10
+    # Patched JSON files up to this size are parsed in memory before being written.
+    JSON_VALIDATION_MAX_CHARS = 2 * 1024 * 1024
+    # Directories, file names and extensions that are never part of a project snapshot.
+    SNAPSHOT_EXCLUDED_DIRS = {".git", ".venv", "venv", "__pycache__", "node_modules", ".vebgen", ".codenow"}
+    SNAPSHOT_EXCLUDED_FILES = {".DS_Store"}
+    SNAPSHOT_EXCLUDED_EXTENSIONS = {".pyc", ".pyo", ".pyd", ".log", ".bak", ".sqlite3"}
+    # "journal": ROLLBACK replays recorded pre-images of the last checkpoint.
+    # "snapshot": ROLLBACK restores a whole-tree snapshot taken before the step.
+    ROLLBACK_MODES = ("journal", "snapshot")
+    # Number of (inode, mtime_ns, size) -> sha256 entries kept in the hash cache.
+    HASH_CACHE_SIZE = 4096
+    # Defaults for bulk snapshot I/O: worker threads, files per work item, and the
+    # maximum number of raw file bytes being read/written at any one time.
+    SNAPSHOT_MAX_WORKERS = 8
+    SNAPSHOT_CHUNK_SIZE = 64
+    SNAPSHOT_MAX_INFLIGHT_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, project_root_path: str | Path, rollback_mode: str = "journal"):
         """
         Initializes the FileSystemManager.
 
         Args:
             project_root_path: The absolute or relative path to the root directory
                                for all file operations.
+            rollback_mode: How ROLLBACK undoes changes, either "journal" (replay the
+                           pre-images recorded for the last checkpoint) or "snapshot"
+                           (restore a whole-tree snapshot).
 
         Raises:
-            ValueError: If project_root_path is not provided.
+            ValueError: If project_root_path is not provided or rollback_mode is unknown.
             FileNotFoundError: If the resolved project_root_path does not exist.
             NotADirectoryError: If the resolved project_root_path is not a directory.
         """
         self.logger = logging.getLogger(__name__)
         if not project_root_path:
             raise ValueError("FileSystemManager requires a valid project_root_path.")
+        if rollback_mode not in self.ROLLBACK_MODES:
+            raise ValueError(f"Unknown rollback_mode '{rollback_mode}'. Expected one of {self.ROLLBACK_MODES}.")
+        self.rollback_mode = rollback_mode
 
         # Resolve the path to an absolute path and ensure it exists and is a directory.
         self.trash_dir = Path(project_root_path).resolve() / ".vebgen" / "trash"
@@ -66,6 +161,24 @@ class FileSystemManager:
              logger.exception(f"Error resolving project root path '{project_root_path}'.")
              raise ValueError(f"An unexpected error occurred resolving project root path: {e}") from e
 
+        # --- NEW: Content-addressed blob store backing incremental snapshots ---
+        self.snapshot_store = SnapshotStore(self.project_root)
+        # --- NEW: Write-ahead journal of pre-images for cheap, change-sized rollbacks ---
+        self.journal = RollbackJournal(self.snapshot_store)
+        # --- NEW: Single persistent index of project files shared by all tree scans ---
+        self.file_index = ProjectFileIndex(self.project_root)
+        # --- NEW: Cached directory listings for the structure map, invalidated on our own writes ---
+        self.directory_tree = DirectoryTreeCache(self.project_root, ProjectFileIndex.EXCLUDED_DIRS)
+        # --- NEW: Post-delete hooks (e.g. dropping a deleted file's cached parse) ---
+        self._file_removed_listeners: List[Callable[[str], None]] = []
+        # --- NEW: LRU cache of file hashes so unchanged files are never re-hashed ---
+        self._hash_cache: "OrderedDict[Tuple[int, int, int], str]" = OrderedDict()
+        self._hash_cache_lock = threading.Lock()
+        # --- NEW: Finish or discard multi-file transactions interrupted by a crash ---
+        self.txn_root = self.project_root / ".vebgen" / "txn"
+        recovered = recover_transactions(self, self.txn_root)
+        if recovered:
+            logger.warning(f"Recovered {len(recovered)} file(s) from interrupted transactions: {recovered[:5]}")
 
     def _resolve_safe_path(self, relative_path: str | Path) -> Path:
         """
@@ -130,7 +243,7 @@ class FileSystemManager:
             raise ValueError(f"Path traversal detected: '{relative_path_str}' resolves outside the project root.")
 
 
-    def write_file(self, relative_path: str | Path, content: str, encoding: str = 'utf-8') -> None:
+    def write_file(self, relative_path: str | Path, content: str, encoding: str = 'utf-8') -> FileWriteEvent:
         """
         Safely writes content to a file within the project root.
 
@@ -141,6 +254,9 @@ class FileSystemManager:
             content: The string content to write to the file.
             encoding: The text encoding to use (defaults to 'utf-8').
 
+        Returns:
+            A FileWriteEvent with the written content and the hash of the written bytes.
+
         Raises:
             ValueError: If the relative_path is invalid or outside the project root.
             RuntimeError: If any OS-level error occurs during directory creation or file writing.
@@ -149,17 +265,34 @@ class FileSystemManager:
             # All public methods MUST start by resolving the path through the security check.
             target_path = self._resolve_safe_path(relative_path)
             logger.info(f"Writing file: {target_path} (relative: '{relative_path}')")
+            self._journal_pre_image(target_path)
 
             # Ensure parent directory exists before attempting to write the file.
             # This prevents errors if the target directory structure isn't already present.
             target_path.parent.mkdir(parents=True, exist_ok=True)
             logger.debug(f"Ensured parent directory exists: {target_path.parent}")
 
-            # Write the file content using the specified encoding.
-            # 'w' mode truncates the file if it exists or creates it if it doesn't.
-            with open(target_path, 'w', encoding=encoding) as f:
-                f.write(content)
+            # Encode the content ourselves (with the same newline translation as text mode)
+            # so the hash of the written bytes comes for free.
+            data = (content if os.linesep == '\n' else content.replace('\n', os.linesep)).encode(encoding)
+            # 'wb' mode truncates the file if it exists or creates it if it doesn't.
+            with open(target_path, 'wb') as f:
+                f.write(data)
+            sha256_hash = hashlib.sha256(data).hexdigest()
+            self._note_file_changed(target_path, sha256_hash)
             logger.info(f"Successfully wrote {len(content)} bytes to file: {target_path}")
+            # The bytes written are usually exactly the UTF-8 of the returned content, so their hash serves for both.
+            if os.linesep == '\n' and '\r' not in content and encoding.lower().replace('-', '').replace('_', '') == 'utf8':
+                content_sha256 = sha256_hash
+            else:
+                content = content.replace('\r\n', '\n').replace('\r', '\n')
+                content_sha256 = hashlib.sha256(content.encode('utf-8')).hexdigest()
+            return FileWriteEvent(
+                path=target_path.relative_to(self.project_root).as_posix(),
+                content=content,
+                sha256=sha256_hash,
+                content_sha256=content_sha256,
+            )
  
         except ValueError:
             # Re-raise path validation errors so the caller knows the operation was blocked.
@@ -198,7 +331,8 @@ class FileSystemManager:
             relative_path_str = str(relative_path)
             if relative_path_str in from_snapshot:
                 logger.info(f"Reading file '{relative_path_str}' from provided snapshot.")
-                return from_snapshot[relative_path_str].get('content', '')
+                # Snapshot content is loaded lazily; binary files have `content` None.
+                return from_snapshot[relative_path_str].get('content') or ''
             else:
                 raise FileNotFoundError(f"File '{relative_path_str}' not found in the provided snapshot.")
 
@@ -234,6 +368,121 @@ class FileSystemManager:
             logger.exception(f"Unexpected error reading file '{relative_path}'")
             raise RuntimeError(f"Unexpected error reading file '{relative_path}': {e}") from e
 
+    def read_file_with_hash(self, relative_path: str | Path, encoding: str = 'utf-8') -> Tuple[str, str]:
+        """
+        Reads a file and returns its text together with the SHA256 hash of its bytes.
+
+        The file is opened once: the hash is computed over the same bytes that are
+        decoded, so callers that need both no longer read the file twice. The text
+        is decoded with universal newlines, exactly like `read_file`.
+
+        Args:
+            relative_path: The path relative to the project root.
+            encoding: The text encoding to use (defaults to 'utf-8').
+
+        Returns:
+            A tuple of (content, sha256 hex digest).
+
+        Raises:
+            ValueError: If the relative_path is invalid or outside the project root,
+                        or the content cannot be decoded with `encoding`.
+            FileNotFoundError: If the file does not exist at the resolved path.
+            RuntimeError: If any other OS-level error occurs during file reading.
+        """
+        target_path = self._resolve_safe_path(relative_path)
+        if not target_path.is_file():
+            logger.warning(f"File not found at resolved path: {target_path}")
+            raise FileNotFoundError(f"File not found: '{relative_path}' (resolved to {target_path})")
+        try:
+            with open(target_path, 'rb') as f:
+                data = f.read()
+                stat_result = os.fstat(f.fileno())
+        except OSError as e:
+            logger.exception(f"Error reading file '{relative_path}'")
+            raise RuntimeError(f"Failed to read file '{relative_path}': {e}") from e
+
+        sha256_hash = self._lookup_cached_hash(stat_result)
+        if sha256_hash is None:
+            sha256_hash = hashlib.sha256(data).hexdigest()
+            self._remember_hash(target_path, stat_result, sha256_hash)
+        content = data.decode(encoding).replace('\r\n', '\n').replace('\r', '\n')
+        logger.info(f"Successfully read {len(content)} bytes (sha256 {sha256_hash[:12]}) from file: {target_path}")
+        return content, sha256_hash
+
+    def _note_file_changed(self, target_path: Path, sha256_hash: Optional[str] = None) -> None:
+        """Updates the file index and the structure map cache after writing a file."""
+        self.file_index.note_changed(target_path, sha256_hash)
+        self.directory_tree.invalidate_path(target_path)
+
+    def add_file_removed_listener(self, listener: Callable[[str], None]) -> None:
+        """
+        Registers a callback invoked with the project-relative POSIX path of every
+        file this manager deletes, including deletions made by rollbacks.
+        """
+        self._file_removed_listeners.append(listener)
+
+    def _note_file_removed(self, target_path: Path) -> None:
+        """Updates the file index and the structure map cache after deleting a file, and notifies listeners."""
+        self.file_index.note_removed(target_path)
+        self.directory_tree.invalidate_path(target_path)
+        relative_path_str = target_path.relative_to(self.project_root).as_posix()
+        for listener in self._file_removed_listeners:
+            try:
+                listener(relative_path_str)
+            except Exception as e:
+                logger.error(f"File removal listener failed for '{relative_path_str}': {e}")
+
+    def read_file_view(self, relative_path: str | Path, encoding: str = 'utf-8') -> FileView:
+        """
+        Opens a read-only, memory-mapped view of a file within the project root.
+
+        Unlike `read_file`, this never decodes the whole file: the view can report the
+        file's size, detect binary content and return its head, tail or leading lines.
+        Use it for large fixtures, data files, migrations and logs. The caller must
+        close the view (it is a context manager).
+
+        Raises:
+            ValueError: If the relative_path is invalid or outside the project root.
+            FileNotFoundError: If the file does not exist at the resolved path.
+            RuntimeError: If the file cannot be opened or mapped.
+        """
+        target_path = self._resolve_safe_path(relative_path)
+        if not target_path.is_file():
+            logger.warning(f"File not found at resolved path: {target_path}")
+            raise FileNotFoundError(f"File not found: '{relative_path}' (resolved to {target_path})")
+        try:
+            return FileView(target_path, encoding)
+        except OSError as e:
+            logger.exception(f"Error opening file view for '{relative_path}'")
+            raise RuntimeError(f"Failed to open file view for '{relative_path}': {e}") from e
+
+    def _lookup_cached_hash(self, stat_result: os.stat_result) -> Optional[str]:
+        """Returns the cached hash for a file in exactly this (inode, mtime, size) state, if any."""
+        key = (stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size)
+        with self._hash_cache_lock:
+            sha256_hash = self._hash_cache.get(key)
+            if sha256_hash is not None:
+                self._hash_cache.move_to_end(key)
+            return sha256_hash
+
+    def _remember_hash(self, target_path: Path, stat_result: os.stat_result, sha256_hash: str) -> None:
+        """
+        Caches a computed hash. Files modified within the racy window are not
+        cached, since they could change again without their stat changing.
+        """
+        self.file_index.record_hash(
+            target_path.relative_to(self.project_root).as_posix(),
+            stat_result.st_size, stat_result.st_mtime_ns, sha256_hash,
+        )
+        if time.time_ns() - stat_result.st_mtime_ns < RACY_WINDOW_NS:
+            return
+        key = (stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size)
+        with self._hash_cache_lock:
+            self._hash_cache[key] = sha256_hash
+            self._hash_cache.move_to_end(key)
+            while len(self._hash_cache) > self.HASH_CACHE_SIZE:
+                self._hash_cache.popitem(last=False)
+
     def create_directory(self, relative_path: str | Path) -> None:
         """
         Safely creates a directory (and any necessary parent directories) within the project root.
@@ -256,6 +505,7 @@ class FileSystemManager:
             # Create the directory, including parents.
             # exist_ok=True prevents errors if the directory already exists.
             target_path.mkdir(parents=True, exist_ok=True)
+            self.directory_tree.invalidate_path(target_path)
             logger.info(f"Successfully created directory (or it already existed): {target_path}")
 
         except ValueError:
@@ -272,29 +522,18 @@ class FileSystemManager:
 
     def get_all_files_in_project(self) -> List[str]:
         """
-        Scans the entire project directory recursively and returns a list of all
-        relative file paths, respecting common exclusion rules.
+        Returns a list of all relative file paths in the project (as known to the
+        project file index), respecting common exclusion rules.
 
         Returns:
             A list of strings, where each string is a relative path to a file.
         """
-        all_files: List[str] = []
-        excluded_dirs = {".git", ".venv", "venv", "__pycache__", "node_modules", ".vebgen", "dist", "build"}
-        excluded_extensions = {".pyc", ".pyo", ".pyd", ".log", ".bak", ".sqlite3", ".DS_Store"}
-
-        for root, dirs, files in os.walk(self.project_root, topdown=True):
-            # Modify dirs in-place to prevent recursion into excluded directories
-            dirs[:] = [d for d in dirs if d not in excluded_dirs]
-
-            for filename in files:
-                if Path(filename).suffix in excluded_extensions:
-                    continue
-
-                full_path = Path(root) / filename
-                relative_path = full_path.relative_to(self.project_root).as_posix()
-                all_files.append(relative_path)
-
-        return all_files
+        self.file_index.ensure_fresh()
+        return self.file_index.files(
+            excluded_dirs={"dist", "build"},
+            excluded_files={".DS_Store"},
+            excluded_extensions={".pyc", ".pyo", ".pyd", ".log", ".bak", ".sqlite3"},
+        )
 
     def file_exists(self, relative_path: str | Path) -> bool:
         """
@@ -326,29 +565,65 @@ class FileSystemManager:
             logger.warning(f"Error checking directory existence for '{relative_path}': {e}")
             return False
 
-    def _validate_and_rollback_on_error(self, relative_path: str | Path, original_content: str):
-        """
-        Validates Python syntax after a file write. If syntax is invalid,
-        rolls back the file to its original content and raises a PatchApplyError.
-        """
-        # This check only applies to Python files.
-        if not str(relative_path).endswith('.py'):
-            return
+    def _validate_candidate_content(
+        self, relative_path: str | Path, new_content: str, original_content: str
+    ) -> Optional[ast.Module]:
+        """
+        Validates patched content in memory, before anything is written to disk.
+
+        - Python files must parse; the parsed module is returned so it can be handed
+          on to `CodeIntelligenceService.parse_file`. Parsing is a single
+          `compile(..., PyCF_ONLY_AST)`. The full bytecode compile, which also reports
+          the errors the parser cannot (e.g. `return` outside a function, `break`
+          outside a loop), costs about half as much again on a large file, so it only
+          runs if the patch adds one of the constructs those errors concern. An edit
+          that merely re-indents existing ones into an invalid position is reported
+          when the module is imported instead.
+        - JSON files (up to JSON_VALIDATION_MAX_CHARS) must still parse, if the
+          original did.
+        - HTML templates must keep their Django `{% block/if/for/with %}` tags
+          balanced, if the original had them balanced.
 
-        try:
-            # Use read_file to get the content we just wrote and compile it.
-            current_content = self.read_file(relative_path)
-            compile(current_content, str(relative_path), 'exec')
+        Returns:
+            The parsed module for Python files, otherwise None.
+
+        Raises:
+            PatchApplyError: If the patch would introduce a syntax error.
+        """
+        path_str = str(relative_path)
+        if path_str.endswith('.py'):
+            try:
+                tree = compile(new_content, path_str, 'exec', flags=ast.PyCF_ONLY_AST)
+                if _adds_compile_checked_tokens(new_content, original_content):
+                    compile(tree, path_str, 'exec')
+            except (SyntaxError, ValueError) as e:
+                self.logger.error(f"Patch would create a syntax error in '{relative_path}': {e}. Not writing it.")
+                raise PatchApplyError(f"Patch created syntax error: {e}") from e
             self.logger.info(f"Syntax validation passed for '{relative_path}'.")
-        except (SyntaxError, Exception) as e:
-            self.logger.error(f"Patch created a syntax error in '{relative_path}': {e}. Rolling back change.")
-            # Rollback the change by writing the original content back.
-            self.write_file(relative_path, original_content)
-            raise PatchApplyError(f"Patch created syntax error: {e}") from e
+            return tree
+
+        if path_str.endswith('.json') and len(new_content) <= self.JSON_VALIDATION_MAX_CHARS:
+            try:
+                json.loads(original_content)
+            except ValueError:
+                return None  # The file was not valid JSON to begin with (e.g. JSON with comments).
+            try:
+                json.loads(new_content)
+            except ValueError as e:
+                self.logger.error(f"Patch would create invalid JSON in '{relative_path}': {e}. Not writing it.")
+                raise PatchApplyError(f"Patch created syntax error: invalid JSON: {e}") from e
+            return None
 
-    def _apply_patch_strict(self, relative_path: str | Path, patch_content: str) -> None: # type: ignore
+        if path_str.endswith(('.html', '.htm')):
+            unbalanced = _unbalanced_template_tags(new_content)
+            if unbalanced and not _unbalanced_template_tags(original_content):
+                self.logger.error(f"Patch would unbalance template tags {unbalanced} in '{relative_path}'. Not writing it.")
+                raise PatchApplyError(f"Patch created syntax error: unbalanced template tags: {', '.join(unbalanced)}")
+        return None
+
+    def _apply_patch_strict(self, relative_path: str | Path, patch_content: str) -> Optional[Dict[str, Any]]: # type: ignore
         """
-        Safely applies a diff patch to a file within the project root.
+        Safely applies a diff patch to a file within the project root. Returns diff data on success.
         """
         try:
             target_path = self._resolve_safe_path(relative_path)
@@ -368,8 +643,13 @@ class FileSystemManager:
                 patch_set = PatchSet(patch_content)
                 if not patch_set:
                     raise ValueError("Patch content is empty or invalid.")
+
+                # Fast path: splice hunks whose context matches at (or near) their stated line.
+                new_content = self._apply_hunks_exact(original_content, patch_set)
+                if new_content is not None:
+                    logger.info(f"All hunks matched exactly for '{relative_path}'; skipping fuzzy patch application.")
                 
-                for patched_file in patch_set:
+                for patched_file in (patch_set if new_content is None else []):
                     for hunk in patched_file:
                         patch = patch_obj()
                         patch.start1 = hunk.source_start - 1
@@ -392,8 +672,11 @@ class FileSystemManager:
                 logger.error(f"Failed to parse patch string for '{relative_path}': {e}")
                 raise PatchApplyError(f"Invalid patch format for '{relative_path}': {e}") from e
 
-            # Now, apply the manually constructed patch object
-            new_content, results = dmp.patch_apply(patches, original_content)
+            # Otherwise, apply the manually constructed patch object
+            if new_content is None:
+                new_content, results = dmp.patch_apply(patches, original_content)
+            else:
+                results = []
 
             # Check if all hunks in the patch were applied successfully
             if not all(results):
@@ -404,14 +687,75 @@ class FileSystemManager:
             
             # The result might have an extra newline if the original did not.
             new_content_final = new_content.rstrip('\n') + '\n'
-            self.write_file(relative_path, new_content_final)
+            # --- NEW: Validate syntax in memory before the patched file is written ---
+            parsed_ast = self._validate_candidate_content(relative_path, new_content_final, original_content)
+            write_event = dataclasses.replace(self.write_file(relative_path, new_content_final), parsed_ast=parsed_ast)
+            # Which unified-diff strategy decided the outcome, alongside the SEARCH/REPLACE layer hits.
+            performance_monitor.increment("patch.udiff_dmp.hits" if patches else "patch.udiff_exact.hits")
             logger.info(f"Successfully applied patch to file: {target_path}")
-            # --- NEW: Validate syntax after successful strict patch ---
-            self._validate_and_rollback_on_error(relative_path, original_content)
+            return {
+                'filepath': str(relative_path),
+                'original_content': original_content,
+                'modified_content': new_content_final,
+                'write_event': write_event,
+            }
         except (PatchApplyError, FileNotFoundError, ValueError, RuntimeError) as e: # type: ignore
             logger.error(f"Failed to apply patch to '{relative_path}': {e}", exc_info=True)
             raise e
 
+    def _apply_hunks_exact(self, original_content: str, patch_set: PatchSet) -> Optional[str]:
+        """
+        Applies unified-diff hunks by verifying each hunk's context and removed lines
+        at its stated line offset and splicing the line lists directly.
+
+        A hunk whose lines are off by up to UNIFIED_DIFF_MAX_OFFSET lines is accepted
+        at the nearest matching position. Lines are compared without trailing
+        whitespace, like `_normalize_text_for_diff`, and context lines are kept
+        as they appear in the original.
+
+        Args:
+            original_content: The file content with `\n` line endings.
+            patch_set: The parsed patch.
+
+        Returns:
+            The patched content, or None if any hunk does not match exactly, in which
+            case the caller falls back to diff-match-patch.
+        """
+        lines = original_content.split('\n')
+        ends_with_newline = bool(lines) and lines[-1] == ''
+        if ends_with_newline:
+            lines.pop()
+        result: List[str] = []
+        cursor = 0
+        for patched_file in patch_set:
+            for hunk in patched_file:
+                old_lines = [line.value.rstrip() for line in hunk if line.is_context or line.is_removed]
+                # A hunk without old lines inserts *after* its stated line.
+                stated = hunk.source_start - 1 if old_lines else hunk.source_start
+                position = None
+                for shift in range(self.UNIFIED_DIFF_MAX_OFFSET + 1):
+                    for candidate in ((stated - shift, stated + shift) if shift else (stated,)):
+                        if cursor <= candidate <= len(lines) - len(old_lines) and [line.rstrip() for line in lines[candidate:candidate + len(old_lines)]] == old_lines:
+                            position = candidate
+                            break
+                    if position is not None:
+                        break
+                if position is None:
+                    return None
+                result.extend(lines[cursor:position])
+                # Context lines are taken from the original so unchanged lines stay byte-identical.
+                offset = position
+                for line in hunk:
+                    if line.is_added:
+                        result.append(line.value.rstrip('\r\n'))
+                    elif line.is_context:
+                        result.append(lines[offset])
+                    if line.is_context or line.is_removed:
+                        offset += 1
+                cursor = position + len(old_lines)
+        result.extend(lines[cursor:])
+        return '\n'.join(result) + ('\n' if ends_with_newline else '')
+
     def apply_patch(self, relative_path: str | Path, patch_content: str) -> Optional[Dict[str, Any]]:
         """
         Enhanced patch application that detects format and applies appropriate strategy.
@@ -533,18 +877,18 @@ class FileSystemManager:
             # Reconstruct the file content
             modified_content = ''.join(modified_lines)
             
-            # Write the modified content
-            self.write_file(relative_path, modified_content)
-            
-            # --- NEW: Validate syntax after successful fuzzy patch ---
-            self._validate_and_rollback_on_error(relative_path, original_content)
+            # --- NEW: Validate syntax in memory before the patched file is written ---
+            parsed_ast = self._validate_candidate_content(relative_path, modified_content, original_content)
+            write_event = dataclasses.replace(self.write_file(relative_path, modified_content), parsed_ast=parsed_ast)
+            performance_monitor.increment("patch.udiff_fuzzy.hits")
             self.logger.info(f"Fuzzy patch successfully applied to {relative_path}")
  
             # NEW: Return diff data for UI display
             return {
                 'original_content': original_content,
                 'modified_content': modified_content,
-                'filepath': str(relative_path)
+                'filepath': str(relative_path),
+                'write_event': write_event,
             }
         except PatchApplyError:
             # If a specific PatchApplyError (like from syntax validation) was raised, re-raise it directly.
@@ -629,6 +973,9 @@ class FileSystemManager:
         Returns:
             Tuple of (success, diff_data_dict)
         """
+        # Matching metrics are buffered and recorded once, for the pass that decided the outcome.
+        patch_metrics: List[Tuple[str, str, float]] = []
+        written = False
         try:
             target_path = self._resolve_safe_path(relative_path)
             
@@ -649,28 +996,43 @@ class FileSystemManager:
             
             self.logger.info(f"Parsed {len(blocks)} SEARCH/REPLACE block(s) for {relative_path}")
             
-            # Apply each block sequentially using the multi-layer strategy
-            for block_idx, (search_block, replace_block) in enumerate(blocks, 1):
+            # Independent blocks are located against the original and applied in one splice.
+            edits = self._plan_search_replace_blocks(original_content, blocks, str(relative_path), patch_metrics) if len(blocks) > 1 else None
+            if edits is not None:
+                pieces = []
+                position = 0
+                for start, end, replacement in edits:
+                    pieces.append(original_content[position:start])
+                    pieces.append(replacement)
+                    position = end
+                pieces.append(original_content[position:])
+                modified_content = ''.join(pieces)
+                blocks_to_apply = []
+            else:
+                blocks_to_apply = blocks
+
+            # Otherwise apply each block sequentially using the multi-layer strategy
+            for block_idx, (search_block, replace_block) in enumerate(blocks_to_apply, 1):
                 self.logger.info(f"Applying block {block_idx}/{len(blocks)}...")
                 
+                line_index = LineIndex(modified_content)
                 success, new_content = self._apply_single_search_replace(
-                    modified_content, search_block, replace_block, str(relative_path), block_idx
+                    modified_content, search_block, replace_block, str(relative_path), block_idx, line_index, patch_metrics
                 )
                 
                 if not success:
-                    # Generate a detailed, helpful error message for the LLM
+                    # Generate a detailed, helpful error message for the LLM, reusing the matching candidates
                     error_msg = self._generate_search_replace_error(
-                        search_block, modified_content, str(relative_path), block_idx, len(blocks)
+                        search_block, modified_content, str(relative_path), block_idx, len(blocks), line_index
                     )
                     raise PatchApplyError(error_msg)
                 
                 modified_content = new_content
             
-            # Write the final modified content
-            self.write_file(relative_path, modified_content)
-            
-            # Validate syntax for Python files
-            self._validate_and_rollback_on_error(relative_path, original_content)
+            # Validate syntax in memory, then write the final modified content
+            parsed_ast = self._validate_candidate_content(relative_path, modified_content, original_content)
+            write_event = dataclasses.replace(self.write_file(relative_path, modified_content), parsed_ast=parsed_ast)
+            written = True
             
             self.logger.info(f"Successfully applied all {len(blocks)} SEARCH/REPLACE blocks to {relative_path}")
             
@@ -678,7 +1040,8 @@ class FileSystemManager:
             diff_data = {
                 "filepath": str(relative_path),
                 "original_content": original_content,
-                "modified_content": modified_content
+                "modified_content": modified_content,
+                "write_event": write_event,
             }
             
             return True, diff_data
@@ -686,6 +1049,8 @@ class FileSystemManager:
         except (PatchApplyError, FileNotFoundError, ValueError) as e:
             self.logger.error(f"Failed to apply SEARCH/REPLACE patch to {relative_path}: {e}", exc_info=True)
             raise
+        finally:
+            self._flush_patch_metrics(patch_metrics, written)
 
     def _apply_single_search_replace(
         self,
@@ -693,109 +1058,228 @@ class FileSystemManager:
         search_block: str,
         replace_block: str,
         filepath: str,
-        block_num: int
+        block_num: int,
+        line_index: Optional[LineIndex] = None,
+        metrics: Optional[List[Tuple[str, str, float]]] = None
     ) -> Tuple[bool, str]:
         """
         Applies a single SEARCH/REPLACE block using 5-layer matching strategy.
-        
+
+        Args:
+            line_index: A `LineIndex` of `content` to reuse; one is built if omitted.
+            metrics: A buffer for the matching metrics (see `_locate_search_replace_block`);
+                     without one, they are recorded right away.
+
         Returns:
             Tuple of (success, modified_content)
         """
-        self.logger.info(f"[METRICS] Attempting SEARCH/REPLACE block {block_num} on {filepath}")
+        if metrics is None:
+            metrics = []
+            location = self._locate_search_replace_block(
+                content, search_block, replace_block, filepath, block_num, line_index, metrics
+            )
+            self._flush_patch_metrics(metrics, location is not None)
+        else:
+            location = self._locate_search_replace_block(
+                content, search_block, replace_block, filepath, block_num, line_index, metrics
+            )
+        if location is None:
+            return False, content
+        start, end, replacement = location
+        return True, content[:start] + replacement + content[end:]
+
+    def _locate_search_replace_block(
+        self,
+        content: str,
+        search_block: str,
+        replace_block: str,
+        filepath: str,
+        block_num: int,
+        line_index: Optional[LineIndex],
+        metrics: List[Tuple[str, str, float]]
+    ) -> Optional[Tuple[int, int, str]]:
+        """
+        Finds where a single SEARCH/REPLACE block applies, using the 5-layer matching strategy.
+
+        Args:
+            line_index: A `LineIndex` of `content` to reuse; one is built if None.
+            metrics: A buffer the layer timings, hits, ratios and edit size are appended to
+                     as (performance_monitor method, metric, value), to be recorded by
+                     `_flush_patch_metrics` once the patch's outcome is known.
+
+        Returns:
+            A tuple of (start, end, replacement): `content[start:end]` is to be replaced
+            by `replacement` (already re-indented for layers 2-4). None if no layer matched.
+        """
+        self.logger.debug(f"Attempting SEARCH/REPLACE block {block_num} on {filepath}")
         
         # LAYER 1: Exact Match (50-60% success rate)
-        if search_block in content:
-            self.logger.info(f"Block {block_num}: Exact match found")
-            new_content = content.replace(search_block, replace_block, 1)  # Replace only first occurrence
-            self.logger.info(f"[METRICS] Layer_1_Exact_Match SUCCESS for block {block_num}")
-            return True, new_content
-        
-        # LAYER 2: Whitespace-Insensitive Match (+15% success)
-        normalized_search = ' '.join(search_block.split())
-        content_lines = content.split('\n')
-        
-        for line_idx in range(len(content_lines)):
-            # Try to find a match starting at this line
-            window_size = search_block.count('\n') + 1
-            if line_idx + window_size > len(content_lines):
-                break
-            
-            window = '\n'.join(content_lines[line_idx:line_idx + window_size])
-            normalized_window = ' '.join(window.split())
-            
-            if normalized_search == normalized_window:
-                self.logger.info(f"Block {block_num}: Whitespace-insensitive match found at line {line_idx + 1}")
-                self.logger.info(f"[METRICS] Layer_2_Whitespace_Insensitive SUCCESS for block {block_num}")
-                # Preserve the indentation of the original location
-                indentation = self._get_leading_whitespace(content_lines[line_idx])
-                indented_replace = self._apply_indentation(replace_block, indentation)
-                
-                new_lines = content_lines[:line_idx] + indented_replace.split('\n') + content_lines[line_idx + window_size:]
-                return True, '\n'.join(new_lines)
+        started = time.perf_counter()
+        exact_pos = content.find(search_block)  # Replace only first occurrence
+        self._record_patch_layer(metrics, "layer_1_exact", started, exact_pos != -1)
+        if exact_pos != -1:
+            self.logger.debug(f"Block {block_num}: Exact match found")
+            return self._record_patch_location(metrics, exact_pos, exact_pos + len(search_block), replace_block)
         
+        # Layers 2-4 locate candidate windows through a line index built once per content.
+        if line_index is None or line_index.content is not content:
+            line_index = LineIndex(content)
+        content_lines = line_index.lines
+
         # LAYER 3: Indentation-Preserving Match (+10% success)
-        search_stripped = self._strip_common_leading_whitespace(search_block)
-        
-        for line_idx in range(len(content_lines)):
-            window_size = search_block.count('\n') + 1
-            if line_idx + window_size > len(content_lines):
-                break
-            
-            window = '\n'.join(content_lines[line_idx:line_idx + window_size])
-            window_stripped = self._strip_common_leading_whitespace(window)
-            
-            if search_stripped == window_stripped:
-                self.logger.info(f"Block {block_num}: Indentation-preserving match found at line {line_idx + 1}")
-                self.logger.info(f"[METRICS] Layer_3_Indentation_Preserving SUCCESS for block {block_num}")
-                indentation = self._get_leading_whitespace(content_lines[line_idx])
-                indented_replace = self._apply_indentation(replace_block, indentation)
-                
-                new_lines = content_lines[:line_idx] + indented_replace.split('\n') + content_lines[line_idx + window_size:]
-                return True, '\n'.join(new_lines)
-        
-        # LAYER 4: Fuzzy Match with difflib (+12% success)
-        best_match_ratio = 0.0
-        best_match_idx = -1
-        best_match_size = 0
-        
+        # Tried before layer 2: every window it accepts is also whitespace-insensitively
+        # equal, so checked second it could never decide. It is the stricter of the two,
+        # keeping the relative indentation of the block intact.
+        window_size = search_block.count('\n') + 1
+        started = time.perf_counter()
+        line_idx = line_index.find_indentation_preserving(search_block)
+        self._record_patch_layer(metrics, "layer_3_indentation", started, line_idx is not None)
+        if line_idx is not None:
+            self.logger.debug(f"Block {block_num}: Indentation-preserving match found at line {line_idx + 1}")
+            indentation = self._get_leading_whitespace(content_lines[line_idx])
+            indented_replace = self._apply_indentation(replace_block, indentation)
+            return self._record_patch_location(metrics, *line_index.span(line_idx, window_size), indented_replace)
+
+        # LAYER 2: Whitespace-Insensitive Match (+15% success)
+        started = time.perf_counter()
+        line_idx = line_index.find_whitespace_insensitive(search_block)
+        self._record_patch_layer(metrics, "layer_2_whitespace", started, line_idx is not None)
+        if line_idx is not None:
+            self.logger.debug(f"Block {block_num}: Whitespace-insensitive match found at line {line_idx + 1}")
+            # Preserve the indentation of the original location
+            indentation = self._get_leading_whitespace(content_lines[line_idx])
+            indented_replace = self._apply_indentation(replace_block, indentation)
+            return self._record_patch_location(metrics, *line_index.span(line_idx, window_size), indented_replace)
+
+        # LAYER 4: Fuzzy Match with rapidfuzz over anchor-selected windows (+12% success)
+        started = time.perf_counter()
         search_lines = search_block.split('\n')
-        window_size = len(search_lines)
-        
-        for line_idx in range(len(content_lines) - window_size + 1):
-            window_lines = content_lines[line_idx:line_idx + window_size]
-            
-            # Calculate similarity ratio
-            matcher = difflib.SequenceMatcher(None, search_lines, window_lines)
-            ratio = matcher.ratio()
-            
-            if ratio > best_match_ratio:
-                best_match_ratio = ratio
-                best_match_idx = line_idx
-                best_match_size = window_size
-        
-        # Use 85% similarity threshold
-        if best_match_ratio >= self.FUZZY_MATCH_THRESHOLD:
+        best_match_idx, best_match_ratio = line_index.find_fuzzy(
+            search_lines, self.FUZZY_MATCH_THRESHOLD, self.SEARCH_REPLACE_SCAN_BUDGET
+        )
+        best_match_size = len(search_lines)
+
+        # Use the FUZZY_MATCH_THRESHOLD similarity threshold
+        fuzzy_matched = best_match_ratio >= self.FUZZY_MATCH_THRESHOLD and best_match_idx >= 0
+        self._record_patch_layer(metrics, "layer_4_fuzzy", started, fuzzy_matched)
+        if best_match_idx >= 0:
+            # Windows below FUZZY_MATCH_THRESHOLD are abandoned while scoring, so only hits have a ratio here.
+            metrics.append(("observe", "patch.layer_4_fuzzy.best_ratio", best_match_ratio))
+        if fuzzy_matched:
             self.logger.info(
                 f"Block {block_num}: Fuzzy match found at line {best_match_idx + 1} "
                 f"(similarity: {best_match_ratio:.1%})"
             )
-            self.logger.info(f"[METRICS] Layer_4_Fuzzy_Match SUCCESS for block {block_num} (similarity: {best_match_ratio:.2%})")
 
             # Preserve indentation
-            if best_match_idx >= 0:
-                indentation = self._get_leading_whitespace(content_lines[best_match_idx])
-                indented_replace = self._apply_indentation(replace_block, indentation)
-                
-                new_lines = (
-                    content_lines[:best_match_idx] +
-                    indented_replace.split('\n') +
-                    content_lines[best_match_idx + best_match_size:]
-                )
-                return True, '\n'.join(new_lines)
+            indentation = self._get_leading_whitespace(content_lines[best_match_idx])
+            indented_replace = self._apply_indentation(replace_block, indentation)
+            return self._record_patch_location(metrics, *line_index.span(best_match_idx, best_match_size), indented_replace)
         
-        # LAYER 5: Reserved for Tree-Sitter (implement in Phase 3)
-        self.logger.warning(f"[METRICS] All_Layers_Failed for block {block_num}")
-        return False, content
+        # LAYER 5: Structural Match on Python definitions (function/class/method spans)
+        if filepath.endswith('.py'):
+            started = time.perf_counter()
+            structural = line_index.find_python_structural(search_lines, self.STRUCTURAL_MATCH_THRESHOLD)
+            self._record_patch_layer(metrics, "layer_5_structural", started, structural is not None)
+            if structural is not None:
+                metrics.append(("observe", "patch.layer_5_structural.ratio", structural.ratio))
+                self.logger.info(
+                    f"Block {block_num}: Structural match in '{structural.qualname}' at line {structural.line_idx + 1} "
+                    f"(similarity: {structural.ratio:.1%})"
+                )
+                # Re-indent the REPLACE block to the located definition's indentation.
+                indentation = self._get_leading_whitespace(content_lines[structural.line_idx])
+                indented_replace = self._apply_indentation(self._strip_common_leading_whitespace(replace_block), indentation)
+                return self._record_patch_location(
+                    metrics, *line_index.span(structural.line_idx, structural.line_count), indented_replace
+                )
+
+        metrics.append(("increment", "patch.all_layers_failed", 1))
+        self.logger.warning(f"All matching layers failed for SEARCH/REPLACE block {block_num} on {filepath}")
+        return None
+
+    def _record_patch_layer(self, metrics: List[Tuple[str, str, float]], layer: str, started: float, matched: bool) -> None:
+        """Buffers one matching layer's attempt (time spent) and, if it matched, its hit."""
+        metrics.append(("record", f"patch.{layer}", time.perf_counter() - started))
+        if matched:
+            metrics.append(("increment", f"patch.{layer}.hits", 1))
+
+    def _record_patch_location(self, metrics: List[Tuple[str, str, float]], start: int, end: int, replacement: str) -> Tuple[int, int, str]:
+        """Buffers the size of a located edit and passes it through."""
+        metrics.append(("increment", "patch.chars_replaced", end - start))
+        metrics.append(("increment", "patch.chars_inserted", len(replacement)))
+        return start, end, replacement
+
+    def _flush_patch_metrics(self, metrics: List[Tuple[str, str, float]], written: bool) -> None:
+        """
+        Records buffered matching metrics in the performance monitor. Edit sizes are
+        only recorded if the edits were written.
+        """
+        for method, metric, value in metrics:
+            if written or not metric.startswith("patch.chars_"):
+                getattr(performance_monitor, method)(metric, value)
+        metrics.clear()
+
+    def _plan_search_replace_blocks(
+        self, content: str, blocks: List[Tuple[str, str]], filepath: str,
+        metrics: Optional[List[Tuple[str, str, float]]] = None
+    ) -> Optional[List[Tuple[int, int, str]]]:
+        """
+        Locates every SEARCH/REPLACE block against the original content so they can be
+        applied in one splice, instead of re-splitting and rescanning the whole file
+        after each block.
+
+        Blocks depend on each other's output, and the plan is abandoned, when:
+          - a block's SEARCH contains a line that an earlier block's REPLACE introduces, or
+          - two blocks' target regions overlap.
+
+        A block that cannot be located at all fails the patch right away: no earlier
+        block introduces its lines, so applying them first would not help.
+
+        The matching metrics of the blocks are appended to `metrics` unless the plan
+        is abandoned, so blocks applied sequentially are not counted twice.
+
+        Returns:
+            Non-overlapping (start, end, replacement) edits sorted by position, or None
+            if the blocks must be applied sequentially.
+
+        Raises:
+            PatchApplyError: If a block cannot be located, with the same detailed
+                             message as the sequential path.
+        """
+        def _nonblank_lines(text: str) -> set:
+            return {line.strip() for line in text.split('\n') if line.strip()}
+
+        introduced: set = set()
+        for search_block, replace_block in blocks:
+            if introduced & _nonblank_lines(search_block):
+                self.logger.info(f"SEARCH/REPLACE blocks for {filepath} build on each other; applying sequentially.")
+                return None
+            introduced |= _nonblank_lines(replace_block) - _nonblank_lines(search_block)
+
+        line_index = LineIndex(content)
+        plan_metrics: List[Tuple[str, str, float]] = []
+        edits = []
+        for block_idx, (search_block, replace_block) in enumerate(blocks, 1):
+            location = self._locate_search_replace_block(
+                content, search_block, replace_block, filepath, block_idx, line_index, plan_metrics
+            )
+            if location is None:
+                if metrics is not None:
+                    metrics.extend(plan_metrics)
+                raise PatchApplyError(self._generate_search_replace_error(
+                    search_block, content, filepath, block_idx, len(blocks), line_index
+                ))
+            edits.append(location)
+
+        edits.sort(key=lambda edit: (edit[0], edit[1]))
+        for previous, following in zip(edits, edits[1:]):
+            if following[0] < previous[1] or following[0] == previous[0]:
+                self.logger.info(f"SEARCH/REPLACE blocks for {filepath} overlap; applying sequentially.")
+                return None
+        if metrics is not None:
+            metrics.extend(plan_metrics)
+        return edits
 
     def _get_leading_whitespace(self, line: str) -> str:
         """Extracts leading whitespace from a line."""
@@ -803,29 +1287,7 @@ class FileSystemManager:
 
     def _strip_common_leading_whitespace(self, text: str) -> str:
         """Removes common leading whitespace from all lines."""
-        lines = text.split('\n')
-        if not lines:
-            return text
-        
-        # Find minimum indentation (ignoring empty lines)
-        min_indent = float('inf')
-        for line in lines:
-            if line.strip():  # Skip empty lines
-                indent = len(line) - len(line.lstrip())
-                min_indent = min(min_indent, indent)
-        
-        if min_indent == float('inf'):
-            return text
-        
-        # Remove that amount from each line
-        stripped_lines = []
-        for line in lines:
-            if line.strip():
-                stripped_lines.append(line[int(min_indent):])
-            else:
-                stripped_lines.append(line)
-        
-        return '\n'.join(stripped_lines)
+        return strip_common_leading_whitespace(text)
 
     def _apply_indentation(self, text: str, indentation: str) -> str:
         """Applies given indentation to each line of text."""
@@ -833,25 +1295,24 @@ class FileSystemManager:
         return '\n'.join(indentation + line if line.strip() else line for line in lines)
 
     def _generate_search_replace_error(
-        self, search_block: str, file_content: str, filepath: str, block_num: int, total_blocks: int
+        self, search_block: str, file_content: str, filepath: str, block_num: int, total_blocks: int,
+        line_index: Optional[LineIndex] = None
     ) -> str:
-        """Generates a detailed, helpful error message when SEARCH/REPLACE fails."""
-        file_lines = file_content.split('\n')
+        """
+        Generates a detailed, helpful error message when SEARCH/REPLACE fails.
+
+        Args:
+            line_index: The `LineIndex` the failed matching used; its fuzzy candidates are
+                        reused for the suggestion instead of rescanning the file.
+        """
+        if line_index is None or line_index.content is not file_content:
+            line_index = LineIndex(file_content)
         search_lines = search_block.split('\n')
         
-        best_match_ratio = 0.0
-        best_match_idx = 0
-        best_match_lines = []
-        
-        for line_idx in range(len(file_lines) - len(search_lines) + 1):
-            window = file_lines[line_idx:line_idx + len(search_lines)]
-            matcher = difflib.SequenceMatcher(None, search_lines, window)
-            ratio = matcher.ratio()
-            
-            if ratio > best_match_ratio:
-                best_match_ratio = ratio
-                best_match_idx = line_idx
-                best_match_lines = window
+        best_match_idx, best_match_ratio = line_index.closest_window(search_lines, self.SEARCH_REPLACE_SCAN_BUDGET)
+        best_match_lines = (
+            line_index.lines[best_match_idx:best_match_idx + len(search_lines)] if best_match_idx >= 0 else []
+        )
         
         closest_match = '\n'.join(best_match_lines) if best_match_lines else "(no similar content found)"
         
@@ -912,36 +1373,10 @@ SearchReplaceNoExactMatch: SEARCH/REPLACE block #{block_num} of {total_blocks} f
             return "# Error: Project root is not a valid directory."
 
         lines = [f"# Project Directory Map (Structure): `{self.project_root.name}`"]
-        # Define directories and files to exclude from the map to keep it clean and relevant.
-        excluded_dirs = {".git", ".venv", "venv", "__pycache__", "node_modules", ".vebgen"} 
-
-        def _build_tree(current_path: Path, current_depth: int):
-            if current_depth > max_depth:
-                return
-
-            items_listed = 0
-            # Sort entries to list directories before files for better readability.
-            entries = sorted(list(current_path.iterdir()), key=lambda p: (p.is_file(), p.name.lower()))
-
-            for entry in entries:
-                if entry.name in excluded_dirs:
-                    continue
-
-                if items_listed >= max_items_per_dir:
-                    # Add a truncation marker if there are too many items in a directory.
-                    lines.append(f"{indent_char * current_depth}- ... (truncated)")
-                    break
-
-                prefix = indent_char * current_depth
-                if entry.is_dir():
-                    lines.append(f"{prefix}- {entry.name}/")
-                    items_listed += 1
-                    _build_tree(entry, current_depth + 1)
-                elif entry.is_file():
-                    lines.append(f"{prefix}- {entry.name}")
-                    items_listed += 1
-        
-        _build_tree(self.project_root, 0)
+        # Listings are cached per directory (directories first, then files) and only
+        # re-read when the directory was changed; .git, .venv, venv, __pycache__,
+        # node_modules and .vebgen are left out.
+        lines.extend(self.directory_tree.render(max_depth, max_items_per_dir, indent_char))
         return "\n".join(lines)
     # Add this method to your FileSystemManager class
     def discover_django_apps(self) -> List[Path]:
@@ -983,7 +1418,9 @@ SearchReplaceNoExactMatch: SEARCH/REPLACE block #{block_num} of {total_blocks} f
             # tests_py_relative_path is already relative to project_root if app_dir_relative_path is.
             full_tests_py_path = self._resolve_safe_path(tests_py_relative_path.as_posix())
             if full_tests_py_path.is_file():
+                self._journal_pre_image(full_tests_py_path)
                 full_tests_py_path.unlink()
+                self._note_file_removed(full_tests_py_path)
                 logger.info(f"Deleted default tests.py: {full_tests_py_path}")
                 return True
             else:
@@ -1004,6 +1441,7 @@ SearchReplaceNoExactMatch: SEARCH/REPLACE block #{block_num} of {total_blocks} f
         Calculates the SHA256 hash of a file's content.
 
         This can be used to detect if a file has changed without reading its entire content.
+        Hashes are cached by (inode, mtime_ns, size), so unchanged files are not re-read.
 
         Args:
             relative_path: The path relative to the project root.
@@ -1018,12 +1456,20 @@ SearchReplaceNoExactMatch: SEARCH/REPLACE block #{block_num} of {total_blocks} f
                 logger.warning(f"Cannot hash non-existent file: {target_path}")
                 return None
 
+            # Unchanged files are served from the hash cache without being read.
+            cached_hash = self._lookup_cached_hash(os.stat(target_path))
+            if cached_hash is not None:
+                return cached_hash
+
             hasher = hashlib.sha256()
             # Read the file in chunks to handle large files efficiently.
             with open(target_path, 'rb') as f:
                 while chunk := f.read(8192): # Read in 8KB chunks
                     hasher.update(chunk)
-            return hasher.hexdigest()
+                stat_result = os.fstat(f.fileno())
+            sha256_hash = hasher.hexdigest()
+            self._remember_hash(target_path, stat_result, sha256_hash)
+            return sha256_hash
         except Exception as e:
             logger.error(f"Error calculating hash for file '{relative_path}': {e}")
             return None
@@ -1072,6 +1518,7 @@ SearchReplaceNoExactMatch: SEARCH/REPLACE block #{block_num} of {total_blocks} f
             if not target_path.is_file():
                 logger.info(f"File '{relative_path}' does not exist. Nothing to soft-delete.")
                 return
+            self._journal_pre_image(target_path)
 
             # Ensure trash directory exists
             self.trash_dir.mkdir(parents=True, exist_ok=True)
@@ -1086,6 +1533,7 @@ SearchReplaceNoExactMatch: SEARCH/REPLACE block #{block_num} of {total_blocks} f
             trash_path.parent.mkdir(parents=True, exist_ok=True)
 
             shutil.move(str(target_path), trash_path)
+            self._note_file_removed(target_path)
             logger.info(f"Successfully moved file '{relative_path}' to trash at '{trash_path}'.")
         except (ValueError, OSError, IOError) as e:
             logger.exception(f"Error soft-deleting file '{relative_path}'")
@@ -1191,95 +1639,361 @@ SearchReplaceNoExactMatch: SEARCH/REPLACE block #{block_num} of {total_blocks} f
             logger.error(f"Failed to create backup for {relative_path}: {e}")
             raise RuntimeError(f"Failed to create backup for {relative_path}: {e}") from e
 
-    async def create_snapshot(self) -> Dict[str, Dict[str, Any]]:
+    def _iter_snapshot_files(self):
+        """
+        Yields `(relative_posix_path, absolute_path)` for every file that belongs
+        in a project snapshot, honouring the snapshot exclusion rules.
         """
-        Creates an in-memory snapshot of all relevant project files.
+        self.file_index.ensure_fresh()
+        for relative_path_str in self.file_index.files(
+            excluded_dirs=self.SNAPSHOT_EXCLUDED_DIRS,
+            excluded_files=self.SNAPSHOT_EXCLUDED_FILES,
+            excluded_extensions=self.SNAPSHOT_EXCLUDED_EXTENSIONS,
+        ):
+            yield relative_path_str, self.project_root / relative_path_str
 
-        The snapshot stores each file's content and SHA256 hash. It excludes
-        common unnecessary files and directories (like `.git`, `venv`, `__pycache__`).
+    def _capture_snapshot_entry(self, relative_path: str) -> Dict[str, Any]:
+        """
+        Records a lazy snapshot entry for a file, storing its bytes as a blob.
 
-        Returns:
-            A dictionary where keys are relative file paths and values are
-            dictionaries {'content': str, 'sha256': str}.
-        """
-        snapshot: Dict[str, Dict[str, Any]] = {}
-        excluded_dirs = {".git", ".venv", "venv", "__pycache__", "node_modules", ".codenow"}
-        # Define files, directories, and extensions to exclude from the snapshot.
-        excluded_files = {".DS_Store"}
-        excluded_extensions = {".pyc", ".pyo", ".pyd", ".log", ".bak", ".sqlite3"}
-
-        logger.info("Creating full project snapshot...")
-        for root, dirs, files in os.walk(self.project_root, topdown=True):
-            # Exclude directories in-place
-            dirs[:] = [d for d in dirs if d not in excluded_dirs]
-            
-            for file_name in files:
-                if file_name in excluded_files or Path(file_name).suffix in excluded_extensions:
-                    continue
+        If the file's hash is already cached and its blob is present, the file is
+        not read at all. Otherwise it is read once, hashed and stored; the stat
+        recorded is then taken from the open handle, so it always describes the
+        exact bytes that were hashed. The entry itself holds no content.
+        """
+        target_path = self._resolve_safe_path(relative_path)
+        stat_result = os.stat(target_path)
+        sha256_hash = self._lookup_cached_hash(stat_result)
+        if sha256_hash is None or not self.snapshot_store.has_blob(sha256_hash):
+            with open(target_path, 'rb') as f:
+                data = f.read()
+                stat_result = os.fstat(f.fileno())
+            sha256_hash = self._lookup_cached_hash(stat_result) or hashlib.sha256(data).hexdigest()
+            self.snapshot_store.put_blob(data, sha256_hash)
+            self._remember_hash(target_path, stat_result, sha256_hash)
+        entry = SnapshotEntry(self.snapshot_store, sha256_hash, stat_result.st_size, stat_result.st_mtime_ns)
+        self.snapshot_store.record(relative_path, stat_result, entry)
+        return entry
+
+    def _scan_snapshot_candidates(self) -> Tuple[List[Tuple[str, Dict[str, Any]]], List[Tuple[str, int]]]:
+        """
+        Stats every snapshot file and splits them into files whose previous entry
+        can be reused and files that must be (re-)captured, with their sizes.
+        """
+        reused: List[Tuple[str, Dict[str, Any]]] = []
+        pending: List[Tuple[str, int]] = []
+        for relative_path_str, file_path_abs in self._iter_snapshot_files():
+            try:
+                stat_result = os.stat(file_path_abs)
+            except OSError as e:
+                logger.error(f"Failed to include file in snapshot '{relative_path_str}': {e}")
+                continue
+            entry = self.snapshot_store.lookup(relative_path_str, stat_result)
+            if entry is not None:
+                reused.append((relative_path_str, entry))
+            else:
+                pending.append((relative_path_str, stat_result.st_size))
+        return reused, pending
 
-                file_path_abs = Path(root) / file_name
-                relative_path_str = file_path_abs.relative_to(self.project_root).as_posix()
+    async def _run_chunked(
+        self,
+        worker: Callable[[List[Any]], List[Any]],
+        items: List[Tuple[Any, int]],
+        max_workers: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        max_inflight_bytes: Optional[int] = None,
+    ) -> AsyncIterator[Any]:
+        """
+        Runs `worker` over `items` on a bounded thread pool and streams the results back.
 
-                try:
-                    # Use async-friendly file I/O to avoid blocking the event loop.
-                    # Use async-friendly file reading
-                    content = await asyncio.to_thread(self.read_file, relative_path_str)
-                    sha256_hash = await asyncio.to_thread(self.get_file_hash, relative_path_str) # Get hash
-                    if sha256_hash:
-                        snapshot[relative_path_str] = {'content': content, 'sha256': sha256_hash}
-                    else:
-                        logger.warning(f"Could not get hash for {relative_path_str}, skipping from snapshot.")
-                except Exception as e:
-                    logger.error(f"Failed to include file in snapshot '{relative_path_str}': {e}")
-        
+        Items are grouped into chunks of at most `chunk_size` items, so each thread
+        pool round trip amortizes over many small files. A new chunk is only
+        submitted while fewer than `max_workers` chunks are running and the total
+        size of the running chunks stays under `max_inflight_bytes` (a single chunk
+        larger than the ceiling still runs, alone).
+
+        Args:
+            worker: Called in a worker thread with a list of item payloads; returns a list of results.
+            items: `(payload, size_in_bytes)` pairs.
+
+        Yields:
+            Each result returned by `worker`, in chunk completion order.
+        """
+        max_workers = max_workers or self.SNAPSHOT_MAX_WORKERS
+        chunk_size = chunk_size or self.SNAPSHOT_CHUNK_SIZE
+        max_inflight_bytes = max_inflight_bytes or self.SNAPSHOT_MAX_INFLIGHT_BYTES
+
+        chunks: List[Tuple[List[Any], int]] = []
+        current: List[Any] = []
+        current_bytes = 0
+        for payload, size in items:
+            if current and (len(current) >= chunk_size or current_bytes + size > max_inflight_bytes):
+                chunks.append((current, current_bytes))
+                current, current_bytes = [], 0
+            current.append(payload)
+            current_bytes += size
+        if current:
+            chunks.append((current, current_bytes))
+        if not chunks:
+            return
+
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vebgen-snapshot") as executor:
+            running: Dict[asyncio.Future, int] = {}
+            inflight_bytes = 0
+            next_chunk = 0
+            while next_chunk < len(chunks) or running:
+                while next_chunk < len(chunks) and len(running) < max_workers:
+                    payloads, chunk_bytes = chunks[next_chunk]
+                    if running and inflight_bytes + chunk_bytes > max_inflight_bytes:
+                        break
+                    running[loop.run_in_executor(executor, worker, payloads)] = chunk_bytes
+                    inflight_bytes += chunk_bytes
+                    next_chunk += 1
+                done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    inflight_bytes -= running.pop(future)
+                    for result in future.result():
+                        yield result
+
+    def _capture_snapshot_chunk(self, relative_paths: List[str]) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+        """Worker for `iter_snapshot_entries`: captures a chunk of files, logging per-file failures."""
+        results: List[Tuple[str, Optional[Dict[str, Any]]]] = []
+        for relative_path_str in relative_paths:
+            try:
+                results.append((relative_path_str, self._capture_snapshot_entry(relative_path_str)))
+            except Exception as e:
+                logger.error(f"Failed to include file in snapshot '{relative_path_str}': {e}")
+                results.append((relative_path_str, None))
+        return results
+
+    async def iter_snapshot_entries(
+        self,
+        max_workers: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        max_inflight_bytes: Optional[int] = None,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streams `(relative_path, entry)` pairs for every snapshot file.
+
+        Entries of unchanged files are yielded straight from the stat cache. Changed
+        files are handed to a bounded worker pool in chunks and yielded as each chunk
+        completes, so a large project keeps the disk busy without one event-loop
+        round trip per file.
+
+        Args:
+            max_workers: Worker threads (defaults to SNAPSHOT_MAX_WORKERS).
+            chunk_size: Files per work item (defaults to SNAPSHOT_CHUNK_SIZE).
+            max_inflight_bytes: Ceiling on raw bytes being read concurrently
+                                (defaults to SNAPSHOT_MAX_INFLIGHT_BYTES).
+        """
+        reused, pending = await asyncio.to_thread(self._scan_snapshot_candidates)
+        for item in reused:
+            yield item
+        async for relative_path_str, entry in self._run_chunked(
+            self._capture_snapshot_chunk, pending, max_workers, chunk_size, max_inflight_bytes
+        ):
+            if entry is not None:
+                yield relative_path_str, entry
+
+    async def create_snapshot(
+        self,
+        max_workers: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        max_inflight_bytes: Optional[int] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Creates an incremental, content-addressed snapshot of all relevant project files.
+
+        Files whose `(mtime, size)` are unchanged since they were last captured reuse
+        their previous entry without being read again. Changed files are read once,
+        hashed, and their bytes stored as a blob under `.vebgen/objects`, which lets
+        `write_snapshot` restore them byte-for-byte. Reads run on a bounded worker
+        pool (see `iter_snapshot_entries` for the tuning parameters). It excludes
+        common unnecessary files and directories (like `.git`, `venv`, `__pycache__`, `.vebgen`).
+
+        Returns:
+            A dictionary where keys are relative file paths and values are lazy
+            `SnapshotEntry` dicts {'sha256', 'size', 'mtime_ns'}. Their `content`
+            is loaded from the blob store only when accessed, and is None for
+            files that are not valid UTF-8 text.
+        """
+        logger.info("Creating incremental project snapshot...")
+        captured: Dict[str, Dict[str, Any]] = {}
+        async for relative_path_str, entry in self.iter_snapshot_entries(max_workers, chunk_size, max_inflight_bytes):
+            captured[relative_path_str] = entry
+        # Keep the snapshot ordered by path regardless of chunk completion order.
+        snapshot = {path: captured[path] for path in sorted(captured)}
         logger.info(f"Snapshot created with {len(snapshot)} files.")
         return snapshot
 
+    def _snapshot_entry_matches_disk(self, relative_path: str, data: Dict[str, Any]) -> bool:
+        """Checks whether the file on disk already holds the content of a snapshot entry."""
+        target_path = self._resolve_safe_path(relative_path)
+        try:
+            stat_result = os.stat(target_path)
+        except FileNotFoundError:
+            return False
+        cached = self.snapshot_store.lookup(relative_path, stat_result)
+        if cached is not None:
+            return cached.get('sha256') == data.get('sha256')
+        return self.get_file_hash(relative_path) == data.get('sha256')
+
+    def _restore_snapshot_entry(self, relative_path: str, data: Dict[str, Any]) -> None:
+        """
+        Restores one file from a snapshot entry, preferring the exact original
+        bytes from the blob store and falling back to the entry's text content.
+        """
+        sha256_hash = data.get('sha256')
+        if sha256_hash and self.snapshot_store.has_blob(sha256_hash):
+            target_path = self._resolve_safe_path(relative_path)
+            target_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(target_path, 'wb') as f:
+                f.write(self.snapshot_store.get_blob(sha256_hash))
+            self._note_file_changed(target_path, sha256_hash)
+            logger.info(f"Restored '{relative_path}' from blob {sha256_hash[:12]}.")
+        else:
+            self.write_file(relative_path, data['content'])
+
     async def write_snapshot(self, snapshot: Dict[str, Dict[str, Any]]) -> None:
         """
-        Writes an entire file snapshot to disk, overwriting the current project state.
+        Restores the project to the state captured in a snapshot.
 
-        This is a powerful but destructive operation. It first writes all files from
-        the snapshot, then deletes any files currently on disk that are *not* 
-        present in the snapshot, ensuring the disk matches the snapshot exactly.
+        Only files whose current content differs from the snapshot are rewritten.
+        Afterwards, any file currently on disk that is *not* present in the snapshot
+        is deleted, ensuring the disk matches the snapshot exactly.
         """
-        logger.info(f"Writing snapshot to disk ({len(snapshot)} files)...")
-        
-        # First, write all files from the snapshot
-        for relative_path, data in snapshot.items():
-            try:
-                await asyncio.to_thread(self.write_file, relative_path, data['content'])
-            except Exception as e:
-                logger.error(f"Failed to write file from snapshot '{relative_path}': {e}")
-                # In a real-world scenario, you might want to handle this more gracefully,
-                # e.g., by attempting to roll back to a pre-write state.
-                raise RuntimeError(f"Failed to write snapshot file '{relative_path}': {e}") from e
+        logger.info(f"Restoring snapshot to disk ({len(snapshot)} files)...")
+        restored = 0
+
+        def _restore_chunk(items: List[Tuple[str, Dict[str, Any]]]) -> List[Tuple[str, bool, Optional[Exception]]]:
+            results = []
+            for relative_path, data in items:
+                try:
+                    if self._snapshot_entry_matches_disk(relative_path, data):
+                        results.append((relative_path, False, None))
+                        continue
+                    self._restore_snapshot_entry(relative_path, data)
+                    results.append((relative_path, True, None))
+                except Exception as e:
+                    results.append((relative_path, False, e))
+            return results
+
+        work = [((relative_path, data), 0) for relative_path, data in snapshot.items()]
+        async for relative_path, was_restored, error in self._run_chunked(_restore_chunk, work):
+            if error is not None:
+                logger.error(f"Failed to write file from snapshot '{relative_path}': {error}")
+                raise RuntimeError(f"Failed to write snapshot file '{relative_path}': {error}") from error
+            restored += was_restored
 
         # Find and delete files on disk that are NOT in the snapshot.
         # This handles cases where a remediation plan involved deleting a file.
-        current_disk_files = set()
-        excluded_dirs = {".git", ".venv", "venv", "__pycache__", "node_modules", ".codenow"}
-        for root, dirs, files in os.walk(self.project_root, topdown=True):
-            dirs[:] = [d for d in dirs if d not in excluded_dirs]
-            for file_name in files:
-                file_path_abs = Path(root) / file_name
-                current_disk_files.add(file_path_abs.relative_to(self.project_root).as_posix())
-
-        snapshot_files = set(snapshot.keys())
-        files_to_delete = current_disk_files - snapshot_files
+        current_disk_files = {rel for rel, _ in await asyncio.to_thread(lambda: list(self._iter_snapshot_files()))}
+        files_to_delete = current_disk_files - set(snapshot.keys())
 
         for file_to_delete in files_to_delete:
             try:
                 logger.warning(f"Deleting file '{file_to_delete}' as it's not in the target snapshot.")
                 await asyncio.to_thread(self.delete_file, file_to_delete)
+                self.snapshot_store.forget(file_to_delete)
             except Exception as e:
                 logger.error(f"Failed to delete extraneous file '{file_to_delete}': {e}")
                 # This could leave the project in an inconsistent state.
                 # A more robust implementation might track these failures.
 
-        logger.info("Snapshot write operation completed.")
-    
+        logger.info(f"Snapshot write operation completed ({restored} restored, {len(files_to_delete)} deleted).")
+
+    def _journal_pre_image(self, target_path: Path) -> None:
+        """
+        Records the current state of `target_path` in the active journal checkpoint
+        before it is changed. Only the first change per checkpoint is recorded.
+        """
+        if not self.journal.is_recording():
+            return
+        relative_path_str = target_path.relative_to(self.project_root).as_posix()
+        if self.journal.has_pre_image(relative_path_str):
+            return
+        data = target_path.read_bytes() if target_path.is_file() else None
+        self.journal.record_pre_image(relative_path_str, data)
+
+    def begin_checkpoint(self, label: str = "") -> int:
+        """
+        Starts a new rollback journal checkpoint. Every file written, patched,
+        deleted or reported as created after this call is undone by the next
+        `rollback_last_checkpoint()`.
+
+        Returns:
+            The id of the new checkpoint.
+        """
+        return self.journal.begin_checkpoint(label)
+
+    def record_created_files(self, relative_paths: List[str]) -> None:
+        """
+        Records files created outside of this manager (e.g. by a shell command)
+        in the active checkpoint, so a rollback removes them again.
+        """
+        for relative_path in relative_paths:
+            target_path = self._resolve_safe_path(relative_path)
+            relative_path_str = target_path.relative_to(self.project_root).as_posix()
+            if self.journal.is_recording() and not self.journal.has_pre_image(relative_path_str):
+                self.journal.record_pre_image(relative_path_str, None)
+
+    def get_pre_image_text(self, relative_path: str | Path) -> str:
+        """
+        Returns the text a file held before the active checkpoint first changed it.
+
+        Returns an empty string if the file did not exist at that point.
+
+        Raises:
+            KeyError: If the active checkpoint has not touched this file.
+        """
+        target_path = self._resolve_safe_path(relative_path)
+        data = self.journal.get_pre_image(target_path.relative_to(self.project_root).as_posix())
+        if data is None:
+            return ''
+        return decode_snapshot_text(data) or ''
+
+    def rollback_last_checkpoint(self) -> List[str]:
+        """
+        Undoes every change recorded in the most recent journal checkpoint by
+        replaying its pre-images in reverse order. Files that did not exist
+        before the checkpoint are soft-deleted; all others get their original
+        bytes back. The checkpoint is removed from the journal.
+
+        Returns:
+            The relative paths that were restored or removed. Empty if there was
+            no checkpoint to undo.
+
+        Raises:
+            RuntimeError: If a file could not be restored.
+        """
+        checkpoint = self.journal.pop_checkpoint()
+        if checkpoint is None:
+            logger.warning("Rollback requested, but the journal has no checkpoint to undo.")
+            return []
+
+        logger.info(f"Rolling back journal checkpoint {checkpoint.checkpoint_id} ({len(checkpoint.pre_images)} files)...")
+        reverted: List[str] = []
+        with self.journal.suspended():
+            for relative_path, sha256_hash in reversed(list(checkpoint.pre_images.items())):
+                try:
+                    if sha256_hash is None:
+                        if self.file_exists(relative_path):
+                            self.delete_file(relative_path)
+                    else:
+                        target_path = self._resolve_safe_path(relative_path)
+                        target_path.parent.mkdir(parents=True, exist_ok=True)
+                        with open(target_path, 'wb') as f:
+                            f.write(self.snapshot_store.get_blob(sha256_hash))
+                        self._note_file_changed(target_path, sha256_hash)
+                    self.snapshot_store.forget(relative_path)
+                    reverted.append(relative_path)
+                except Exception as e:
+                    logger.error(f"Failed to roll back '{relative_path}': {e}")
+                    raise RuntimeError(f"Failed to roll back '{relative_path}': {e}") from e
 
+        logger.info(f"Rollback of checkpoint {checkpoint.checkpoint_id} complete ({len(reverted)} files reverted).")
+        return reverted
 
     def _fix_patch_hunk_headers(self, patch_content: str) -> str:
         """
@@ -1354,60 +2068,52 @@ SearchReplaceNoExactMatch: SEARCH/REPLACE block #{block_num} of {total_blocks} f
         content = "\n".join(normalized_lines).rstrip()
         return content + "\n"
 
+    def begin_transaction(self) -> FileTransaction:
+        """
+        Starts a multi-file transaction. Writes and deletes are staged under
+        `.vebgen/txn/` and applied all-or-nothing by `commit()`; see `FileTransaction`.
+        """
+        return FileTransaction(self, new_transaction_dir(self.txn_root))
+
     def apply_atomic_file_updates(self, updates: Dict[str, str]) -> Tuple[bool, List[str], Dict[str, Path]]:
-            """
-            Atomically applies a set of file updates using a two-phase approach.
-
-            1. **Backup Phase:** Creates a `.bak` backup for every file that will be modified.
-            2. **Write Phase:** Writes the new content for all files.
-            If any step fails, it automatically rolls back all changes from the backups.
-
-            Args:
-                updates: A dictionary mapping relative file paths to their new, complete content.
-
-            Returns:
-                A tuple containing:
-                - A boolean indicating success.
-                - A list of successfully updated file paths.
-                - A dictionary mapping original paths to their backup paths.
-
-            Raises:
-                PatchApplyError: If the operation fails.
-            """
-            if not updates:
-                logger.warning("apply_atomic_file_updates called with no updates.")
-                return True, [], {}
-
-            backup_paths: Dict[str, Path] = {}
-            applied_files: List[str] = []
-
-            # --- Phase 1: Backup all target files before making any changes. ---
-            logger.info(f"Starting atomic update for {len(updates)} files. Backing up first...")
-            try:
-                for file_to_update in updates.keys():
-                    if self.file_exists(file_to_update):
-                        backup_path = self.backup_file(file_to_update)
-                        if backup_path:
-                            backup_paths[file_to_update] = backup_path
-            except Exception as e:
-                # If any backup fails, roll back any backups that were made and abort.
-                logger.error(f"Failed during the backup phase for '{file_to_update}': {e}. Rolling back...")
-                self.rollback_from_backup(backup_paths)
-                raise PatchApplyError(f"Failed during the backup phase for '{file_to_update}': {e}") from e
+        """
+        Atomically applies a set of file updates using a staged transaction.
 
-            # --- Phase 2: Write all new content now that backups are secure. ---
-            try:
+        All new contents are staged and fsynced first; the files are then moved into
+        place with `os.replace` behind a durable commit marker. If staging fails,
+        nothing on disk changes; if moving a file into place fails, the files already
+        moved are restored from the copies kept in the transaction directory. No
+        `.bak` copies are made next to the project files.
+
+        Args:
+            updates: A dictionary mapping relative file paths to their new, complete content.
+
+        Returns:
+            A tuple containing:
+            - A boolean indicating success.
+            - A list of successfully updated file paths.
+            - A dictionary mapping original paths to their backup paths (always empty,
+              kept for compatibility with `rollback_from_backup` / `cleanup_backups`).
+
+        Raises:
+            PatchApplyError: If the operation fails.
+        """
+        if not updates:
+            logger.warning("apply_atomic_file_updates called with no updates.")
+            return True, [], {}
+
+        logger.info(f"Starting atomic update for {len(updates)} files...")
+        try:
+            with self.begin_transaction() as txn:
                 for file_to_update, new_content in updates.items():
-                    self.write_file(file_to_update, new_content)
-                    applied_files.append(file_to_update)
-                logger.info(f"Successfully applied all {len(applied_files)} file updates.")
-                return True, applied_files, backup_paths
+                    txn.write(file_to_update, new_content)
+                applied_files = txn.commit()
+        except Exception as e:
+            logger.exception("Atomic update failed.")
+            raise PatchApplyError(f"Failed to write file content during atomic update: {e}") from e
+        logger.info(f"Successfully applied all {len(applied_files)} file updates.")
+        return True, applied_files, {}
 
-            except Exception as e:
-                logger.exception(f"An unexpected error occurred while applying changes. Rolling back.")
-                self.rollback_from_backup(backup_paths)
-                raise PatchApplyError(f"Failed to write file content during atomic update: {e}") from e
-        
     def rollback_from_backup(self, backup_paths: Dict[str, Path]) -> None:
         """
         Restores files from their backups. This. This is the recovery mechanism for
@@ -1438,29 +2144,26 @@ SearchReplaceNoExactMatch: SEARCH/REPLACE block #{block_num} of {total_blocks} f
 
     def _perform_three_way_merge(self, base_content: str, local_content: str, target_content: str) -> Tuple[str, Optional[str]]:
         """
-        Performs a three-way merge using Google's diff-match-patch library.
+        Performs a line-level three-way merge (diff3).
 
         This is used to intelligently merge an AI-generated change (target) into a file
         that may have been modified by a previous step (local), using a common ancestor (base).
-        """
-        dmp = diff_match_patch()
-        # patch_make(base, target) produces the minimal patch from Base->Target.
-        patches = dmp.patch_make(base_content, target_content)
-
-        # Applying that to Local yields a merged result.
-        # patch_apply returns a tuple: (new_text, list_of_booleans_indicating_success_of_each_patch)
-        merged_content, results = dmp.patch_apply(patches, local_content)
+        Regions changed differently on both sides are written with conflict markers.
 
-        # Detect any leftover conflict markers from the merge library.
-        conflict_pattern = re.compile(r"<<<<<<<|=======|>>>>>>>")
-        conflicts_found = conflict_pattern.search(merged_content)
-        
-        if conflicts_found:
-            logger.warning("Three-way merge resulted in conflict markers.")
-            return merged_content, "Merge conflicts detected."
-        else:
-            logger.info("Three-way merge completed cleanly.")
-            return merged_content, None
+        Returns:
+            A tuple of (merged content, None) for a clean merge, or (merged content with
+            conflict markers, a message listing the conflicting base line ranges).
+        """
+        result = merge3(base_content, local_content, target_content)
+        if result.has_conflicts:
+            regions = ", ".join(
+                f"{conflict.base_start + 1}-{max(conflict.base_end, conflict.base_start + 1)}"
+                for conflict in result.conflicts
+            )
+            logger.warning(f"Three-way merge left {len(result.conflicts)} conflict region(s) at base lines {regions}.")
+            return result.content, f"Merge conflicts detected in {len(result.conflicts)} region(s) at base lines {regions}."
+        logger.info("Three-way merge completed cleanly.")
+        return result.content, None
 
     def _get_target_content_from_base_and_diff(self, base_content: str, diff_content: str) -> str:
         """
@@ -1468,31 +2171,28 @@ SearchReplaceNoExactMatch: SEARCH/REPLACE block #{block_num} of {total_blocks} f
 
         This is used to reconstruct the AI's intended final file state (`target_content`)
         for the three-way merge, using the original file state (`base_content`) and the AI's diff.
+        Hunks are spliced line by line and must match the base (within UNIFIED_DIFF_MAX_OFFSET lines).
         """
         if not diff_content.strip():
             logger.warning("Diff content is empty. Returning base content.")
             return base_content
 
         try:
-            # python-patch works with bytes
-            dmp = diff_match_patch()
-            try:
-                patches = dmp.patch_fromText(diff_content)
-            except ValueError as e:
-                raise PatchApplyError(f"Invalid patch format for diff content: {e}") from e
-
-            new_content, results = dmp.patch_apply(patches, base_content)
-
-            if not all(results):
-                failed_hunks = [i for i, success in enumerate(results) if not success]
-                error_msg = f"Could not reconstruct target content; patch did not apply cleanly to base. Failed hunks: {failed_hunks}"
-                logger.error(error_msg)
-                raise PatchApplyError(error_msg)
-
-            return new_content
-        except Exception as e:
-            logger.error(f"Error applying patch with python-patch: {e}", exc_info=True)
-            raise PatchApplyError(f"Unexpected error applying patch with python-patch: {e}") from e
+            patch_set = PatchSet(diff_content)
+        except (UnidiffParseError, ValueError, IndexError) as e:
+            raise PatchApplyError(f"Invalid patch format for diff content: {e}") from e
+        if not patch_set:
+            raise PatchApplyError("Invalid patch format for diff content: no hunks found.")
+
+        # Only line endings are normalized: the base is also a merge3 input, so stripping
+        # trailing whitespace here would show up as spurious edits on the target side.
+        base_lines = base_content.replace('\r\n', '\n').replace('\r', '\n')
+        new_content = self._apply_hunks_exact(base_lines, patch_set)
+        if new_content is None:
+            error_msg = "Could not reconstruct target content; patch did not apply cleanly to base."
+            logger.error(error_msg)
+            raise PatchApplyError(error_msg)
+        return new_content
 
     def revert_patch(self, patch: str, original_file_path: str):
         """
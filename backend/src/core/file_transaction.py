@@ -0,0 +1,295 @@
+# backend/src/core/file_transaction.py
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from .file_system_manager import FileSystemManager
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+# Written (and fsynced) after the manifest; its presence means the transaction
+# must be rolled forward, its absence that it must be discarded.
+COMMIT_MARKER_NAME = "COMMITTED"
+
+
+def _fsync_path(path: Path) -> None:
+    """Flushes a file's data to stable storage."""
+    with open(path, 'rb+') as f:
+        os.fsync(f.fileno())
+
+
+def _fsync_dir(path: Path) -> None:
+    """Flushes a directory entry table. A no-op on platforms that cannot open directories."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class FileTransaction:
+    """
+    Stages a set of file writes and deletes and applies them all-or-nothing.
+
+    New contents are written to a staging directory under `.vebgen/txn/<id>/`
+    (on the same filesystem as the project, so `os.replace` is atomic). On
+    commit the staged files are fsynced as one batch, copies of the files they
+    replace are kept alongside them, a manifest and a commit marker are made
+    durable, and only then are the files moved into place.
+    If the process dies after the marker is written, `recover_transactions`
+    rolls the transaction forward on the next start-up; if it dies before,
+    the staging directory is simply discarded and the project is untouched.
+    If moving the files into place fails while the process is running, the
+    files already moved are restored from those copies.
+
+    Usage:
+        with fs_manager.begin_transaction() as txn:
+            txn.write("app/models.py", models_code)
+            txn.write("app/admin.py", admin_code)
+    """
+
+    def __init__(self, fs_manager: "FileSystemManager", txn_dir: Path):
+        self._fs = fs_manager
+        self.txn_dir = txn_dir
+        # Relative path -> staged file name, or None to delete. The last operation on a path wins.
+        self._ops: Dict[str, Optional[str]] = {}
+        # Relative path -> copy of the file as it was before commit, or None if it did not exist.
+        self._pre_images: Dict[str, Optional[str]] = {}
+        self._staged_count = 0
+        self._state = "open"
+        self.txn_dir.mkdir(parents=True, exist_ok=False)
+
+    @property
+    def state(self) -> str:
+        """One of "open", "committed", "pending" (committed, left for recovery) or "aborted"."""
+        return self._state
+
+    def _check_open(self) -> None:
+        if self._state != "open":
+            raise RuntimeError(f"Transaction {self.txn_dir.name} is already {self._state}.")
+
+    def _relative(self, relative_path: str | Path) -> str:
+        target_path = self._fs._resolve_safe_path(relative_path)
+        return target_path.relative_to(self._fs.project_root).as_posix()
+
+    def write(self, relative_path: str | Path, content: str, encoding: str = 'utf-8') -> None:
+        """Stages new content for a file. Nothing on disk changes until `commit()`."""
+        self._check_open()
+        rel_path = self._relative(relative_path)
+        self._staged_count += 1
+        staged_name = f"{self._staged_count:05d}.stage"
+        with open(self.txn_dir / staged_name, 'w', encoding=encoding) as f:
+            f.write(content)
+        self._ops[rel_path] = staged_name
+
+    def delete(self, relative_path: str | Path) -> None:
+        """Stages the (soft) deletion of a file."""
+        self._check_open()
+        self._ops[self._relative(relative_path)] = None
+
+    def commit(self) -> List[str]:
+        """
+        Durably records and then applies every staged operation.
+
+        Returns:
+            The relative paths that were written or deleted.
+
+        Raises:
+            RuntimeError: If the transaction could not be made durable or could not be
+                          fully applied. The project is left untouched in both cases,
+                          unless restoring the replaced files also fails, in which case
+                          the transaction stays "pending" and is rolled forward by
+                          `recover_transactions` on the next start-up.
+        """
+        self._check_open()
+        if not self._ops:
+            self.abort()
+            return []
+
+        try:
+            for rel_path, staged_name in self._ops.items():
+                if staged_name is None:
+                    continue
+                staged_path = self.txn_dir / staged_name
+                target_path = self._fs.project_root / rel_path
+                # Keep permission bits (e.g. executable scripts) of files being replaced.
+                if target_path.is_file():
+                    shutil.copymode(target_path, staged_path)
+                _fsync_path(staged_path)
+            for rel_path in self._ops:
+                target_path = self._fs.project_root / rel_path
+                if target_path.is_file():
+                    pre_image_name = f"{len(self._pre_images) + 1:05d}.orig"
+                    shutil.copy2(target_path, self.txn_dir / pre_image_name)
+                    self._pre_images[rel_path] = pre_image_name
+                else:
+                    self._pre_images[rel_path] = None
+
+            manifest_path = self.txn_dir / MANIFEST_NAME
+            with open(manifest_path, 'w', encoding='utf-8') as f:
+                json.dump({"ops": [[p, s] for p, s in self._ops.items()]}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.txn_dir / COMMIT_MARKER_NAME, 'w', encoding='utf-8') as f:
+                f.write(time.strftime("%Y-%m-%dT%H:%M:%S"))
+                f.flush()
+                os.fsync(f.fileno())
+            _fsync_dir(self.txn_dir)
+        except Exception as e:
+            logger.error(f"Transaction {self.txn_dir.name} could not be made durable: {e}. Discarding it.")
+            self.abort()
+            raise RuntimeError(f"Failed to commit transaction: {e}") from e
+
+        # The commit marker is durable from here on, so the staging directory must not be
+        # discarded by `abort()`: it is either applied, rolled back, or left for recovery.
+        self._state = "pending"
+        for rel_path in self._ops:
+            self._fs._journal_pre_image(self._fs.project_root / rel_path)
+        try:
+            applied = _apply_operations(self._fs, self.txn_dir, self._ops)
+        except Exception as e:
+            if _restore_pre_images(self._fs, self.txn_dir, self._ops, self._pre_images):
+                shutil.rmtree(self.txn_dir, ignore_errors=True)
+                self._state = "aborted"
+                raise RuntimeError(f"Failed to apply transaction {self.txn_dir.name}; all files were restored: {e}") from e
+            raise RuntimeError(
+                f"Failed to apply transaction {self.txn_dir.name} and to restore its files: {e}. "
+                "It will be rolled forward on the next start-up."
+            ) from e
+        self._state = "committed"
+        logger.info(f"Committed transaction {self.txn_dir.name} ({len(applied)} files).")
+        return applied
+
+    def abort(self) -> None:
+        """Discards every staged operation. A transaction whose commit marker was written is never discarded."""
+        if self._state == "open" and not (self.txn_dir / COMMIT_MARKER_NAME).exists():
+            shutil.rmtree(self.txn_dir, ignore_errors=True)
+            self._state = "aborted"
+
+    def __enter__(self) -> "FileTransaction":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is None:
+            if self._state == "open":
+                self.commit()
+        else:
+            self.abort()
+        return False
+
+
+def new_transaction_dir(txn_root: Path) -> Path:
+    """Returns a fresh, unique staging directory path under `txn_root`."""
+    return txn_root / f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+
+def _apply_operations(fs_manager: "FileSystemManager", txn_dir: Path, ops: Dict[str, Optional[str]]) -> List[str]:
+    """
+    Moves staged files into place and performs staged deletes.
+
+    Idempotent, so it can be re-run by recovery after a crash half-way through:
+    staged files that were already moved are skipped, and deleting a missing
+    file is a no-op.
+    """
+    applied: List[str] = []
+    touched_dirs = set()
+    try:
+        for rel_path, staged_name in ops.items():
+            if staged_name is None:
+                fs_manager.delete_file(rel_path)
+                applied.append(rel_path)
+                continue
+            staged_path = txn_dir / staged_name
+            target_path = fs_manager._resolve_safe_path(rel_path)
+            if staged_path.exists():
+                target_path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(staged_path, target_path)
+                fs_manager._note_file_changed(target_path)
+                touched_dirs.add(target_path.parent)
+            applied.append(rel_path)
+        for directory in touched_dirs:
+            _fsync_dir(directory)
+    except Exception as e:
+        # The staging directory and commit marker are kept: the caller either restores the
+        # replaced files or leaves the transaction for `recover_transactions`.
+        logger.error(f"Failed to apply transaction {txn_dir.name}: {e}")
+        raise RuntimeError(f"Failed to apply transaction {txn_dir.name}: {e}") from e
+    shutil.rmtree(txn_dir, ignore_errors=True)
+    return applied
+
+
+def _restore_pre_images(
+    fs_manager: "FileSystemManager",
+    txn_dir: Path,
+    ops: Dict[str, Optional[str]],
+    pre_images: Dict[str, Optional[str]],
+) -> bool:
+    """
+    Puts every file of a partially applied transaction back as it was before commit.
+
+    Files that were already moved into place are moved back to their staged name
+    first, so the commit marker stays valid throughout: a crash half-way through
+    the restore makes `recover_transactions` roll the whole transaction forward.
+
+    Returns:
+        True if every file was restored, False otherwise.
+    """
+    try:
+        for rel_path, staged_name in ops.items():
+            target_path = fs_manager._resolve_safe_path(rel_path)
+            if staged_name is not None and not (txn_dir / staged_name).exists() and target_path.is_file():
+                os.replace(target_path, txn_dir / staged_name)
+            pre_image_name = pre_images.get(rel_path)
+            if pre_image_name is None:
+                if target_path.exists():
+                    target_path.unlink()
+                fs_manager._note_file_removed(target_path)
+                continue
+            target_path.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(txn_dir / pre_image_name, target_path)
+            fs_manager._note_file_changed(target_path)
+    except Exception as e:
+        logger.critical(f"Could not restore the files of transaction {txn_dir.name}: {e}")
+        return False
+    logger.warning(f"Restored {len(ops)} files after transaction {txn_dir.name} failed to apply.")
+    return True
+
+
+def recover_transactions(fs_manager: "FileSystemManager", txn_root: Path) -> List[str]:
+    """
+    Finishes or discards transactions left behind by a crash.
+
+    Transactions with a commit marker are rolled forward from their manifest;
+    those without one never touched the project and are deleted.
+
+    Returns:
+        The relative paths written or deleted while rolling transactions forward.
+    """
+    if not txn_root.is_dir():
+        return []
+    recovered: List[str] = []
+    for txn_dir in sorted(p for p in txn_root.iterdir() if p.is_dir()):
+        if not (txn_dir / COMMIT_MARKER_NAME).is_file():
+            logger.warning(f"Discarding uncommitted transaction {txn_dir.name}.")
+            shutil.rmtree(txn_dir, ignore_errors=True)
+            continue
+        try:
+            with open(txn_dir / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+                ops = {rel_path: staged_name for rel_path, staged_name in json.load(f)["ops"]}
+            logger.warning(f"Rolling forward committed transaction {txn_dir.name} ({len(ops)} files).")
+            recovered.extend(_apply_operations(fs_manager, txn_dir, ops))
+        except Exception as e:
+            logger.error(f"Could not recover transaction {txn_dir.name}: {e}")
+    return recovered
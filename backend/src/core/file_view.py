@@ -0,0 +1,134 @@
+# backend/src/core/file_view.py
+import codecs
+import logging
+import mmap
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# How many leading bytes are inspected when deciding whether a file is binary.
+BINARY_SNIFF_BYTES = 8192
+# Slice size used when scanning a mapping (e.g. to count lines) without copying it whole.
+_SCAN_CHUNK_BYTES = 1024 * 1024
+
+
+class FileView:
+    """
+    A read-only, memory-mapped view of a file.
+
+    The view answers questions about a file (its size, whether it looks binary,
+    its first or last few lines, its line count) without decoding the whole file
+    into a `str`. Only the byte ranges that are actually asked for are copied out
+    of the mapping and decoded. Text is decoded with universal newlines, like
+    `FileSystemManager.read_file`; undecodable bytes at slice boundaries are dropped.
+
+    Always close the view (or use it as a context manager); an open mapping keeps
+    the file locked on some platforms.
+    """
+
+    def __init__(self, path: Path, encoding: str = 'utf-8'):
+        """
+        Opens and maps a file.
+
+        Args:
+            path: The absolute path of the file.
+            encoding: The text encoding used by the decoding helpers.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+            OSError: If the file cannot be opened or mapped.
+        """
+        self.path = path
+        self.encoding = encoding
+        self._file = open(path, 'rb')
+        try:
+            self.size: int = os.fstat(self._file.fileno()).st_size
+            # Empty files cannot be mapped.
+            self._mm: Optional[mmap.mmap] = (
+                mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+            )
+        except Exception:
+            self._file.close()
+            raise
+
+    def close(self) -> None:
+        """Releases the mapping and the file handle."""
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def __enter__(self) -> "FileView":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def read_bytes(self, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Copies the byte range `[start:end]` out of the mapping."""
+        if self._mm is None:
+            return b""
+        return self._mm[start:end]
+
+    def _decode(self, data: bytes) -> str:
+        text = data.decode(self.encoding, errors='ignore')
+        return text.replace('\r\n', '\n').replace('\r', '\n')
+
+    @property
+    def is_binary(self) -> bool:
+        """
+        Heuristically decides whether the file is binary: its first bytes contain a
+        NUL byte or are not valid text in the view's encoding.
+        """
+        sniff = self.read_bytes(0, BINARY_SNIFF_BYTES)
+        if b"\0" in sniff:
+            return True
+        try:
+            # final=False tolerates a multi-byte character cut off at the sniff boundary.
+            codecs.getincrementaldecoder(self.encoding)().decode(sniff, final=False)
+        except UnicodeDecodeError:
+            return True
+        return False
+
+    def head(self, max_bytes: int = 4096) -> str:
+        """Returns the decoded text of the first `max_bytes` bytes."""
+        return self._decode(self.read_bytes(0, max_bytes))
+
+    def tail(self, max_bytes: int = 4096) -> str:
+        """Returns the decoded text of the last `max_bytes` bytes."""
+        return self._decode(self.read_bytes(max(0, self.size - max_bytes), self.size))
+
+    def head_lines(self, max_lines: int) -> Tuple[List[str], bool]:
+        """
+        Returns up to `max_lines` leading lines (with their line endings).
+
+        Returns:
+            A tuple of (lines, truncated) where `truncated` is True if the file
+            has more content after the returned lines.
+        """
+        lines: List[str] = []
+        position = 0
+        while len(lines) < max_lines and position < self.size:
+            newline = self._mm.find(b"\n", position)
+            end = self.size if newline == -1 else newline + 1
+            lines.append(self._decode(self._mm[position:end]))
+            position = end
+        return lines, position < self.size
+
+    def line_count(self) -> int:
+        """Counts lines (like `text.count('\\n') + 1`) by scanning the mapping in slices."""
+        newlines = 0
+        for start in range(0, self.size, _SCAN_CHUNK_BYTES):
+            newlines += self.read_bytes(start, start + _SCAN_CHUNK_BYTES).count(b"\n")
+        return newlines + 1
+
+    def text(self) -> str:
+        """
+        Decodes the whole file. Use only when the full content is really needed.
+
+        Raises:
+            UnicodeDecodeError: If the file is not valid text in the view's encoding.
+        """
+        return self.read_bytes().decode(self.encoding).replace('\r\n', '\n').replace('\r', '\n')
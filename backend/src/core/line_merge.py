@@ -0,0 +1,256 @@
+# backend/src/core/line_merge.py
+import bisect
+import dataclasses
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Lines occurring more often than this in a region are not used to split it (as in git's histogram diff).
+HISTOGRAM_MAX_OCCURRENCES = 64
+# Myers' algorithm gives up on a region needing more edits than this; the region is then treated as replaced.
+MYERS_MAX_EDIT_DISTANCE = 2000
+
+CONFLICT_START = "<<<<<<<"
+CONFLICT_SEPARATOR = "======="
+CONFLICT_END = ">>>>>>>"
+
+
+@dataclasses.dataclass
+class MergeConflict:
+    """A region that both sides changed differently (0-based line numbers, end exclusive)."""
+    base_start: int
+    base_end: int
+    base_lines: List[str]
+    local_lines: List[str]
+    target_lines: List[str]
+    # The line in the merged output where the conflict's start marker is.
+    merged_line: int
+
+
+@dataclasses.dataclass
+class MergeResult:
+    """The outcome of a three-way merge: the merged text and its conflict regions."""
+    content: str
+    conflicts: List[MergeConflict]
+
+    @property
+    def has_conflicts(self) -> bool:
+        return bool(self.conflicts)
+
+
+def _myers_matches(a: Sequence[str], b: Sequence[str]) -> Optional[List[Tuple[int, int]]]:
+    """
+    Aligns two line sequences with Myers' O((N+M)D) greedy algorithm.
+
+    Returns:
+        The matched (a index, b index) pairs in order, or None if the sequences
+        differ by more than MYERS_MAX_EDIT_DISTANCE edits.
+    """
+    n, m = len(a), len(b)
+    v: Dict[int, int] = {1: 0}
+    trace: List[Dict[int, int]] = []
+    for d in range(min(n + m, MYERS_MAX_EDIT_DISTANCE) + 1):
+        trace.append(dict(v))
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]
+            else:
+                x = v[k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[k] = x
+            if x >= n and y >= m:
+                return _myers_backtrack(trace, n, m)
+    return None
+
+
+def _myers_backtrack(trace: List[Dict[int, int]], n: int, m: int) -> List[Tuple[int, int]]:
+    """Walks Myers' saved frontiers back from (n, m) and collects the diagonal (matching) moves."""
+    matches: List[Tuple[int, int]] = []
+    x, y = n, m
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        prev_k = k + 1 if k == -d or (k != d and v[k - 1] < v[k + 1]) else k - 1
+        prev_x = v[prev_k]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            matches.append((x, y))
+        x, y = prev_x, prev_y
+    matches.reverse()
+    return matches
+
+
+def _longest_increasing_run(pairs: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """
+    Returns the longest subsequence of `pairs` (ordered by their second element)
+    whose first elements increase, by patience sorting in O(k log k).
+    """
+    tails: List[int] = []  # tails[length - 1] = index into pairs of the smallest tail of that length
+    tail_keys: List[int] = []
+    previous: List[int] = [-1] * len(pairs)
+    for idx, (i, _) in enumerate(pairs):
+        length = bisect.bisect_left(tail_keys, i)
+        if length:
+            previous[idx] = tails[length - 1]
+        if length == len(tails):
+            tails.append(idx)
+            tail_keys.append(i)
+        else:
+            tails[length] = idx
+            tail_keys[length] = i
+    run: List[Tuple[int, int]] = []
+    idx = tails[-1] if tails else -1
+    while idx != -1:
+        run.append(pairs[idx])
+        idx = previous[idx]
+    run.reverse()
+    return run
+
+
+def diff_lines(a: Sequence[str], b: Sequence[str]) -> List[Tuple[int, int]]:
+    """
+    Aligns two line sequences.
+
+    Common prefixes and suffixes are matched first. The remaining region is then
+    anchored on the lines that occur exactly once on each side (the longest run of
+    them in the same order on both, as in patience diff), and the gaps between
+    anchors are aligned the same way. A gap without such lines is split on its
+    least frequent common line (as in histogram diff), and one whose common lines
+    are all too frequent falls back to Myers' algorithm. Each pass is linear in
+    the region's size and the gaps are disjoint, so files with scattered edits
+    are aligned in close to linear time.
+
+    Returns:
+        The matched (a index, b index) pairs, in increasing order of both.
+    """
+    matches: List[Tuple[int, int]] = []
+    regions = [(0, len(a), 0, len(b))]
+    while regions:
+        a_lo, a_hi, b_lo, b_hi = regions.pop()
+        while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+            matches.append((a_lo, b_lo))
+            a_lo += 1
+            b_lo += 1
+        while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+            a_hi -= 1
+            b_hi -= 1
+            matches.append((a_hi, b_hi))
+        if a_lo == a_hi or b_lo == b_hi:
+            continue
+
+        a_positions: Dict[str, List[int]] = {}
+        for i in range(a_lo, a_hi):
+            a_positions.setdefault(a[i], []).append(i)
+        b_counts: Dict[str, int] = {}
+        for j in range(b_lo, b_hi):
+            if b[j] in a_positions:
+                b_counts[b[j]] = b_counts.get(b[j], 0) + 1
+        if not b_counts:
+            continue  # Nothing in common: the whole region is replaced.
+
+        unique_pairs = [
+            (a_positions[b[j]][0], j) for j in range(b_lo, b_hi)
+            if b_counts.get(b[j]) == 1 and len(a_positions[b[j]]) == 1
+        ]
+        anchors = _longest_increasing_run(unique_pairs)
+        if not anchors:
+            split: Optional[Tuple[int, int, int]] = None  # (occurrences, a index, b index)
+            for j in range(b_lo, b_hi):
+                count = b_counts.get(b[j])
+                if count is None:
+                    continue
+                occurrences = len(a_positions[b[j]]) + count
+                if occurrences <= HISTOGRAM_MAX_OCCURRENCES and (split is None or occurrences < split[0]):
+                    split = (occurrences, a_positions[b[j]][0], j)
+            if split is None:
+                region_matches = _myers_matches(a[a_lo:a_hi], b[b_lo:b_hi])
+                if region_matches is None:
+                    logger.debug(f"Diff region of {a_hi - a_lo}x{b_hi - b_lo} lines is too different to align.")
+                    continue
+                matches.extend((a_lo + i, b_lo + j) for i, j in region_matches)
+                continue
+            anchors = [split[1:]]
+
+        # Match the anchors and align the gaps around them; the gaps' prefix/suffix
+        # trimming extends each anchor over its neighbouring equal lines.
+        previous_i, previous_j = a_lo, b_lo
+        for i, j in anchors:
+            matches.append((i, j))
+            regions.append((previous_i, i, previous_j, j))
+            previous_i, previous_j = i + 1, j + 1
+        regions.append((previous_i, a_hi, previous_j, b_hi))
+
+    matches.sort()
+    return matches
+
+
+def _with_final_newline(lines: List[str]) -> List[str]:
+    """Ensures a conflict side ends with a newline so the following marker starts its own line."""
+    if lines and not lines[-1].endswith(('\n', '\r')):
+        return lines[:-1] + [lines[-1] + '\n']
+    return lines
+
+
+def merge3(base: str, local: str, target: str, local_label: str = "local", target_label: str = "target") -> MergeResult:
+    """
+    Merges two descendants of a common base line by line (diff3).
+
+    The base is aligned with each side. Base lines matched on both sides are
+    stable; between them, a region changed on only one side (or identically on
+    both) takes that change, and a region changed differently on both sides is
+    written with `<<<<<<<` / `=======` / `>>>>>>>` markers and reported as a
+    `MergeConflict`.
+
+    Args:
+        base: The common ancestor.
+        local: One descendant (e.g. the file as it is on disk).
+        target: The other descendant (e.g. the content a patch intends).
+        local_label: Label written after the start marker.
+        target_label: Label written after the end marker.
+
+    Returns:
+        The merged content and its conflicts.
+    """
+    base_lines = base.splitlines(keepends=True)
+    local_lines = local.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    to_local = dict(diff_lines(base_lines, local_lines))
+    to_target = dict(diff_lines(base_lines, target_lines))
+
+    merged: List[str] = []
+    conflicts: List[MergeConflict] = []
+
+    def _resolve(o_end: int, a_end: int, b_end: int) -> None:
+        base_chunk = base_lines[o:o_end]
+        local_chunk = local_lines[a:a_end]
+        target_chunk = target_lines[b:b_end]
+        if local_chunk == base_chunk or local_chunk == target_chunk:
+            merged.extend(target_chunk)
+        elif target_chunk == base_chunk:
+            merged.extend(local_chunk)
+        else:
+            conflicts.append(MergeConflict(o, o_end, base_chunk, local_chunk, target_chunk, len(merged)))
+            merged.append(f"{CONFLICT_START} {local_label}\n")
+            merged.extend(_with_final_newline(local_chunk))
+            merged.append(f"{CONFLICT_SEPARATOR}\n")
+            merged.extend(_with_final_newline(target_chunk))
+            merged.append(f"{CONFLICT_END} {target_label}\n")
+
+    o = a = b = 0
+    for stable in (i for i in range(len(base_lines)) if i in to_local and i in to_target):
+        if (stable, to_local[stable], to_target[stable]) != (o, a, b):
+            _resolve(stable, to_local[stable], to_target[stable])
+        merged.append(local_lines[to_local[stable]])
+        o, a, b = stable + 1, to_local[stable] + 1, to_target[stable] + 1
+    if (o, a, b) != (len(base_lines), len(local_lines), len(target_lines)):
+        _resolve(len(base_lines), len(local_lines), len(target_lines))
+
+    if conflicts:
+        logger.debug(f"Three-way merge left {len(conflicts)} conflict region(s).")
+    return MergeResult(''.join(merged), conflicts)
@@ -0,0 +1,254 @@
+# backend/src/core/parse_cache.py
+import hashlib
+import io
+import logging
+import os
+import pickle
+import shutil
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from .project_models import FileStructureInfo
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the on-disk entry layout changes; entries of other versions are discarded.
+CACHE_FORMAT_VERSION = 2
+
+
+class _PlainDataUnpickler(pickle.Unpickler):
+    """
+    An unpickler limited to builtin containers and scalars.
+
+    Entries only ever hold the plain `model_dump()` of a `FileStructureInfo`, so
+    any global reference means the file was not written by the cache (the
+    `.vebgen` directory can arrive with a cloned project) and is refused.
+    """
+    def find_class(self, module: str, name: str):
+        raise pickle.UnpicklingError(f"Parse cache entries may not reference {module}.{name}")
+
+
+class ParseCache:
+    """
+    A persistent store of `CodeIntelligenceService.parse_file` results, so an
+    unchanged project is not re-parsed every session.
+
+    Each entry is keyed by the file's path, its content hash and the parser
+    version, and is stored as one small file under
+    `<project_root>/.vebgen/parse_cache/v<format>-<parser version>/`: a
+    zlib-compressed pickle of the result's `model_dump()`. Keying by content
+    hash means edited files simply miss; entries written by another parser or
+    format version live in a different directory, which is removed on startup.
+
+    Entries are grouped in one directory per path and only the latest result
+    of a path is kept: storing a new one removes the path's older entries, and
+    `discard` removes them when the file is deleted, so the cache grows with
+    the project rather than with every edit.
+    """
+
+    def __init__(self, project_root: Path, parser_version: str, cache_dir: Optional[Path] = None):
+        """
+        Initializes the ParseCache and discards entries written by other versions.
+
+        Args:
+            project_root: The resolved project root directory.
+            parser_version: A stamp identifying the parser's output; bump it whenever
+                            the structure `parse_file` produces changes.
+            cache_dir: Where entries are stored. Defaults to `<project_root>/.vebgen/parse_cache`.
+        """
+        self.cache_root = cache_dir or (project_root / ".vebgen" / "parse_cache")
+        self.entries_dir = self.cache_root / f"v{CACHE_FORMAT_VERSION}-{parser_version}"
+        self._discard_other_versions()
+
+    def _discard_other_versions(self) -> None:
+        """Removes entry directories left behind by older (or newer) parser versions."""
+        try:
+            stale_dirs = [p for p in self.cache_root.iterdir() if p.is_dir() and p != self.entries_dir]
+        except OSError:
+            return
+        for stale_dir in stale_dirs:
+            logger.info(f"Discarding parse cache written by another parser version: {stale_dir.name}")
+            shutil.rmtree(stale_dir, ignore_errors=True)
+
+    def _path_dir(self, file_path_str: str) -> Path:
+        path_key = hashlib.sha256(Path(file_path_str).as_posix().encode('utf-8')).hexdigest()
+        return self.entries_dir / path_key[:2] / path_key
+
+    def _entry_path(self, file_path_str: str, content_hash: str) -> Path:
+        return self._path_dir(file_path_str) / f"{hashlib.sha256(content_hash.encode('utf-8')).hexdigest()}.bin"
+
+    def load(self, file_path_str: str, content_hash: str) -> Tuple[bool, Optional[FileStructureInfo]]:
+        """
+        Looks up the parse result for a file's content.
+
+        Args:
+            file_path_str: The project-relative path the file was parsed under.
+            content_hash: The file's content hash (and whatever else its result depends on).
+
+        Returns:
+            `(True, result)` on a hit (the stored result may be None), `(False, None)` on a miss.
+        """
+        entry_path = self._entry_path(file_path_str, content_hash)
+        try:
+            with open(entry_path, 'rb') as f:
+                data = _PlainDataUnpickler(io.BytesIO(zlib.decompress(f.read()))).load()
+            return True, FileStructureInfo.model_validate(data) if data is not None else None
+        except FileNotFoundError:
+            return False, None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable parse cache entry for '{file_path_str}': {e}")
+            entry_path.unlink(missing_ok=True)
+            return False, None
+
+    def store(self, file_path_str: str, content_hash: str, file_info: Optional[FileStructureInfo]) -> None:
+        """
+        Persists the parse result for a file's content, replacing the path's older
+        entries. Failures are logged, never raised.
+
+        Args:
+            file_path_str: The project-relative path the file was parsed under.
+            content_hash: The file's content hash (and whatever else its result depends on).
+            file_info: The result of `parse_file`.
+        """
+        entry_path = self._entry_path(file_path_str, content_hash)
+        data = file_info.model_dump() if file_info is not None else None
+        try:
+            payload = zlib.compress(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+            entry_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = entry_path.with_name(f"{entry_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, entry_path)
+        except (OSError, pickle.PicklingError) as e:
+            logger.warning(f"Could not persist parse cache entry for '{file_path_str}': {e}")
+            return
+        for old_entry in entry_path.parent.glob("*.bin"):
+            if old_entry != entry_path:
+                try:
+                    old_entry.unlink(missing_ok=True)
+                except OSError as e:
+                    logger.debug(f"Could not remove stale parse cache entry {old_entry}: {e}")
+
+    def discard(self, file_path_str: str) -> None:
+        """Removes every entry of a deleted (or renamed-away) file."""
+        shutil.rmtree(self._path_dir(file_path_str), ignore_errors=True)
+
+
+class MemoryParseCache:
+    """
+    The in-memory cache of parse results: a least-recently-used map of
+    path -> (content hash, result), bounded by the estimated size of its entries
+    rather than their count.
+
+    An entry's size is estimated from the length of the source it was parsed
+    from (plus the path), which the caller already has: a `FileStructureInfo`
+    tree grows with its source, so large HTML/CSS/JS files weigh accordingly,
+    without serializing every result just to measure it. When the total exceeds
+    `max_bytes`, the least recently used entries are evicted. `invalidate` and
+    `invalidate_prefix` drop entries of deleted or renamed files and directories.
+    The cache is safe to use from the parsing thread pool.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Args:
+            max_bytes: The budget for the estimated size of all entries.
+        """
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[str, Optional[FileStructureInfo], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def estimate_size(file_path_str: str, content_length: int) -> int:
+        """Estimates the memory an entry holds from the length of its path and source."""
+        return len(file_path_str) + content_length
+
+    def lookup(self, file_path_str: str, content_hash: str) -> Tuple[bool, Optional[FileStructureInfo]]:
+        """
+        Returns `(True, result)` if the path is cached for this content hash (marking it
+        recently used), otherwise `(False, None)`. Counts the hit or miss.
+        """
+        with self._lock:
+            entry = self._entries.get(file_path_str)
+            if entry is None or entry[0] != content_hash:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(file_path_str)
+            self.hits += 1
+            return True, entry[1]
+
+    def store(self, file_path_str: str, content_hash: str, file_info: Optional[FileStructureInfo], content_length: int) -> None:
+        """
+        Caches a result parsed from `content_length` characters of source, evicting least
+        recently used entries until the cache fits its budget. A zero budget caches nothing.
+        """
+        if self.max_bytes <= 0:
+            return
+        size = self.estimate_size(file_path_str, content_length)
+        with self._lock:
+            self._pop(file_path_str)
+            if size > self.max_bytes:
+                logger.debug(f"Parse result for '{file_path_str}' ({size} bytes) exceeds the cache budget; not cached.")
+                return
+            self._entries[file_path_str] = (content_hash, file_info, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                evicted_path, _ = next(iter(self._entries.items()))
+                self._pop(evicted_path)
+                self.evictions += 1
+
+    def _pop(self, file_path_str: str) -> bool:
+        entry = self._entries.pop(file_path_str, None)
+        if entry is None:
+            return False
+        self.total_bytes -= entry[2]
+        return True
+
+    def invalidate(self, file_path_str: str) -> bool:
+        """Drops the entry for a deleted or renamed file. Returns whether one was cached."""
+        with self._lock:
+            return self._pop(file_path_str) or self._pop(Path(file_path_str).as_posix())
+
+    def invalidate_prefix(self, dir_path_str: str) -> int:
+        """Drops the entries of every file under a deleted or renamed directory. Returns how many."""
+        prefix = Path(dir_path_str).as_posix().rstrip("/") + "/"
+        with self._lock:
+            stale = [p for p in self._entries if Path(p).as_posix().startswith(prefix)]
+            for path in stale:
+                self._pop(path)
+        return len(stale)
+
+    def clear(self) -> None:
+        """Drops every entry; the counters are kept."""
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the cache's size and its hit/miss/eviction counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries), "bytes": self.total_bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            }
+
+    def __contains__(self, file_path_str: str) -> bool:
+        with self._lock:
+            return file_path_str in self._entries
+
+    def __getitem__(self, file_path_str: str) -> Tuple[str, Optional[FileStructureInfo]]:
+        """Returns the cached (content hash, result) pair without touching its recency or the counters."""
+        with self._lock:
+            content_hash, file_info, _ = self._entries[file_path_str]
+        return content_hash, file_info
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
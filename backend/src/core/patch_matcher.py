@@ -0,0 +1,436 @@
+# backend/src/core/patch_matcher.py
+import ast
+import dataclasses
+import logging
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+
+from rapidfuzz import fuzz
+
+logger = logging.getLogger(__name__)
+
+# Matches a `def`/`async def`/`class` header and captures the defined name.
+_PY_HEADER_RE = re.compile(r'^\s*(?:async\s+def|def|class)\s+([A-Za-z_]\w*)')
+# Structural candidates scoring within this of the best one make the match ambiguous. Refusing
+# near-ties is what allows layer 5 a lower similarity threshold than the fuzzy layer.
+STRUCTURAL_AMBIGUITY_EPSILON = 0.05
+
+
+@dataclasses.dataclass
+class PythonDefinition:
+    """The line span of one function, method or class in a Python file (0-based, end exclusive)."""
+    qualname: str
+    name: str
+    start: int  # First line, including decorators.
+    header: int  # The `def`/`class` line.
+    end: int
+
+
+@dataclasses.dataclass
+class StructuralMatch:
+    """A SEARCH block located inside a specific Python definition."""
+    line_idx: int
+    line_count: int
+    ratio: float
+    qualname: str
+
+
+def collect_python_definitions(tree: ast.AST) -> List[PythonDefinition]:
+    """Lists every function, method and class in a parsed module with its qualified name and line span."""
+    definitions: List[PythonDefinition] = []
+
+    def _visit(node: ast.AST, prefix: str) -> None:
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                qualname = f"{prefix}{child.name}"
+                start = min([d.lineno for d in child.decorator_list] + [child.lineno])
+                definitions.append(PythonDefinition(
+                    qualname=qualname, name=child.name,
+                    start=start - 1, header=child.lineno - 1, end=child.end_lineno,
+                ))
+                _visit(child, f"{qualname}.")
+            else:
+                _visit(child, prefix)
+
+    _visit(tree, "")
+    return definitions
+
+
+def strip_common_leading_whitespace(text: str) -> str:
+    """Removes the common leading whitespace of the non-blank lines of `text`."""
+    lines = text.split('\n')
+    indents = [len(line) - len(line.lstrip()) for line in lines if line.strip()]
+    if not indents:
+        return text
+    min_indent = min(indents)
+    return '\n'.join(line[min_indent:] if line.strip() else line for line in lines)
+
+
+def _build_positions(keys: List[str]) -> Dict[str, List[int]]:
+    """Maps each distinct key to the ascending list of line numbers it occurs at."""
+    positions: Dict[str, List[int]] = {}
+    for line_idx, key in enumerate(keys):
+        positions.setdefault(key, []).append(line_idx)
+    return positions
+
+
+class LineIndex:
+    """
+    A line-level index of one file's content for locating SEARCH blocks.
+
+    Built once per content, it lets the whitespace-insensitive, indentation-
+    preserving and fuzzy layers of the SEARCH/REPLACE engine find candidate
+    windows without re-joining and re-normalising a window at every line:
+
+      - Layer 2 uses prefix sums of per-line normalised lengths to reject almost
+        every window in O(1) before comparing the survivors in full.
+      - Layer 3 looks up the rarest (left-stripped) SEARCH line in an anchor map
+        and only checks the windows that line pins down.
+      - Layer 4 derives, from the similarity threshold, how many SEARCH lines any
+        qualifying window must contain verbatim, and scores only the windows near
+        occurrences of the rarest of them, using `rapidfuzz`.
+
+    Each layer returns the same window the former exhaustive scans did: the
+    first match for layers 2 and 3, the first best-scoring window for layer 4.
+    All derived tables are built lazily, on first use. Layer 4's result is kept
+    per SEARCH block so `closest_window` can reuse it for error suggestions.
+    """
+
+    def __init__(self, content: str):
+        self.content = content
+        self.lines = content.split('\n')
+        self._normalized: Optional[List[str]] = None
+        self._norm_len_prefix: List[int] = []
+        self._nonempty_prefix: List[int] = []
+        self._next_nonempty: List[int] = []
+        self._lstripped_positions: Optional[Dict[str, List[int]]] = None
+        self._exact_positions: Optional[Dict[str, List[int]]] = None
+        self._line_starts: Optional[List[int]] = None
+        self._python_definitions: Optional[List[PythonDefinition]] = None
+        # SEARCH lines -> (best (line index, ratio) found by `find_fuzzy`, the candidate windows it considered).
+        self._fuzzy_results: Dict[Tuple[str, ...], Tuple[Tuple[int, float], List[int]]] = {}
+
+    def span(self, line_idx: int, line_count: int) -> Tuple[int, int]:
+        """
+        Returns the character range of `line_count` lines starting at `line_idx`,
+        excluding the newline after the last of them.
+        """
+        if self._line_starts is None:
+            line_starts = [0]
+            for line in self.lines:
+                line_starts.append(line_starts[-1] + len(line) + 1)
+            self._line_starts = line_starts
+        end_idx = line_idx + line_count
+        return self._line_starts[line_idx], self._line_starts[end_idx] - 1
+
+    # --- Lazily built tables ---
+
+    def _ensure_normalized(self) -> List[str]:
+        if self._normalized is None:
+            normalized = [' '.join(line.split()) for line in self.lines]
+            norm_len_prefix = [0]
+            nonempty_prefix = [0]
+            for norm in normalized:
+                norm_len_prefix.append(norm_len_prefix[-1] + len(norm))
+                nonempty_prefix.append(nonempty_prefix[-1] + (1 if norm else 0))
+            next_nonempty = [len(normalized)] * (len(normalized) + 1)
+            for line_idx in range(len(normalized) - 1, -1, -1):
+                next_nonempty[line_idx] = line_idx if normalized[line_idx] else next_nonempty[line_idx + 1]
+            self._normalized = normalized
+            self._norm_len_prefix = norm_len_prefix
+            self._nonempty_prefix = nonempty_prefix
+            self._next_nonempty = next_nonempty
+        return self._normalized
+
+    def _ensure_lstripped_positions(self) -> Dict[str, List[int]]:
+        if self._lstripped_positions is None:
+            self._lstripped_positions = _build_positions([line.lstrip() for line in self.lines])
+        return self._lstripped_positions
+
+    def _ensure_python_definitions(self) -> List[PythonDefinition]:
+        if self._python_definitions is None:
+            try:
+                self._python_definitions = collect_python_definitions(ast.parse(self.content))
+            except (SyntaxError, ValueError):
+                self._python_definitions = []
+        return self._python_definitions
+
+    def _ensure_exact_positions(self) -> Dict[str, List[int]]:
+        if self._exact_positions is None:
+            self._exact_positions = _build_positions(self.lines)
+        return self._exact_positions
+
+    # --- Layer 2 ---
+
+    def find_whitespace_insensitive(self, search_block: str) -> Optional[int]:
+        """
+        Finds the first window of `search_block`'s line count whose whitespace-
+        collapsed text equals the whitespace-collapsed SEARCH block.
+
+        Returns:
+            The window's first line index, or None.
+        """
+        normalized = self._ensure_normalized()
+        normalized_search = ' '.join(search_block.split())
+        target_len = len(normalized_search)
+        window_size = search_block.count('\n') + 1
+
+        for line_idx in range(len(self.lines) - window_size + 1):
+            end = line_idx + window_size
+            nonempty = self._nonempty_prefix[end] - self._nonempty_prefix[line_idx]
+            window_len = self._norm_len_prefix[end] - self._norm_len_prefix[line_idx] + max(nonempty - 1, 0)
+            if window_len != target_len:
+                continue
+            if nonempty:
+                first = normalized[self._next_nonempty[line_idx]]
+                if not normalized_search.startswith(first):
+                    continue
+                window = ' '.join(norm for norm in normalized[line_idx:end] if norm)
+                if window != normalized_search:
+                    continue
+            return line_idx
+        return None
+
+    # --- Layer 3 ---
+
+    def find_indentation_preserving(self, search_block: str) -> Optional[int]:
+        """
+        Finds the first window that equals `search_block` once the common leading
+        whitespace has been removed from both.
+
+        Returns:
+            The window's first line index, or None.
+        """
+        search_lines = search_block.split('\n')
+        window_size = len(search_lines)
+        last_start = len(self.lines) - window_size
+        if last_start < 0:
+            return None
+        search_stripped = strip_common_leading_whitespace(search_block)
+
+        # Every line of a matching window equals its SEARCH line after lstrip(),
+        # so the rarest non-blank SEARCH line pins down the candidate windows.
+        positions = self._ensure_lstripped_positions()
+        anchors = [(len(positions.get(line.lstrip(), ())), offset, line.lstrip())
+                   for offset, line in enumerate(search_lines) if line.strip()]
+        if anchors:
+            _, offset, key = min(anchors)
+            candidates = [p - offset for p in positions.get(key, ()) if 0 <= p - offset <= last_start]
+        else:
+            candidates = range(last_start + 1)
+
+        for line_idx in candidates:
+            window = '\n'.join(self.lines[line_idx:line_idx + window_size])
+            if strip_common_leading_whitespace(window) == search_stripped:
+                return line_idx
+        return None
+
+    # --- Layer 4 ---
+
+    def _score_windows(
+        self, search_lines: List[str], candidates, budget: Optional[int], min_ratio: float = 0.0
+    ) -> Tuple[int, float]:
+        """
+        Scores candidate windows (in the given order) against `search_lines` and
+        returns the first best one reaching `min_ratio` as (line index, ratio), or (-1, 0.0).
+
+        Each window is scored with `score_cutoff` set to the best ratio so far, or to
+        `min_ratio` until a window reaches it, so `rapidfuzz` abandons a window as soon
+        as it cannot count. `budget` caps the number of lines compared (windows scored
+        x window size).
+        """
+        window_size = len(search_lines)
+        best_idx, best_ratio = -1, 0.0
+        scored = 0
+        for line_idx in candidates:
+            if budget is not None and scored * window_size >= budget:
+                logger.warning(
+                    f"Fuzzy scan stopped after {scored} windows: the {budget}-line budget for this block is spent."
+                )
+                break
+            scored += 1
+            score = fuzz.ratio(
+                search_lines, self.lines[line_idx:line_idx + window_size], score_cutoff=max(min_ratio, best_ratio) * 100
+            )
+            if score / 100.0 > best_ratio:
+                best_idx, best_ratio = line_idx, score / 100.0
+                if score >= 100:
+                    break
+        logger.debug(f"Fuzzy scan scored {scored} windows.")
+        return best_idx, best_ratio
+
+    def find_fuzzy(self, search_lines: List[str], threshold: float, budget: Optional[int] = None) -> Tuple[int, float]:
+        """
+        Finds the window most similar to `search_lines` (as a sequence of lines),
+        considering only windows that could reach `threshold`.
+
+        A window of n lines can only reach a ratio of `threshold` if at least
+        m = ceil(threshold * n) SEARCH lines appear in it verbatim, each shifted
+        by at most d = n - m lines. Any d + 1 SEARCH lines therefore include one
+        that anchors every qualifying window; the rarest d + 1 are used.
+
+        Args:
+            search_lines: The SEARCH block's lines.
+            threshold: The minimum ratio a match needs.
+            budget: The maximum number of lines to compare; None for no limit.
+
+        Returns:
+            A tuple of (first line index, ratio in [0, 1]) of the best candidate
+            reaching `threshold`, or (-1, 0.0) if there is none.
+        """
+        window_size = len(search_lines)
+        last_start = len(self.lines) - window_size
+        if window_size == 0 or last_start < 0:
+            return -1, 0.0
+
+        min_matches = max(1, math.ceil(threshold * window_size - 1e-9))
+        max_shift = window_size - min_matches
+        positions = self._ensure_exact_positions()
+        anchors = sorted(range(window_size), key=lambda offset: len(positions.get(search_lines[offset], ())))
+        candidates = set()
+        for offset in anchors[:max_shift + 1]:
+            for position in positions.get(search_lines[offset], ()):
+                start = position - offset
+                candidates.update(range(max(0, start - max_shift), min(last_start, start + max_shift) + 1))
+
+        ordered = sorted(candidates)
+        result = self._score_windows(search_lines, ordered, budget, min_ratio=threshold) if ordered else (-1, 0.0)
+        self._fuzzy_results[tuple(search_lines)] = (result, ordered)
+        return result
+
+    def closest_window(self, search_lines: List[str], budget: Optional[int] = None) -> Tuple[int, float]:
+        """
+        Finds the window most similar to `search_lines`, for suggesting a correction
+        after every layer failed.
+
+        Reuses the best window `find_fuzzy` already found for these lines. If none of
+        its candidates reached the threshold, they are scored again without it, within
+        `budget`, for the nearest miss. Only if it had no candidates (no SEARCH line
+        occurs verbatim in the file) are all windows scanned, in order and within `budget`.
+
+        Returns:
+            A tuple of (first line index, ratio in [0, 1]), or (-1, 0.0).
+        """
+        cached = self._fuzzy_results.get(tuple(search_lines))
+        if cached is not None:
+            result, candidates = cached
+            if result[0] >= 0:
+                return result
+            if candidates:
+                return self._score_windows(search_lines, candidates, budget)
+        last_start = len(self.lines) - len(search_lines)
+        if not search_lines or last_start < 0:
+            return -1, 0.0
+        return self._score_windows(search_lines, range(last_start + 1), budget)
+
+    # --- Layer 5 ---
+
+    def find_python_structural(self, search_lines: List[str], threshold: float) -> Optional[StructuralMatch]:
+        """
+        Locates a SEARCH block by the Python definition it names, then fuzzy-compares
+        only within that definition's span.
+
+        The first `def`/`class` header in the SEARCH block selects the candidate
+        definitions by name. Definitions nested under it in the SEARCH block (e.g. the
+        methods of a class) narrow the candidates to those with the same qualified
+        children, and a candidate whose header line matches the SEARCH header (its
+        signature) is preferred over the others. If the SEARCH block is itself a
+        complete definition (a stale copy of the whole function or class), the
+        candidate's whole span is the window; otherwise the window is aligned on the
+        header and has the SEARCH block's length. Windows are compared as text with
+        indentation removed.
+
+        Since a match rewrites a whole definition, it must be unambiguous: if another
+        candidate scores within STRUCTURAL_AMBIGUITY_EPSILON of the best (e.g. two
+        classes' `__str__` methods, neither resembling the SEARCH body), no match is
+        returned.
+
+        Returns:
+            The best window reaching `threshold`, or None if the SEARCH block names no
+            definition, the file does not parse, nothing is similar enough, or the best
+            candidate is ambiguous.
+        """
+        header_offset = next((i for i, line in enumerate(search_lines) if _PY_HEADER_RE.match(line)), None)
+        if header_offset is None:
+            return None
+        name = _PY_HEADER_RE.match(search_lines[header_offset]).group(1)
+        definitions = self._ensure_python_definitions()
+        candidates = [d for d in definitions if d.name == name]
+
+        child_names = _nested_header_names(search_lines, header_offset)
+        if child_names:
+            qualnames = {d.qualname for d in definitions}
+            candidates = [d for d in candidates if all(f"{d.qualname}.{child}" in qualnames for child in child_names)]
+        if not candidates:
+            return None
+
+        search_header = ' '.join(search_lines[header_offset].split())
+        same_signature = [d for d in candidates if ' '.join(self.lines[d.header].split()) == search_header]
+        candidates = same_signature or candidates
+
+        whole_definition = _is_whole_definition(search_lines, header_offset)
+        search_text = '\n'.join(line.strip() for line in search_lines)
+        scored: List[StructuralMatch] = []
+        for definition in candidates:
+            if whole_definition:
+                line_idx, line_count = definition.start, definition.end - definition.start
+            else:
+                line_idx = max(0, definition.header - header_offset)
+                line_count = min(len(search_lines), len(self.lines) - line_idx)
+            window_text = '\n'.join(line.strip() for line in self.lines[line_idx:line_idx + line_count])
+            scored.append(StructuralMatch(line_idx, line_count, fuzz.ratio(search_text, window_text) / 100.0, definition.qualname))
+        scored.sort(key=lambda match: match.ratio, reverse=True)
+        best = scored[0]
+        if best.ratio < threshold:
+            return None
+        rivals = [m.qualname for m in scored[1:] if best.ratio - m.ratio <= STRUCTURAL_AMBIGUITY_EPSILON]
+        if rivals:
+            logger.warning(
+                f"Structural match for '{name}' is ambiguous: '{best.qualname}' ({best.ratio:.1%}) "
+                f"and {', '.join(repr(q) for q in rivals)} score alike."
+            )
+            return None
+        return best
+
+
+def _nested_header_names(search_lines: List[str], header_offset: int) -> List[str]:
+    """
+    Names of the definitions directly nested under the SEARCH block's header line
+    (headers indented one level deeper than it, before the block dedents back to it).
+    """
+    def _indent(line: str) -> int:
+        return len(line) - len(line.lstrip())
+
+    header_indent = _indent(search_lines[header_offset])
+    child_indent: Optional[int] = None
+    names = []
+    for line in search_lines[header_offset + 1:]:
+        if not line.strip():
+            continue
+        indent = _indent(line)
+        if indent <= header_indent:
+            break
+        if child_indent is None:
+            child_indent = indent
+        match = _PY_HEADER_RE.match(line)
+        if match and indent == child_indent:
+            names.append(match.group(1))
+    return names
+
+
+def _is_whole_definition(search_lines: List[str], header_offset: int) -> bool:
+    """
+    True if the SEARCH block, from its decorators to its last line, is exactly one
+    complete `def`/`class` statement (so it stands for the whole definition).
+    """
+    first = header_offset
+    while first > 0 and search_lines[first - 1].strip().startswith('@'):
+        first -= 1
+    if any(line.strip() for line in search_lines[:first]):
+        return False
+    try:
+        tree = ast.parse(strip_common_leading_whitespace('\n'.join(search_lines[first:])))
+    except (SyntaxError, ValueError):
+        return False
+    return len(tree.body) == 1 and isinstance(tree.body[0], (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
@@ -1,10 +1,13 @@
 # backend/src/core/performance_monitor.py
 import time
+import json
 import logging
+import math
 from functools import wraps
 from collections import defaultdict
 import threading
-from typing import Any, Callable
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -14,7 +17,9 @@ class PerformanceMonitor:
 
     This monitor uses a decorator (`@time_function`) to record execution times
     and aggregates metrics like call count, total time, average time, and max time.
-    It is thread-safe.
+    Besides timings it keeps named counters (`increment`) and bucketed histograms
+    (`observe`), and everything it holds can be exported as JSON (`to_dict`,
+    `export_json`). It is thread-safe.
     """
     _instance = None
     _lock = threading.Lock()
@@ -24,6 +29,9 @@ class PerformanceMonitor:
             if cls._instance is None:
                 cls._instance = super(PerformanceMonitor, cls).__new__(cls)
                 cls._instance.metrics = defaultdict(lambda: {'calls': 0, 'total_time': 0.0, 'max_time': 0.0})
+                cls._instance.counters = defaultdict(int)
+                # Histogram name -> {'bucket_width': w, 'buckets': {lower bound: count}}
+                cls._instance.histograms = {}
                 cls._instance.enabled = True # Can be controlled externally
             return cls._instance
 
@@ -37,9 +45,66 @@ class PerformanceMonitor:
             if duration > self.metrics[name]['max_time']:
                 self.metrics[name]['max_time'] = duration
 
+    def increment(self, name: str, amount: int = 1):
+        """Adds `amount` to a named counter."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] += amount
+
+    def observe(self, name: str, value: float, bucket_width: float = 0.01):
+        """
+        Adds a value to a named histogram.
+
+        Values are counted in fixed-width buckets keyed by their lower bound; the
+        bucket width of a histogram is fixed by its first observation.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.setdefault(name, {'bucket_width': bucket_width, 'buckets': defaultdict(int)})
+            width = histogram['bucket_width']
+            # round() guards against float error putting e.g. 0.82 into the 0.81 bucket.
+            lower_bound = round(math.floor(round(value / width, 9)) * width, 9)
+            histogram['buckets'][lower_bound] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns a JSON-serializable snapshot of all timings, counters and histograms."""
+        with self._lock:
+            return {
+                'timings': {
+                    name: {**data, 'avg_time': data['total_time'] / data['calls'] if data['calls'] else 0.0}
+                    for name, data in self.metrics.items()
+                },
+                'counters': dict(self.counters),
+                'histograms': {
+                    name: {
+                        'bucket_width': histogram['bucket_width'],
+                        'buckets': {f"{bound:g}": count for bound, count in sorted(histogram['buckets'].items())},
+                    }
+                    for name, histogram in self.histograms.items()
+                },
+            }
+
+    def export_json(self, path: Optional[Path] = None) -> str:
+        """
+        Serializes `to_dict()` as JSON.
+
+        Args:
+            path: If given, the JSON is also written to this file.
+
+        Returns:
+            The JSON string.
+        """
+        data = json.dumps(self.to_dict(), indent=2, sort_keys=True)
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(data, encoding='utf-8')
+        return data
+
     def get_report(self) -> str:
         """Generates a formatted string report of all recorded metrics."""
-        if not self.metrics:
+        if not self.metrics and not self.counters:
             return "No performance metrics recorded."
         
         report_lines = ["--- Performance Report ---"]
@@ -58,6 +123,8 @@ class PerformanceMonitor:
                 f"Avg={avg_time:<8.4f}s | "
                 f"Max={max_time:<8.4f}s"
             )
+        for name, count in sorted(self.counters.items()):
+            report_lines.append(f"- {name:<40} Count={count}")
         return "\n".join(report_lines)
 
     def log_report(self):
@@ -68,6 +135,8 @@ class PerformanceMonitor:
         """Clears all recorded metrics."""
         with self._lock:
             self.metrics.clear()
+            self.counters.clear()
+            self.histograms.clear()
 
 # Singleton instance for global access
 performance_monitor = PerformanceMonitor()
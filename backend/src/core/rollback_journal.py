@@ -0,0 +1,155 @@
+# backend/src/core/rollback_journal.py
+import dataclasses
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set
+
+from .snapshot_store import SnapshotStore
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class JournalCheckpoint:
+    """
+    One segment of the rollback journal.
+
+    `pre_images` maps each project-relative path touched since the checkpoint
+    began to the SHA-256 of the blob holding its content *before* the first
+    change, or to None if the file did not exist yet. Insertion order is the
+    order in which paths were first touched.
+    """
+    checkpoint_id: int
+    label: str = ""
+    pre_images: Dict[str, Optional[str]] = dataclasses.field(default_factory=dict)
+
+
+class RollbackJournal:
+    """
+    A copy-on-write, write-ahead journal of file pre-images.
+
+    Before a file is modified, deleted or created, the `FileSystemManager`
+    records the file's current bytes (or the fact that it was absent) in the
+    active checkpoint. Only the first pre-image per path and checkpoint is kept,
+    because that is the state an undo must return to. Undoing a checkpoint
+    therefore costs time proportional to the number of files it touched,
+    regardless of the size of the project.
+
+    When old checkpoints are dropped (beyond `max_checkpoints`, or by `clear`),
+    the blob store is garbage-collected, keeping the blobs that retained
+    checkpoints and live snapshots still reference.
+    """
+
+    def __init__(self, store: SnapshotStore, max_checkpoints: int = 50):
+        """
+        Initializes the RollbackJournal.
+
+        Args:
+            store: The blob store in which pre-image contents are kept.
+            max_checkpoints: How many checkpoints to retain; older ones are dropped.
+        """
+        self.store = store
+        self.max_checkpoints = max_checkpoints
+        self._checkpoints: List[JournalCheckpoint] = []
+        self._next_id = 1
+        self._suspended = 0
+        self._lock = threading.RLock()
+
+    @property
+    def current(self) -> Optional[JournalCheckpoint]:
+        """The checkpoint new pre-images are recorded into, if any."""
+        with self._lock:
+            return self._checkpoints[-1] if self._checkpoints else None
+
+    def begin_checkpoint(self, label: str = "") -> int:
+        """
+        Starts a new checkpoint. Subsequent changes are recorded into it.
+
+        Returns:
+            The id of the new checkpoint.
+        """
+        with self._lock:
+            checkpoint = JournalCheckpoint(checkpoint_id=self._next_id, label=label)
+            self._next_id += 1
+            self._checkpoints.append(checkpoint)
+            pruned = len(self._checkpoints) > self.max_checkpoints
+            if pruned:
+                del self._checkpoints[:-self.max_checkpoints]
+            logger.debug(f"Journal checkpoint {checkpoint.checkpoint_id} started ({label or 'unlabelled'}).")
+        if pruned:
+            self.collect_garbage()
+        return checkpoint.checkpoint_id
+
+    def is_recording(self) -> bool:
+        """True if there is an active checkpoint and recording is not suspended."""
+        with self._lock:
+            return bool(self._checkpoints) and not self._suspended
+
+    def has_pre_image(self, relative_path: str) -> bool:
+        """Checks whether the active checkpoint already holds a pre-image for a path."""
+        checkpoint = self.current
+        return checkpoint is not None and relative_path in checkpoint.pre_images
+
+    def record_pre_image(self, relative_path: str, data: Optional[bytes]) -> None:
+        """
+        Records the state of a file before it is changed.
+
+        Args:
+            relative_path: The project-relative POSIX path.
+            data: The file's current bytes, or None if the file does not exist.
+        """
+        with self._lock:
+            if not self.is_recording() or self.has_pre_image(relative_path):
+                return
+            sha256_hash = self.store.put_blob(data) if data is not None else None
+            self._checkpoints[-1].pre_images[relative_path] = sha256_hash
+
+    def get_pre_image(self, relative_path: str) -> Optional[bytes]:
+        """
+        Returns the bytes a path held when the active checkpoint first touched it.
+
+        Raises:
+            KeyError: If the active checkpoint has not recorded this path.
+        """
+        checkpoint = self.current
+        if checkpoint is None or relative_path not in checkpoint.pre_images:
+            raise KeyError(relative_path)
+        sha256_hash = checkpoint.pre_images[relative_path]
+        return self.store.get_blob(sha256_hash) if sha256_hash else None
+
+    def pop_checkpoint(self) -> Optional[JournalCheckpoint]:
+        """Removes and returns the most recent checkpoint, or None if there is none."""
+        with self._lock:
+            return self._checkpoints.pop() if self._checkpoints else None
+
+    def clear(self) -> None:
+        """Discards the whole journal history."""
+        with self._lock:
+            self._checkpoints.clear()
+        self.collect_garbage()
+
+    def referenced_blobs(self) -> Set[str]:
+        """Returns the hashes of the pre-images held by the retained checkpoints."""
+        with self._lock:
+            return {
+                sha256_hash
+                for checkpoint in self._checkpoints
+                for sha256_hash in checkpoint.pre_images.values()
+                if sha256_hash is not None
+            }
+
+    def collect_garbage(self) -> int:
+        """Deletes the blobs that neither a retained checkpoint nor a live snapshot references."""
+        return self.store.collect_garbage(self.referenced_blobs())
+
+    @contextmanager
+    def suspended(self) -> Iterator[None]:
+        """Context manager under which no pre-images are recorded (used while undoing)."""
+        with self._lock:
+            self._suspended += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._suspended -= 1
@@ -0,0 +1,224 @@
+# backend/src/core/snapshot_store.py
+import hashlib
+import logging
+import os
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A file whose mtime falls this close to the moment it was hashed may be
+# rewritten again within the filesystem's timestamp granularity without its
+# (mtime, size) changing. Such "racily clean" entries are never trusted and are
+# re-hashed on the next capture.
+RACY_WINDOW_NS = 2_000_000_000
+
+# Blobs younger than this are never garbage-collected: a capture or pre-image
+# may have stored one a moment before the entry referencing it is registered.
+BLOB_GC_GRACE_NS = 60_000_000_000
+
+
+def decode_snapshot_text(data: bytes, encoding: str = 'utf-8') -> Optional[str]:
+    """
+    Decodes raw file bytes the way `FileSystemManager.read_file` would
+    (universal newlines). Returns None for content that is not valid text.
+    """
+    try:
+        text = data.decode(encoding)
+    except UnicodeDecodeError:
+        return None
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+class SnapshotEntry(dict):
+    """
+    A snapshot value that holds only file metadata up front.
+
+    It is a `dict` with the keys `sha256`, `size` and `mtime_ns`. The file's text
+    is not kept in memory: reading `entry['content']` (or `entry.get('content')`)
+    loads it from the blob store on demand, returning None for binary files.
+    Nothing is cached, so an unused snapshot costs only its metadata.
+    """
+
+    def __init__(self, store: "SnapshotStore", sha256: str, size: int, mtime_ns: int):
+        super().__init__(sha256=sha256, size=size, mtime_ns=mtime_ns)
+        self._store = store
+        store.track_entry(self)
+
+    def load_content(self) -> Optional[str]:
+        """Reads and decodes the entry's content from the blob store."""
+        return decode_snapshot_text(self._store.get_blob(self['sha256']))
+
+    def __missing__(self, key: str) -> Any:
+        if key == 'content':
+            return self.load_content()
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == 'content' and not dict.__contains__(self, key):
+            return self.load_content()
+        return super().get(key, default)
+
+
+class SnapshotStore:
+    """
+    Content-addressed blob store plus a stat cache that backs project snapshots.
+
+    Every distinct file content is stored exactly once under
+    `.vebgen/objects/<first two hex chars>/<remaining hex chars>`, named by its
+    SHA-256. Alongside the blobs, the store remembers the `(mtime_ns, size)` each
+    path had when it was last captured, together with the snapshot entry that was
+    produced for it. A later capture of an unchanged file can therefore reuse the
+    previous entry without reading or hashing the file again, and a restore can
+    recover the exact original bytes from the blob.
+
+    Blobs are kept while a snapshot entry that is still alive (held by any
+    snapshot or the stat cache) or a caller-supplied reference, such as a
+    rollback journal pre-image, points to them; `collect_garbage` deletes the rest.
+    """
+
+    def __init__(self, project_root: Path, objects_dir: Optional[Path] = None):
+        """
+        Initializes the SnapshotStore.
+
+        Args:
+            project_root: The resolved project root directory.
+            objects_dir: Where blobs are kept. Defaults to `<project_root>/.vebgen/objects`.
+        """
+        self.project_root = project_root
+        self.objects_dir = objects_dir or (project_root / ".vebgen" / "objects")
+        # relative path -> (mtime_ns, size, recorded_at_ns, entry)
+        self._stat_cache: Dict[str, Tuple[int, int, int, Dict[str, Any]]] = {}
+        # Every snapshot entry still referenced somewhere (by id, as entries are unhashable dicts);
+        # their blobs are not garbage.
+        self._live_entries: "weakref.WeakValueDictionary[int, SnapshotEntry]" = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def blob_path(self, sha256: str) -> Path:
+        """Returns the on-disk location of the blob with the given hash."""
+        return self.objects_dir / sha256[:2] / sha256[2:]
+
+    def has_blob(self, sha256: str) -> bool:
+        """Checks whether a blob with the given hash is present in the store."""
+        return self.blob_path(sha256).is_file()
+
+    def put_blob(self, data: bytes, sha256: Optional[str] = None) -> str:
+        """
+        Stores `data` as a blob unless an identical blob already exists.
+
+        The blob is written to a temporary file and moved into place with
+        `os.replace`, so a concurrent reader never observes a partial blob.
+
+        Args:
+            data: The raw file content.
+            sha256: The precomputed hex digest of `data`, if the caller already has it.
+
+        Returns:
+            The hex digest under which the blob is stored.
+        """
+        sha256 = sha256 or hashlib.sha256(data).hexdigest()
+        target = self.blob_path(sha256)
+        if target.is_file():
+            return sha256
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, target)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        return sha256
+
+    def get_blob(self, sha256: str) -> bytes:
+        """
+        Reads a blob back from the store.
+
+        Raises:
+            FileNotFoundError: If no blob with this hash has been stored.
+        """
+        with open(self.blob_path(sha256), 'rb') as f:
+            return f.read()
+
+    def lookup(self, relative_path: str, stat_result: os.stat_result) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached snapshot entry for a path if the file is provably unchanged.
+
+        Args:
+            relative_path: The project-relative POSIX path.
+            stat_result: A fresh `os.stat` result for the file.
+
+        Returns:
+            The previously recorded entry, or None if the file must be re-read.
+        """
+        with self._lock:
+            cached = self._stat_cache.get(relative_path)
+        if cached is None:
+            return None
+        mtime_ns, size, recorded_ns, entry = cached
+        if stat_result.st_mtime_ns != mtime_ns or stat_result.st_size != size:
+            return None
+        if recorded_ns - mtime_ns < RACY_WINDOW_NS:
+            return None
+        return entry
+
+    def record(self, relative_path: str, stat_result: os.stat_result, entry: Dict[str, Any]) -> None:
+        """Remembers the entry produced for a file in the given stat state."""
+        with self._lock:
+            self._stat_cache[relative_path] = (
+                stat_result.st_mtime_ns, stat_result.st_size, time.time_ns(), entry
+            )
+
+    def forget(self, relative_path: str) -> None:
+        """Drops any cached state for a path."""
+        with self._lock:
+            self._stat_cache.pop(relative_path, None)
+
+    def track_entry(self, entry: SnapshotEntry) -> None:
+        """Registers a snapshot entry, so its blob is kept for as long as the entry is alive."""
+        with self._lock:
+            self._live_entries[id(entry)] = entry
+
+    def collect_garbage(self, referenced: Iterable[str] = (), grace_ns: Optional[int] = None) -> int:
+        """
+        Deletes blobs that neither a live snapshot entry nor `referenced` points to.
+
+        Args:
+            referenced: Further blob hashes to keep (e.g. rollback journal pre-images).
+            grace_ns: Blobs modified more recently than this are kept regardless
+                      (defaults to BLOB_GC_GRACE_NS).
+
+        Returns:
+            The number of blobs deleted.
+        """
+        with self._lock:
+            keep: Set[str] = set(referenced)
+            keep.update(entry['sha256'] for entry in list(self._live_entries.values()))
+        cutoff_ns = time.time_ns() - (BLOB_GC_GRACE_NS if grace_ns is None else grace_ns)
+        removed = 0
+        try:
+            fanout_dirs = [d for d in self.objects_dir.iterdir() if d.is_dir() and len(d.name) == 2]
+        except OSError:
+            return 0
+        for fanout_dir in fanout_dirs:
+            for blob in fanout_dir.iterdir():
+                if blob.name.endswith('.tmp') or fanout_dir.name + blob.name in keep:
+                    continue
+                try:
+                    if blob.stat().st_mtime_ns > cutoff_ns:
+                        continue
+                    blob.unlink()
+                    removed += 1
+                except OSError as e:
+                    logger.debug(f"Could not collect blob {blob}: {e}")
+            try:
+                fanout_dir.rmdir()  # Only succeeds once the directory is empty.
+            except OSError:
+                pass
+        if removed:
+            logger.info(f"Garbage-collected {removed} unreferenced blob(s) from {self.objects_dir}.")
+        return removed
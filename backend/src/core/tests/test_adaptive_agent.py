@@ -14,6 +14,9 @@ from src.core.context_manager import ContextManager
 from src.core.project_models import ProjectState, CommandOutput
 from src.core.code_intelligence_service import CodeIntelligenceService
 from src.core.exceptions import InterruptedError, PatchApplyError
+from src.core.file_index import FileIndexChanges
+from src.core.file_system_manager import FileWriteEvent
+import ast
 
 # --- Pytest Fixtures for Mocking Dependencies ---
 
@@ -44,6 +47,8 @@ def mock_file_system_manager(tmp_path):
     # a MagicMock itself, which then has a mockable `rglob` method.
     fs_manager.project_root = MagicMock(spec=Path, return_value=tmp_path)
     fs_manager.project_root.rglob.return_value = []  # Default to finding no files
+    # read_file_with_hash mirrors whatever a test configures for read_file.
+    fs_manager.read_file_with_hash.side_effect = lambda path, *args, **kwargs: (fs_manager.read_file(path), "mock-sha256")
     return fs_manager
 
 @pytest.fixture
@@ -494,20 +499,11 @@ async def test_run_command_returns_all_new_files(adaptive_agent: AdaptiveAgent,
         command="python manage.py startapp blog", stdout="Success", stderr="", exit_code=0
     )
 
-    # 2. Mock the file system to simulate file creation
-    # Before the command, rglob finds no files.
-    files_before = []
-    # After the command, rglob finds the new app files.
-    files_after = [
-        MagicMock(spec=Path, parts=('blog', 'models.py'), relative_to=lambda x: Path('blog/models.py'), is_file=lambda: True),
-        MagicMock(spec=Path, parts=('blog', 'views.py'), relative_to=lambda x: Path('blog/views.py'), is_file=lambda: True),
-        MagicMock(spec=Path, parts=('blog', 'admin.py'), relative_to=lambda x: Path('blog/admin.py'), is_file=lambda: True),
-    ]
-    # FIX: The side_effect needs to handle calls from _preload_config_files as well.
-    # We'll return empty lists for those and the correct lists for the RUN_COMMAND action.
-    mock_file_system_manager.project_root.rglob.side_effect = [
-        [], [], [], [], # For settings.py, urls.py, wsgi.py, asgi.py in _preload
-        files_before, files_after # For the actual command execution
+    # 2. Mock the file index to simulate file creation
+    # The refresh before the command reports nothing; the one after reports the new app files.
+    mock_file_system_manager.file_index.refresh.side_effect = [
+        FileIndexChanges(),
+        FileIndexChanges(created={'blog/models.py', 'blog/views.py', 'blog/admin.py'}),
     ]
 
     # 3. Execute the feature
@@ -1078,20 +1074,11 @@ async def test_run_command_returns_all_new_files(adaptive_agent: AdaptiveAgent,
         command="python manage.py startapp blog", stdout="Success", stderr="", exit_code=0
     )
 
-    # 2. Mock the file system to simulate file creation
-    # Before the command, rglob finds no files.
-    files_before = []
-    # After the command, rglob finds the new app files.
-    files_after = [
-        MagicMock(spec=Path, parts=('blog', 'models.py'), relative_to=lambda x: Path('blog/models.py'), is_file=lambda: True),
-        MagicMock(spec=Path, parts=('blog', 'views.py'), relative_to=lambda x: Path('blog/views.py'), is_file=lambda: True),
-        MagicMock(spec=Path, parts=('blog', 'admin.py'), relative_to=lambda x: Path('blog/admin.py'), is_file=lambda: True),
-    ]
-    # FIX: The side_effect needs to handle calls from _preload_config_files as well.
-    # We'll return empty lists for those and the correct lists for the RUN_COMMAND action.
-    mock_file_system_manager.project_root.rglob.side_effect = [
-        [], [], [], [], # For settings.py, urls.py, wsgi.py, asgi.py in _preload
-        files_before, files_after # For the actual command execution
+    # 2. Mock the file index to simulate file creation
+    # The refresh before the command reports nothing; the one after reports the new app files.
+    mock_file_system_manager.file_index.refresh.side_effect = [
+        FileIndexChanges(),
+        FileIndexChanges(created={'blog/models.py', 'blog/views.py', 'blog/admin.py'}),
     ]
 
     # 3. Execute the feature
@@ -1527,3 +1514,44 @@ class TestStateTracking:
         assert "checksum_test.txt" in adaptive_agent.project_state.file_checksums
         assert adaptive_agent.project_state.file_checksums["checksum_test.txt"] is not None
         print("✅ Bug #7 Fix Verified: File checksums are populated after file writes.")
+
+@pytest.mark.asyncio
+async def test_rollback_uses_journal_in_journal_mode(adaptive_agent: AdaptiveAgent, mock_agent_manager: MagicMock, mock_file_system_manager: MagicMock):
+    """
+    Tests that in journal mode a ROLLBACK replays the journal instead of
+    taking and restoring whole-tree snapshots.
+    """
+    mock_file_system_manager.rollback_mode = "journal"
+    mock_file_system_manager.rollback_last_checkpoint.return_value = ["app/views.py"]
+    mock_agent_manager.invoke_agent.return_value = {
+        "role": "assistant",
+        "content": '{"thought": "Undo that.", "action": "ROLLBACK", "parameters": {"reason": "broken"}}'
+    }
+
+    with pytest.raises(RuntimeError, match="Feature failed after 3 rollbacks"):
+        await adaptive_agent.execute_feature("Test journal rollback")
+
+    mock_file_system_manager.create_snapshot.assert_not_called()
+    mock_file_system_manager.write_snapshot.assert_not_called()
+    assert mock_file_system_manager.rollback_last_checkpoint.call_count == 2
+
+@pytest.mark.asyncio
+async def test_patch_hands_write_event_to_code_intelligence(adaptive_agent: AdaptiveAgent, mock_file_system_manager: MagicMock, mock_code_intelligence_service: MagicMock):
+    """
+    Tests that a successful patch is analyzed from the patch engine's post-write
+    event (content, hash and parsed module) without reading the file back.
+    """
+    content = "def hello():\n    return 2\n"
+    write_event = FileWriteEvent(path="app/utils.py", content=content, sha256="abc123", parsed_ast=ast.parse(content))
+    mock_file_system_manager.apply_patch.return_value = {
+        "filepath": "app/utils.py", "original_content": "", "modified_content": content, "write_event": write_event,
+    }
+    adaptive_agent.progress_callback = MagicMock()
+
+    await adaptive_agent._execute_action("PATCH_FILE", {"file_path": "app/utils.py", "patch": "..."}, {})
+
+    mock_file_system_manager.read_file_with_hash.assert_not_called()
+    mock_code_intelligence_service.handle_file_written.assert_called_once_with(write_event)
+    mock_code_intelligence_service.parse_file.assert_not_called()
+    sent_diff = adaptive_agent.progress_callback.call_args[0][0]
+    assert "write_event" not in sent_diff
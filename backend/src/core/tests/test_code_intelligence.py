@@ -832,6 +832,27 @@ def test_parse_views_py(intelligence_service: CodeIntelligenceService):
     print("✅ views.py assertions passed.")
 
 
+@pytest.mark.parametrize("file_path, content", [
+    ("polls/models.py", SAMPLE_COMPLEX_MODELS_PY),
+    ("polls/views.py", SAMPLE_VIEWS_PY),
+    ("polls/tests.py", SAMPLE_ADVANCED_TESTS_PY),
+    ("polls/signals.py", SAMPLE_SIGNALS_PY),
+    ("polls/urls.py", SAMPLE_URLS_WITH_DRF_ROUTER_PY),
+    ("myproject/settings.py", SAMPLE_SETTINGS_PY),
+])
+def test_python_file_is_parsed_once(intelligence_service: CodeIntelligenceService, monkeypatch, file_path, content):
+    """All Django extractors share one AST instead of re-parsing the file per class or function."""
+    import ast
+    parses = []
+    original_parse = ast.parse
+    monkeypatch.setattr(ast, "parse", lambda *args, **kwargs: parses.append(args) or original_parse(*args, **kwargs))
+
+    file_info = intelligence_service.parse_file(file_path, content)
+
+    assert file_info is not None and file_info.file_type != "unknown"
+    assert len(parses) == 1
+
+
 def test_parse_admin_py(intelligence_service: CodeIntelligenceService):
     """Tests parsing of a standard admin.py file."""
     print("\n--- Testing admin.py Parsing (@register decorator) ---")
@@ -1071,4 +1092,233 @@ def test_performance_monitor_decorator(intelligence_service: CodeIntelligenceSer
     assert metrics['calls'] == 1
     assert metrics['total_time'] > 0
 
-    print("✅ Performance monitor correctly recorded the function call.")
\ No newline at end of file
+    print("✅ Performance monitor correctly recorded the function call.")
+def test_large_json_file_is_not_fully_decoded(intelligence_service: CodeIntelligenceService, tmp_path: Path, monkeypatch):
+    """Large JSON fixtures are summarized from a file view instead of json.loads."""
+    import src.core.code_intelligence_service as cis_module
+    monkeypatch.setattr(cis_module, "JSON_FULL_PARSE_MAX_BYTES", 1024)
+    content = json.dumps([{"pk": i, "model": "shop.product"} for i in range(200)])
+    (tmp_path / "fixtures.json").write_text(content)
+    monkeypatch.setattr(cis_module.json, "loads", lambda *a, **k: pytest.fail("large JSON was fully decoded"))
+
+    info = intelligence_service.parse_file("fixtures.json", content)
+
+    assert info.file_type == "json_data"
+    assert "structure not validated" in info.raw_content_summary
+    assert not info.raw_content_summary.startswith("JSON data file")
+
+    # Matching outer brackets are not taken as proof that the document is valid.
+    broken = content[:-1].replace('"pk": 5,', '"pk": 5,,') + "]"
+    (tmp_path / "broken.json").write_text(broken)
+    assert "structure not validated" in intelligence_service.parse_file("broken.json", broken).raw_content_summary
+
+def test_get_file_summary_reports_binary_files(intelligence_service: CodeIntelligenceService, tmp_path: Path):
+    (tmp_path / "notes.txt").write_text("line 1\nline 2\nline 3\n")
+    (tmp_path / "blob.bin").write_bytes(b"\x00\x01\x02")
+    assert intelligence_service.get_file_summary("notes.txt", max_lines=2) == "line 1\nline 2\n... [truncated]"
+    assert intelligence_service.get_file_summary("blob.bin").startswith("[Binary file")
+
+
+def test_project_apps_are_listed_once_and_refreshed_on_change(tmp_path: Path, monkeypatch):
+    """Import classification reuses one listing of the project's apps until a new app appears."""
+    # Without the persistent cache, so creating `.vebgen/` does not change the root's mtime mid-test.
+    intelligence_service = CodeIntelligenceService(project_root=tmp_path, persistent_cache=False)
+    (tmp_path / "polls").mkdir()
+    (tmp_path / "polls" / "__init__.py").write_text("")
+    listings = []
+    original_iterdir = Path.iterdir
+    monkeypatch.setattr(Path, "iterdir", lambda self: listings.append(self) or original_iterdir(self))
+    imports_py = "from polls.models import Question\nfrom polls.forms import QuestionForm\nfrom shop.models import Product\nfrom django.db import models\n"
+
+    views_info = intelligence_service.parse_file("polls/views.py", imports_py)
+    intelligence_service.parse_file("polls/admin.py", imports_py)
+
+    import_types = {imp.module: imp.type for imp in views_info.django_view_details.imports}
+    assert import_types["polls.models"] == "project_app"
+    assert import_types["shop.models"] == "third_party"
+    assert len(listings) == 1
+
+    # Creating a package makes it a project app once its `__init__.py` is seen.
+    (tmp_path / "shop").mkdir()
+    (tmp_path / "shop" / "__init__.py").write_text("")
+    intelligence_service.parse_file("shop/__init__.py", "")
+    shop_info = intelligence_service.parse_file("shop/views.py", imports_py)
+
+    assert {imp.module: imp.type for imp in shop_info.django_view_details.imports}["shop.models"] == "project_app"
+    assert len(listings) == 2
+
+
+def test_parse_results_persist_across_sessions(tmp_path: Path, monkeypatch):
+    """A new service instance loads unchanged files from `.vebgen/parse_cache/` instead of parsing them."""
+    first_session = CodeIntelligenceService(project_root=tmp_path)
+    models_info = first_session.parse_file("polls/models.py", SAMPLE_COMPLEX_MODELS_PY)
+
+    second_session = CodeIntelligenceService(project_root=tmp_path)
+    monkeypatch.setattr(second_session, "_parse_python_ast", lambda *a, **k: pytest.fail("unchanged file was re-parsed"))
+    assert second_session.parse_file("polls/models.py", SAMPLE_COMPLEX_MODELS_PY) == models_info
+    monkeypatch.undo()
+
+    # Changed content misses, and a parser version bump discards the old entries.
+    assert second_session.parse_file("polls/models.py", SAMPLE_MODELS_PY).django_model_details.models[0].name == "Question"
+    monkeypatch.setattr("src.core.code_intelligence_service.PARSER_VERSION", "next")
+    third_session = CodeIntelligenceService(project_root=tmp_path)
+    assert not second_session.parse_cache.entries_dir.exists()
+    assert third_session.parse_cache.load("polls/models.py", first_session.in_memory_cache["polls/models.py"][0]) == (False, None)
+
+
+def test_parse_cache_tracks_project_apps_and_keeps_one_entry_per_file(tmp_path: Path):
+    """Cached imports are re-classified when the project's apps change, and stale entries are pruned."""
+    imports_py = "from shop.models import Product\n"
+    first_session = CodeIntelligenceService(project_root=tmp_path)
+    first_info = first_session.parse_file("polls/views.py", imports_py)
+    assert first_info.django_view_details.imports[0].type == "third_party"
+
+    # A new app appears between sessions: the persisted result of the unchanged file no longer applies.
+    (tmp_path / "shop").mkdir()
+    (tmp_path / "shop" / "__init__.py").write_text("")
+    second_session = CodeIntelligenceService(project_root=tmp_path)
+    assert second_session.parse_file("polls/views.py", imports_py).django_view_details.imports[0].type == "project_app"
+
+    # Each path keeps only its latest entry, and deleting the file removes it.
+    second_session.parse_file("polls/views.py", imports_py + "import json\n")
+    entries_dir = second_session.parse_cache.entries_dir
+    assert len(list(entries_dir.rglob("*.bin"))) == 1
+    second_session.handle_file_removed("polls/views.py")
+    assert not list(entries_dir.rglob("*.bin"))
+
+
+def test_parse_cache_refuses_foreign_pickles(tmp_path: Path):
+    """Entries that reference any global (e.g. a planted pickle) are discarded rather than executed."""
+    import os
+    import pickle
+    import zlib
+    from src.core.parse_cache import ParseCache
+
+    cache = ParseCache(tmp_path, "1")
+    entry_path = cache._entry_path("app/models.py", "abc")
+    entry_path.parent.mkdir(parents=True)
+    entry_path.write_bytes(zlib.compress(pickle.dumps(os.getcwd)))
+
+    assert cache.load("app/models.py", "abc") == (False, None)
+    assert not entry_path.exists()
+
+
+def test_memory_cache_evicts_least_recently_used_by_size(tmp_path: Path):
+    """The in-memory cache stays within its byte budget, evicting the least recently used entries."""
+    sizes = {}
+    probe = CodeIntelligenceService(project_root=tmp_path, persistent_cache=False)
+    for path, content in (("a/models.py", SAMPLE_MODELS_PY), ("b/models.py", SAMPLE_COMPLEX_MODELS_PY), ("c/models.py", SAMPLE_MODELS_PY)):
+        sizes[path] = probe.in_memory_cache.estimate_size(path, len(content))
+    budget = sizes["a/models.py"] + sizes["b/models.py"] + sizes["c/models.py"] // 2
+    service = CodeIntelligenceService(project_root=tmp_path, persistent_cache=False, memory_cache_max_bytes=budget)
+    cache = service.in_memory_cache
+
+    service.parse_file("a/models.py", SAMPLE_MODELS_PY)
+    service.parse_file("b/models.py", SAMPLE_COMPLEX_MODELS_PY)
+    service.parse_file("a/models.py", SAMPLE_MODELS_PY)  # Hit: "a" is now the most recently used.
+    service.parse_file("c/models.py", SAMPLE_MODELS_PY)  # Over budget: "b" is evicted.
+
+    assert "a/models.py" in cache and "c/models.py" in cache and "b/models.py" not in cache
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 3, 1)
+    assert stats["bytes"] == sizes["a/models.py"] + sizes["c/models.py"] <= budget
+
+
+def test_memory_cache_invalidation_hooks(tmp_path: Path):
+    """Files deleted through the FileSystemManager, including by a rollback, are dropped from the caches."""
+    from src.core.file_system_manager import FileSystemManager
+    service = CodeIntelligenceService(project_root=tmp_path)
+    fs_manager = FileSystemManager(tmp_path)
+    fs_manager.add_file_removed_listener(service.handle_file_removed)
+    for path in ("polls/models.py", "polls/views.py"):
+        service.handle_file_written(fs_manager.write_file(path, SAMPLE_MODELS_PY))
+    fs_manager.begin_checkpoint()
+    service.handle_file_written(fs_manager.write_file("polls/forms.py", SAMPLE_FORMS_PY))
+    cache = service.in_memory_cache
+
+    fs_manager.delete_file("polls/views.py")
+    assert "polls/views.py" not in cache
+    assert fs_manager.rollback_last_checkpoint() == ["polls/views.py", "polls/forms.py"]
+    assert "polls/forms.py" not in cache
+    assert len(cache) == 1 and "polls/models.py" in cache
+    assert len(list(service.parse_cache.entries_dir.rglob("*.bin"))) == 1
+
+
+def test_removed_directories_are_dropped_from_the_memory_cache(tmp_path: Path):
+    """A directory deleted or renamed behind the manager's back is reported by the file index and dropped by prefix."""
+    import shutil
+    from src.core.file_system_manager import FileSystemManager
+    service = CodeIntelligenceService(project_root=tmp_path, persistent_cache=False)
+    fs_manager = FileSystemManager(tmp_path)
+    for path in ("polls/models.py", "polls/sub/views.py", "pollsters/models.py"):
+        service.handle_file_written(fs_manager.write_file(path, SAMPLE_MODELS_PY))
+    fs_manager.file_index.refresh()
+
+    shutil.move(str(tmp_path / "polls"), str(tmp_path / "voting"))
+    changes = fs_manager.file_index.refresh()
+    assert changes.deleted_dirs == {"polls"}
+    for removed_dir in changes.deleted_dirs:
+        service.handle_directory_removed(removed_dir)
+
+    cache = service.in_memory_cache
+    assert len(cache) == 1 and "pollsters/models.py" in cache
+    assert cache.invalidate_prefix("pollsters/") == 1
+
+
+def test_process_pool_parsing_matches_in_process_results(tmp_path: Path):
+    """Worker processes return the same results as parsing in-process, and they land in the caches."""
+    files = {
+        "polls/models.py": SAMPLE_COMPLEX_MODELS_PY,
+        "polls/views.py": SAMPLE_VIEWS_PY,
+        "polls/urls.py": SAMPLE_URLS_PY,
+        "polls/admin.py": SAMPLE_ADMIN_PY,
+        "polls/forms.py": SAMPLE_FORMS_PY,
+        "myproject/settings.py": SAMPLE_SETTINGS_PY,
+    }
+    expected = CodeIntelligenceService(project_root=tmp_path, persistent_cache=False).parse_files_in_parallel(files)
+    service = CodeIntelligenceService(project_root=tmp_path)
+    service.parse_file("polls/models.py", SAMPLE_COMPLEX_MODELS_PY)  # Already cached: served without a worker.
+
+    results = service.parse_files_in_parallel(files, max_workers=2, use_processes=True, chunk_size=2)
+
+    assert results == expected
+    assert all(path in service.in_memory_cache for path in files)
+    assert service.in_memory_cache.stats()["hits"] == 1
+    assert CodeIntelligenceService(project_root=tmp_path).parse_cache.load("polls/urls.py", service.in_memory_cache["polls/urls.py"][0]) == (True, expected["polls/urls.py"])
+
+
+def test_process_pool_parsing_survives_a_failing_file(intelligence_service: CodeIntelligenceService, monkeypatch):
+    """A file whose parsing raises yields None; the other files of its batch are still returned."""
+    import src.core.code_intelligence_service as cis_module
+
+    original_parse_python_ast = intelligence_service._parse_python_ast
+    def _failing_parse_python_ast(content, file_path_str, tree=None):
+        if file_path_str == "b.py":
+            raise RuntimeError("extractor bug")
+        return original_parse_python_ast(content, file_path_str, tree)
+    monkeypatch.setattr(intelligence_service, "_parse_python_ast", _failing_parse_python_ast)
+    files = {"a.py": "def a():\n    return 1\n", "b.py": "def b():\n    return 2\n"}
+
+    # In-process (a single batch does not start workers).
+    results = intelligence_service.parse_files_in_parallel(files, use_processes=True, chunk_size=10)
+    assert results["b.py"] is None
+    assert results["a.py"] is not None
+    assert "b.py" not in intelligence_service.in_memory_cache
+
+    # In a worker, the failure is reported per file.
+    monkeypatch.setattr(cis_module, "_worker_service", intelligence_service)
+    parsed_batch = cis_module._parse_batch_in_worker([(path, content, "hash-" + path) for path, content in files.items()])
+    assert [entry[0] for entry in parsed_batch] == ["a.py", "b.py"]
+    assert parsed_batch[0][2] is not None and parsed_batch[0][3] is None
+    assert parsed_batch[1][2] is None and "extractor bug" in parsed_batch[1][3]
+
+
+def test_written_files_are_cached_under_the_hash_of_their_text(tmp_path: Path, monkeypatch):
+    """A file written with CRLF line endings is found again by a later parse of the same text."""
+    from src.core.file_system_manager import FileSystemManager
+    service = CodeIntelligenceService(project_root=tmp_path, persistent_cache=False)
+    event = FileSystemManager(tmp_path).write_file("polls/models.py", SAMPLE_MODELS_PY.replace("\n", "\r\n"))
+    written_info = service.handle_file_written(event)
+
+    monkeypatch.setattr(service, "_parse_python_ast", lambda *a, **k: pytest.fail("written file was re-parsed"))
+    assert service.parse_file("polls/models.py", SAMPLE_MODELS_PY) is written_info
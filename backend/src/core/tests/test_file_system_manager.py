@@ -3,7 +3,9 @@ import pytest
 import textwrap
 from pathlib import Path
 import hashlib
+import json
 import os
+import threading
 
 from src.core.file_system_manager import FileSystemManager
 from src.core.exceptions import PatchApplyError
@@ -237,4 +239,579 @@ class TestSnapshotOperations:
         assert fs_manager.file_exists("subdir/file2.py"), "Deleted file should be restored."
         assert fs_manager.read_file("subdir/file2.py") == "content2"
 
-        assert not fs_manager.file_exists("new_file.txt"), "Newly added file should be deleted by write_snapshot."
\ No newline at end of file
+        assert not fs_manager.file_exists("new_file.txt"), "Newly added file should be deleted by write_snapshot."
+    async def test_create_snapshot_reuses_unchanged_entries(self, fs_manager: FileSystemManager, project_root: Path):
+        """Unchanged files keep their previous entry; only changed files are re-captured."""
+        fs_manager.write_file("stable.py", "x = 1")
+        fs_manager.write_file("changing.py", "y = 1")
+        # Push mtimes safely outside the racy-clean window so the cache can be trusted.
+        old = 1_600_000_000
+        os.utime(project_root / "stable.py", (old, old))
+        os.utime(project_root / "changing.py", (old, old))
+
+        first = await fs_manager.create_snapshot()
+        fs_manager.write_file("changing.py", "y = 22")
+        second = await fs_manager.create_snapshot()
+
+        assert second["stable.py"] is first["stable.py"]
+        assert second["changing.py"]["content"] == "y = 22"
+        assert second["changing.py"]["sha256"] != first["changing.py"]["sha256"]
+
+    async def test_snapshot_blobs_are_content_addressed(self, fs_manager: FileSystemManager, project_root: Path):
+        """Snapshot content is stored once per hash under .vebgen/objects and never snapshotted itself."""
+        fs_manager.write_file("a.txt", "same")
+        fs_manager.write_file("b.txt", "same")
+        snapshot = await fs_manager.create_snapshot()
+
+        sha = snapshot["a.txt"]["sha256"]
+        assert snapshot["b.txt"]["sha256"] == sha
+        assert (project_root / ".vebgen" / "objects" / sha[:2] / sha[2:]).read_bytes() == b"same"
+        assert not any(path.startswith(".vebgen/") for path in snapshot)
+
+    async def test_write_snapshot_restores_binary_and_skips_unchanged(self, fs_manager: FileSystemManager, project_root: Path):
+        """Binary files round-trip byte-for-byte and unchanged files are not rewritten."""
+        payload = b"\x89PNG\r\n\x1a\n\x00\xff"
+        (project_root / "logo.png").write_bytes(payload)
+        fs_manager.write_file("untouched.txt", "keep me")
+        old = 1_600_000_000
+        os.utime(project_root / "untouched.txt", (old, old))
+
+        snapshot = await fs_manager.create_snapshot()
+        assert snapshot["logo.png"]["content"] is None
+
+        (project_root / "logo.png").write_bytes(b"corrupted")
+        await fs_manager.write_snapshot(snapshot)
+
+        assert (project_root / "logo.png").read_bytes() == payload
+        assert os.stat(project_root / "untouched.txt").st_mtime_ns == old * 1_000_000_000
+
+    async def test_create_snapshot_in_bounded_chunks(self, fs_manager: FileSystemManager):
+        """Bulk capture with tiny chunks and few workers still yields a complete, ordered snapshot."""
+        for i in range(25):
+            fs_manager.write_file(f"pkg/mod_{i:02d}.py", f"value = {i}")
+        snapshot = await fs_manager.create_snapshot(max_workers=2, chunk_size=3, max_inflight_bytes=40)
+        assert list(snapshot) == sorted(snapshot)
+        assert len(snapshot) == 25
+        assert snapshot["pkg/mod_07.py"]["content"] == "value = 7"
+
+    async def test_run_chunked_respects_worker_and_byte_limits(self, fs_manager: FileSystemManager):
+        """No more than max_workers chunks, or max_inflight_bytes bytes, are ever in flight."""
+        lock = threading.Lock()
+        state = {"workers": 0, "bytes": 0, "max_workers": 0, "max_bytes": 0}
+
+        def worker(payloads):
+            size = sum(payloads)
+            with lock:
+                state["workers"] += 1
+                state["bytes"] += size
+                state["max_workers"] = max(state["max_workers"], state["workers"])
+                state["max_bytes"] = max(state["max_bytes"], state["bytes"])
+            threading.Event().wait(0.01)
+            with lock:
+                state["workers"] -= 1
+                state["bytes"] -= size
+            return payloads
+
+        items = [(10, 10)] * 40
+        results = [r async for r in fs_manager._run_chunked(worker, items, max_workers=3, chunk_size=2, max_inflight_bytes=50)]
+
+        assert len(results) == 40
+        assert state["max_workers"] <= 3
+        assert state["max_bytes"] <= 50
+
+    async def test_snapshot_values_are_lazy(self, fs_manager: FileSystemManager, project_root: Path):
+        """Entries hold only metadata; content is loaded from the blob store on demand."""
+        fs_manager.write_file("views.py", "def index(): pass")
+        snapshot = await fs_manager.create_snapshot()
+        entry = snapshot["views.py"]
+
+        assert set(entry.keys()) == {"sha256", "size", "mtime_ns"}
+        assert entry["size"] == len("def index(): pass")
+        # Changing the file on disk does not affect what the snapshot reads back.
+        fs_manager.write_file("views.py", "def index(): return 1")
+        assert entry["content"] == "def index(): pass"
+        assert fs_manager.read_file("views.py", from_snapshot=snapshot) == "def index(): pass"
+
+
+class TestRollbackJournal:
+    """Tests for the journal-based rollback mode."""
+
+    def test_default_mode_is_journal_and_unknown_mode_rejected(self, project_root: Path):
+        assert FileSystemManager(project_root).rollback_mode == "journal"
+        with pytest.raises(ValueError, match="rollback_mode"):
+            FileSystemManager(project_root, rollback_mode="bogus")
+
+    def test_rollback_reverts_only_the_last_checkpoint(self, fs_manager: FileSystemManager, project_root: Path):
+        fs_manager.write_file("keep.py", "a = 1")
+        fs_manager.write_file("edit.py", "b = 1")
+        fs_manager.write_file("gone.py", "c = 1")
+
+        fs_manager.begin_checkpoint("first")
+        fs_manager.write_file("keep.py", "a = 2")
+
+        fs_manager.begin_checkpoint("second")
+        fs_manager.write_file("edit.py", "b = 2")
+        fs_manager.write_file("edit.py", "b = 3")  # Only the first pre-image is kept
+        fs_manager.delete_file("gone.py")
+        fs_manager.write_file("pkg/new.py", "d = 1")
+        (project_root / "made_by_command.txt").write_text("x")
+        fs_manager.record_created_files(["made_by_command.txt"])
+
+        assert fs_manager.get_pre_image_text("edit.py") == "b = 1"
+        assert fs_manager.get_pre_image_text("pkg/new.py") == ""
+
+        reverted = fs_manager.rollback_last_checkpoint()
+
+        assert set(reverted) == {"edit.py", "gone.py", "pkg/new.py", "made_by_command.txt"}
+        assert fs_manager.read_file("edit.py") == "b = 1"
+        assert fs_manager.read_file("gone.py") == "c = 1"
+        assert not fs_manager.file_exists("pkg/new.py")
+        assert not fs_manager.file_exists("made_by_command.txt")
+        # Changes from the earlier checkpoint are untouched.
+        assert fs_manager.read_file("keep.py") == "a = 2"
+
+    def test_rollback_without_checkpoint_is_a_no_op(self, fs_manager: FileSystemManager):
+        fs_manager.write_file("file.txt", "content")
+        assert fs_manager.rollback_last_checkpoint() == []
+        assert fs_manager.read_file("file.txt") == "content"
+
+    @pytest.mark.asyncio
+    async def test_pruning_checkpoints_collects_unreferenced_blobs(self, fs_manager: FileSystemManager, monkeypatch):
+        """Blobs only a pruned checkpoint referenced are deleted; live snapshots and retained checkpoints keep theirs."""
+        import src.core.snapshot_store as snapshot_store_module
+        monkeypatch.setattr(snapshot_store_module, "BLOB_GC_GRACE_NS", 0)
+        store = fs_manager.snapshot_store
+        fs_manager.journal.max_checkpoints = 2
+        fs_manager.write_file("a.py", "v0")
+        fs_manager.write_file("b.py", "held by a snapshot")
+        snapshot = await fs_manager.create_snapshot()
+
+        for version in ("v1", "v2", "v3"):
+            fs_manager.begin_checkpoint()
+            fs_manager.write_file("a.py", version)
+        # Checkpoints 2 and 3 are retained, with the pre-images "v1" and "v2".
+        assert store.has_blob(hashlib.sha256(b"v1").hexdigest())
+        fs_manager.begin_checkpoint()  # Prunes the checkpoint whose pre-image is "v1".
+
+        assert not store.has_blob(hashlib.sha256(b"v1").hexdigest())
+        assert store.has_blob(hashlib.sha256(b"v2").hexdigest())
+        assert store.has_blob(snapshot["a.py"]["sha256"]) and store.has_blob(snapshot["b.py"]["sha256"])
+        assert fs_manager.rollback_last_checkpoint() == []
+        assert fs_manager.rollback_last_checkpoint() == ["a.py"]
+        assert fs_manager.read_file("a.py") == "v2"
+
+
+class TestProjectFileIndex:
+    """Tests for the shared project file index used by all tree scans."""
+
+    def test_refresh_reports_external_changes_only(self, fs_manager: FileSystemManager, project_root: Path):
+        fs_manager.write_file("a.py", "a")
+        fs_manager.write_file("b.py", "b")
+        fs_manager.file_index.refresh()
+
+        # Writes through the manager are indexed immediately and not reported again.
+        fs_manager.write_file("managed.py", "m")
+        (project_root / "external.py").write_text("e")
+        (project_root / "a.py").write_text("changed size")
+        (project_root / "b.py").unlink()
+        (project_root / "node_modules").mkdir()
+        (project_root / "node_modules" / "dep.js").write_text("ignored")
+
+        changes = fs_manager.file_index.refresh()
+
+        assert changes.created == {"external.py"}
+        assert changes.modified == {"a.py"}
+        assert changes.deleted == {"b.py"}
+        assert fs_manager.file_index.files() == ["a.py", "external.py", "managed.py"]
+
+    def test_index_is_persisted_with_hashes(self, fs_manager: FileSystemManager, project_root: Path):
+        fs_manager.write_file("pkg/mod.py", "x = 1")
+        fs_manager.file_index.refresh()
+        entry = fs_manager.file_index.get("pkg/mod.py")
+        fs_manager.file_index.record_hash("pkg/mod.py", entry.size, entry.mtime_ns, "abc123")
+        fs_manager.file_index.save()
+
+        reloaded = FileSystemManager(project_root).file_index
+        assert reloaded.get("pkg/mod.py").sha256 == "abc123"
+        assert not reloaded.refresh(), "Nothing changed on disk since the index was saved."
+
+    def test_get_all_files_and_structure_map_use_index(self, fs_manager: FileSystemManager):
+        fs_manager.write_file("app/views.py", "")
+        fs_manager.write_file("app/debug.log", "")
+        fs_manager.write_file("build/out.js", "")
+        fs_manager.write_file("README.md", "")
+
+        assert fs_manager.get_all_files_in_project() == ["README.md", "app/views.py"]
+        structure = fs_manager.get_directory_structure_markdown()
+        assert structure.splitlines()[1:] == [
+            "- app/",
+            "    - debug.log",
+            "    - views.py",
+            "- build/",
+            "    - out.js",
+            "- README.md",
+        ]
+
+    def test_watcher_keeps_index_current_without_consuming_changes(self, fs_manager: FileSystemManager, project_root: Path, monkeypatch):
+        fs_manager.file_index.refresh()
+        seen = threading.Event()
+        fs_manager.file_index.start_watcher(interval=0.05, on_change=lambda changes: seen.set())
+        try:
+            (project_root / "late.py").write_text("x")
+            assert seen.wait(5), "Watcher did not pick up the new file."
+            monkeypatch.setattr(fs_manager.file_index, "_scan", lambda: pytest.fail("ensure_fresh() rescanned."))
+            assert "late.py" in fs_manager.get_all_files_in_project()
+        finally:
+            monkeypatch.undo()
+            fs_manager.file_index.stop_watcher()
+
+        assert fs_manager.file_index.refresh().created == {"late.py"}, "The watcher's findings are reported by the next refresh."
+        assert not fs_manager.file_index.refresh()
+
+    def test_ensure_fresh_does_not_hide_changes_from_refresh(self, fs_manager: FileSystemManager, project_root: Path):
+        fs_manager.file_index.refresh()
+        (project_root / "made_by_command.py").write_text("x")
+        fs_manager.get_all_files_in_project()
+
+        assert fs_manager.file_index.refresh().created == {"made_by_command.py"}
+
+    def test_refresh_only_relists_changed_directories(self, fs_manager: FileSystemManager, project_root: Path, monkeypatch):
+        for app in ("blog", "users", "shop"):
+            fs_manager.write_file(f"{app}/models.py", "")
+        fs_manager.file_index.refresh()  # Creates .vebgen/ for the persisted index.
+        old = 1_600_000_000
+        for directory in (project_root, project_root / "blog", project_root / "users", project_root / "shop"):
+            os.utime(directory, (old, old))
+        fs_manager.file_index.refresh()  # Records the (now trusted) directory mtimes.
+
+        import src.core.file_index as file_index_module
+        listed = []
+        real_scandir = os.scandir
+        monkeypatch.setattr(file_index_module.os, "scandir", lambda path: listed.append(Path(path)) or real_scandir(path))
+
+        (project_root / "users" / "apps.py").write_text("")
+        (project_root / "shop" / "models.py").write_text("changed in place")
+        changes = fs_manager.file_index.refresh()
+
+        assert listed == [project_root / "users"]
+        assert changes.created == {"users/apps.py"}
+        assert changes.modified == {"shop/models.py"}
+        assert not changes.deleted
+
+
+class TestDirectoryStructureCache:
+    """Tests for the cached, per-directory structure map."""
+
+    def _age_dirs(self, project_root: Path, *rel_dirs: str):
+        old = 1_600_000_000
+        for rel_dir in rel_dirs:
+            os.utime(project_root / rel_dir, (old, old))
+
+    def test_unchanged_directories_are_not_relisted(self, fs_manager: FileSystemManager, project_root: Path, monkeypatch):
+        fs_manager.write_file("app/views.py", "")
+        self._age_dirs(project_root, ".", "app")
+        first = fs_manager.get_directory_structure_markdown()
+
+        import src.core.directory_tree as tree_module
+        monkeypatch.setattr(tree_module.os, "scandir", lambda *a: pytest.fail("directory was re-listed"))
+        assert fs_manager.get_directory_structure_markdown() == first
+
+    def test_writes_and_deletes_invalidate_their_directories(self, fs_manager: FileSystemManager, project_root: Path):
+        fs_manager.write_file("app/views.py", "")
+        self._age_dirs(project_root, ".", "app")
+        fs_manager.get_directory_structure_markdown()
+
+        fs_manager.write_file("app/api/serializers.py", "")
+        fs_manager.delete_file("app/views.py")
+        assert fs_manager.get_directory_structure_markdown().splitlines()[1:] == [
+            "- app/",
+            "    - api/",
+            "        - serializers.py",
+        ]
+
+    def test_external_changes_are_picked_up_via_directory_mtime(self, fs_manager: FileSystemManager, project_root: Path):
+        fs_manager.write_file("app/views.py", "")
+        self._age_dirs(project_root, ".", "app")
+        fs_manager.get_directory_structure_markdown()
+
+        (project_root / "app" / "models.py").write_text("")
+        assert "    - models.py" in fs_manager.get_directory_structure_markdown().splitlines()
+
+    def test_limits_are_applied_at_render_time(self, fs_manager: FileSystemManager):
+        for i in range(3):
+            fs_manager.write_file(f"pkg/sub/mod{i}.py", "")
+        assert fs_manager.get_directory_structure_markdown(max_depth=1).splitlines()[1:] == [
+            "- pkg/",
+            "    - sub/",
+        ]
+        assert fs_manager.get_directory_structure_markdown(max_items_per_dir=2).splitlines()[1:] == [
+            "- pkg/",
+            "    - sub/",
+            "        - mod0.py",
+            "        - mod1.py",
+            "        - ... (truncated)",
+        ]
+
+
+class TestReadFileWithHash:
+    """Tests for single-pass read+hash and the hash cache."""
+
+    def test_returns_content_and_hash_of_bytes(self, fs_manager: FileSystemManager, project_root: Path):
+        (project_root / "crlf.py").write_bytes(b"a = 1\r\nb = 2\r\n")
+        content, sha = fs_manager.read_file_with_hash("crlf.py")
+        assert content == "a = 1\nb = 2\n"
+        assert sha == hashlib.sha256(b"a = 1\r\nb = 2\r\n").hexdigest()
+        assert sha == fs_manager.get_file_hash("crlf.py")
+
+    def test_missing_file_raises(self, fs_manager: FileSystemManager):
+        with pytest.raises(FileNotFoundError):
+            fs_manager.read_file_with_hash("missing.py")
+
+    def test_write_file_returns_post_write_event(self, fs_manager: FileSystemManager):
+        event = fs_manager.write_file("pkg/mod.py", "x = 1\r\ny = 2\n")
+        assert event.path == "pkg/mod.py"
+        assert (event.content, event.sha256) == fs_manager.read_file_with_hash("pkg/mod.py")
+        assert event.parsed_ast is None
+
+    def test_write_event_hashes_the_content_it_carries(self, fs_manager: FileSystemManager):
+        """`content_sha256` matches the normalized text even when the bytes on disk differ from it."""
+        for path, content in (("plain.py", "x = 1\n"), ("crlf.py", "x = 1\r\ny = 2\n")):
+            event = fs_manager.write_file(path, content)
+            assert event.content_sha256 == hashlib.sha256(event.content.encode("utf-8")).hexdigest()
+        assert event.content_sha256 != event.sha256
+
+    def test_unchanged_files_are_not_rehashed(self, fs_manager: FileSystemManager, project_root: Path, monkeypatch):
+        fs_manager.write_file("stable.py", "x = 1")
+        old = 1_600_000_000
+        os.utime(project_root / "stable.py", (old, old))
+        expected = fs_manager.get_file_hash("stable.py")
+
+        import src.core.file_system_manager as fsm_module
+        monkeypatch.setattr(fsm_module.hashlib, "sha256", lambda *a: pytest.fail("file was re-hashed"))
+        assert fs_manager.get_file_hash("stable.py") == expected
+        assert fs_manager.read_file_with_hash("stable.py") == ("x = 1", expected)
+
+    def test_recently_modified_files_are_not_cached(self, fs_manager: FileSystemManager, project_root: Path):
+        fs_manager.write_file("fresh.py", "x = 1")
+        first = fs_manager.get_file_hash("fresh.py")
+        # Same size, rewritten within the racy window: must not be served from the cache.
+        (project_root / "fresh.py").write_text("x = 2")
+        assert fs_manager.get_file_hash("fresh.py") != first
+
+
+class TestFileTransactions:
+    """Tests for staged, crash-recoverable multi-file transactions."""
+
+    def test_apply_atomic_file_updates_uses_no_backups(self, fs_manager: FileSystemManager, project_root: Path):
+        fs_manager.write_file("a.py", "old a")
+        success, applied, backups = fs_manager.apply_atomic_file_updates({"a.py": "new a", "pkg/b.py": "new b"})
+
+        assert success and backups == {}
+        assert sorted(applied) == ["a.py", "pkg/b.py"]
+        assert fs_manager.read_file("a.py") == "new a"
+        assert fs_manager.read_file("pkg/b.py") == "new b"
+        assert not list(project_root.glob("**/*.bak"))
+        assert not any((project_root / ".vebgen" / "txn").iterdir())
+
+    def test_failed_staging_leaves_project_untouched(self, fs_manager: FileSystemManager):
+        fs_manager.write_file("a.py", "old a")
+        with pytest.raises(PatchApplyError):
+            fs_manager.apply_atomic_file_updates({"a.py": "new a", "../escape.py": "nope"})
+        assert fs_manager.read_file("a.py") == "old a"
+
+    def test_transaction_context_manager_and_delete(self, fs_manager: FileSystemManager):
+        fs_manager.write_file("old.py", "x")
+        with fs_manager.begin_transaction() as txn:
+            txn.write("new.py", "y")
+            txn.delete("old.py")
+            assert not fs_manager.file_exists("new.py"), "Nothing is applied before commit."
+        assert fs_manager.read_file("new.py") == "y"
+        assert not fs_manager.file_exists("old.py")
+
+    def test_failed_replace_restores_every_file(self, fs_manager: FileSystemManager, project_root: Path, monkeypatch):
+        fs_manager.write_file("a.py", "old a")
+        fs_manager.write_file("b.py", "old b")
+        real_replace = os.replace
+        calls = []
+
+        def failing_replace(src, dst):
+            calls.append(dst)
+            if len(calls) == 2:
+                raise OSError("disk full")
+            return real_replace(src, dst)
+
+        monkeypatch.setattr("src.core.file_transaction.os.replace", failing_replace)
+        with pytest.raises(PatchApplyError):
+            fs_manager.apply_atomic_file_updates({"a.py": "new a", "b.py": "new b", "c.py": "new c"})
+
+        assert fs_manager.read_file("a.py") == "old a"
+        assert fs_manager.read_file("b.py") == "old b"
+        assert not fs_manager.file_exists("c.py")
+        assert not any((project_root / ".vebgen" / "txn").iterdir())
+
+    def test_unrestorable_transaction_is_rolled_forward_on_restart(self, fs_manager: FileSystemManager, project_root: Path, monkeypatch):
+        fs_manager.write_file("a.py", "old a")
+        fs_manager.write_file("b.py", "old b")
+        real_replace = os.replace
+        calls = []
+
+        def failing_replace(src, dst):
+            calls.append(dst)
+            if len(calls) >= 2:
+                raise OSError("disk gone")
+            return real_replace(src, dst)
+
+        monkeypatch.setattr("src.core.file_transaction.os.replace", failing_replace)
+        with fs_manager.begin_transaction() as txn:
+            txn.write("a.py", "new a")
+            txn.write("b.py", "new b")
+            with pytest.raises(RuntimeError, match="rolled forward"):
+                txn.commit()
+            assert txn.state == "pending"
+        assert (txn.txn_dir / "COMMITTED").is_file(), "A committed transaction must survive the context manager."
+        monkeypatch.undo()
+
+        fs = FileSystemManager(project_root)
+
+        assert fs.read_file("a.py") == "new a"
+        assert fs.read_file("b.py") == "new b"
+        assert not any((project_root / ".vebgen" / "txn").iterdir())
+
+    def test_recovery_rolls_forward_committed_and_discards_uncommitted(self, project_root: Path):
+        txn_root = project_root / ".vebgen" / "txn"
+        committed = txn_root / "20240101_000000_aaaa"
+        committed.mkdir(parents=True)
+        (committed / "00001.stage").write_text("recovered")
+        (committed / "manifest.json").write_text(json.dumps({"ops": [["app/views.py", "00001.stage"]]}))
+        (committed / "COMMITTED").write_text("")
+        pending = txn_root / "20240101_000001_bbbb"
+        pending.mkdir()
+        (pending / "00001.stage").write_text("never applied")
+        (pending / "manifest.json").write_text(json.dumps({"ops": [["app/urls.py", "00001.stage"]]}))
+
+        fs = FileSystemManager(project_root)
+
+        assert fs.read_file("app/views.py") == "recovered"
+        assert not fs.file_exists("app/urls.py")
+        assert not any(txn_root.iterdir())
+
+
+class TestReadFileView:
+    """Tests for memory-mapped file views."""
+
+    def test_size_head_and_tail_without_full_decode(self, fs_manager: FileSystemManager, project_root: Path):
+        (project_root / "data.txt").write_bytes(b"first\r\n" + b"x" * 100_000 + b"\r\nlast\r\n")
+        with fs_manager.read_file_view("data.txt") as view:
+            assert view.size == (project_root / "data.txt").stat().st_size
+            assert not view.is_binary
+            assert view.head(7) == "first\n"
+            assert view.tail(6) == "last\n"
+            lines, truncated = view.head_lines(1)
+            assert lines == ["first\n"] and truncated
+            assert view.line_count() == 4
+
+    def test_binary_and_empty_files(self, fs_manager: FileSystemManager, project_root: Path):
+        (project_root / "db.sqlite3").write_bytes(b"SQLite format 3\x00\x01\x02")
+        (project_root / "empty.txt").touch()
+        with fs_manager.read_file_view("db.sqlite3") as view:
+            assert view.is_binary
+        with fs_manager.read_file_view("empty.txt") as view:
+            assert view.size == 0
+            assert view.head_lines(5) == ([], False)
+            assert view.text() == ""
+
+    def test_missing_file_raises(self, fs_manager: FileSystemManager):
+        with pytest.raises(FileNotFoundError):
+            fs_manager.read_file_view("missing.json")
+
+
+class TestUnifiedDiffFastPath:
+    """Tests for splicing exact unified-diff hunks without diff-match-patch."""
+
+    SOURCE = "".join(f"line {i}\n" for i in range(1, 31))
+
+    def _patch(self, start: int) -> str:
+        return textwrap.dedent(f"""\
+            --- a/data.txt
+            +++ b/data.txt
+            @@ -{start},3 +{start},3 @@
+             line 10
+            -line 11
+            +line eleven
+             line 12
+            """)
+
+    @pytest.mark.parametrize("stated_start", [10, 7, 13])
+    def test_exact_or_slightly_offset_hunks_skip_dmp(self, fs_manager: FileSystemManager, monkeypatch, stated_start: int):
+        fs_manager.write_file("data.txt", self.SOURCE)
+        import src.core.file_system_manager as fsm_module
+        monkeypatch.setattr(fsm_module.diff_match_patch, "patch_apply", lambda *a: pytest.fail("dmp was used"))
+
+        fs_manager.apply_patch("data.txt", self._patch(stated_start))
+
+        assert fs_manager.read_file("data.txt") == self.SOURCE.replace("line 11\n", "line eleven\n")
+
+    def test_mismatching_context_falls_back_to_dmp(self, fs_manager: FileSystemManager):
+        fs_manager.write_file("data.txt", self.SOURCE.replace("line 12\n", "line 12 # edited\n"))
+
+        fs_manager.apply_patch("data.txt", self._patch(10))
+
+        assert "line eleven\n" in fs_manager.read_file("data.txt")
+
+
+class TestThreeWayMerge:
+    """Tests for the line-level diff3 merge."""
+
+    BASE = "".join(f"line {i}\n" for i in range(1, 21))
+
+    def test_disjoint_edits_merge_cleanly(self, fs_manager: FileSystemManager):
+        local = self.BASE.replace("line 3\n", "line three\n")
+        target = self.BASE.replace("line 15\n", "line fifteen\n").replace("line 20\n", "line 20\nline 21\n")
+
+        merged, conflict_msg = fs_manager._perform_three_way_merge(self.BASE, local, target)
+
+        assert conflict_msg is None
+        assert merged == local.replace("line 15\n", "line fifteen\n") + "line 21\n"
+
+    def test_identical_edits_do_not_conflict(self, fs_manager: FileSystemManager):
+        both = self.BASE.replace("line 7\n", "line seven\n")
+        assert fs_manager._perform_three_way_merge(self.BASE, both, both) == (both, None)
+
+    def test_overlapping_edits_report_the_conflict_region(self, fs_manager: FileSystemManager):
+        local = self.BASE.replace("line 10\n", "local 10\n")
+        target = self.BASE.replace("line 10\nline 11\n", "target 10\ntarget 11\n").replace("line 2\n", "line two\n")
+
+        merged, conflict_msg = fs_manager._perform_three_way_merge(self.BASE, local, target)
+
+        assert conflict_msg == "Merge conflicts detected in 1 region(s) at base lines 10-11."
+        assert "line two\n" in merged
+        assert "<<<<<<< local\nlocal 10\nline 11\n=======\ntarget 10\ntarget 11\n>>>>>>> target\n" in merged
+
+    def test_target_is_reconstructed_from_a_unified_diff(self, fs_manager: FileSystemManager):
+        diff = "--- a/f.txt\n+++ b/f.txt\n@@ -4,3 +4,3 @@\n line 4\n-line 5\n+line five\n line 6\n"
+        assert fs_manager._get_target_content_from_base_and_diff(self.BASE, diff) == self.BASE.replace("line 5\n", "line five\n")
+        with pytest.raises(PatchApplyError):
+            fs_manager._get_target_content_from_base_and_diff("other\n", diff)
+
+    def test_reconstructed_target_keeps_base_whitespace_for_a_clean_merge(self, fs_manager: FileSystemManager):
+        base = self.BASE.replace("line 5\n", "line 5   \n").replace("line 18\n", "line 18\t\n") + "\n\n"
+        local = base.replace("line 18\t\n", "line eighteen\n")
+        diff = "--- a/f.txt\n+++ b/f.txt\n@@ -4,3 +4,3 @@\n line 4\n line 5\n-line 6\n+line six\n"
+
+        target = fs_manager._get_target_content_from_base_and_diff(base, diff)
+        merged, conflict_msg = fs_manager._perform_three_way_merge(base, local, target)
+
+        assert target == base.replace("line 6\n", "line six\n")
+        assert conflict_msg is None
+        assert merged == local.replace("line 6\n", "line six\n")
+
+    def test_diff_lines_aligns_moved_and_repeated_lines(self):
+        from src.core.line_merge import diff_lines
+        a = ["{", "a", "}", "{", "b", "}", "c"]
+        b = ["c", "{", "a", "}", "{", "x", "}"]
+
+        matches = diff_lines(a, b)
+
+        assert all(a[i] == b[j] for i, j in matches)
+        assert [pair[0] for pair in matches] == sorted(pair[0] for pair in matches)
+        assert len(matches) == 5
@@ -0,0 +1,230 @@
+# backend/src/core/tests/test_patch_benchmarks.py
+"""
+Patch-engine benchmark corpus and regression harness.
+
+Runs a deterministic corpus of SEARCH/REPLACE and unified-diff patches against
+synthetic Python files, then reports, per case, how often each matching layer
+succeeded and the p50/p95 latency of `apply_patch`, `apply_search_replace_patch`
+and `_apply_patch_fuzzy`. The run fails if a case is missing from the stored
+baseline, succeeds less often than in it, its layer hits differ from it, or its
+p95 exceeds the baseline beyond the tolerance below. The baseline covers every
+size, so the full run is checked the same way.
+
+Environment variables:
+    VEBGEN_PATCH_BENCHMARK_FULL=1    Also run the 5k and 20k line files (slow).
+    VEBGEN_PATCH_BENCHMARK_UPDATE=1  Rewrite the baseline from this run.
+"""
+import gc
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import pytest
+
+from src.core.exceptions import PatchApplyError
+from src.core.file_system_manager import FileSystemManager
+from src.core.performance_monitor import performance_monitor
+
+BASELINE_PATH = Path(__file__).with_name("patch_benchmark_baseline.json")
+DEFAULT_SIZES = (100, 1000)
+FULL_SIZES = (5000, 20000)
+SAMPLES_PER_CASE = 5
+# A case regresses if its p95 exceeds both baseline * factor and baseline + slack.
+LATENCY_REGRESSION_FACTOR = 3.0
+LATENCY_REGRESSION_SLACK_S = 0.02
+
+# --- Corpus ---
+
+def _function_lines(i: int) -> List[str]:
+    return [
+        f"def func_{i}(a, b):",
+        f'    """Compute value {i}."""',
+        "    total = a + b",
+        f"    if total > {i}:",
+        f"        return total - {i}",
+        f"    return total * {i % 7 + 1}",
+    ]
+
+
+def _make_source(line_count: int) -> str:
+    lines: List[str] = []
+    for i in range(line_count // 7):
+        lines.extend(_function_lines(i))
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def _replacement(i: int) -> str:
+    lines = _function_lines(i)
+    lines[-1] = f"    return total * {i % 7 + 1} + 1"
+    return "\n".join(lines)
+
+
+def _search_for(i: int, mutation: str) -> str:
+    lines = _function_lines(i)
+    if mutation == "whitespace":
+        lines = [line.replace(" = ", "  =  ").replace(" + ", "  +  ") for line in lines]
+    elif mutation == "indent":
+        # Shifted as a whole, so only the indentation-preserving layer (3) matches it.
+        lines = ["    " + line for line in lines]
+    elif mutation == "fuzzy":
+        lines[1] = f'    """Compute the value {i}."""'
+    elif mutation == "structural":
+        lines[2] = "    total = b + a"
+        lines[3] = f"    if total >= {i}:"
+    elif mutation == "missing":
+        lines = [f"def missing_{i}():", "    raise NotImplementedError"]
+    return "\n".join(lines)
+
+
+def _search_replace_patch(targets: List[int], mutation: str) -> str:
+    return "\n\n".join(
+        f"<<<<<<< SEARCH\n{_search_for(i, mutation)}\n=======\n{_replacement(i)}\n>>>>>>> REPLACE"
+        for i in targets
+    )
+
+
+def _unified_diff(i: int, line_shift: int) -> str:
+    start = i * 7 + 1 + line_shift
+    body = "\n".join(f" {line}" for line in _function_lines(i)[:-1])
+    return (
+        "--- a/bench.py\n+++ b/bench.py\n"
+        f"@@ -{start},6 +{start},6 @@\n{body}\n"
+        f"-{_function_lines(i)[-1]}\n+{_replacement(i).splitlines()[-1]}\n"
+    )
+
+
+# --- Harness ---
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _run_case(fs: FileSystemManager, source: str, apply: Callable[[int], object], targets: List[int]) -> Dict[str, object]:
+    counters_before = dict(performance_monitor.counters)
+    latencies: List[float] = []
+    successes = 0
+    # Like timeit, keep the garbage collector out of the timings: in a full test run the
+    # heap is large enough for a single collection to outweigh the patch itself.
+    gc.collect()
+    gc.disable()
+    try:
+        for target in targets:
+            fs.write_file("bench.py", source)
+            started = time.perf_counter()
+            try:
+                apply(target)
+                successes += 1
+            except PatchApplyError:
+                pass
+            latencies.append(time.perf_counter() - started)
+    finally:
+        gc.enable()
+    # Layer hits and total failures, as counted by the patch engine's metrics.
+    layers = {
+        name[len("patch."):].removesuffix(".hits"): count - counters_before.get(name, 0)
+        for name, count in performance_monitor.counters.items()
+        if (name.endswith(".hits") or name == "patch.all_layers_failed") and count > counters_before.get(name, 0)
+    }
+    return {
+        "success_rate": successes / len(targets),
+        "layers": dict(sorted(layers.items())),
+        "p50_s": _percentile(latencies, 0.50),
+        "p95_s": _percentile(latencies, 0.95),
+    }
+
+
+def _run_benchmark(project_root: Path, sizes: List[int]) -> Dict[str, Dict[str, object]]:
+    fs = FileSystemManager(project_root)
+    results: Dict[str, Dict[str, object]] = {}
+    for size in sizes:
+        source = _make_source(size)
+        function_count = size // 7
+        targets = [function_count * k // SAMPLES_PER_CASE + 1 for k in range(SAMPLES_PER_CASE)]
+
+        for mutation in ("exact", "whitespace", "indent", "fuzzy", "structural", "missing"):
+            results[f"apply_search_replace_patch/{size}/{mutation}"] = _run_case(
+                fs, source,
+                lambda i, m=mutation: fs.apply_search_replace_patch("bench.py", _search_replace_patch([i], m)),
+                targets,
+            )
+        for block_count in (5, 10):
+            spread = max(1, function_count // block_count)
+            results[f"apply_patch/{size}/search_replace_x{block_count}"] = _run_case(
+                fs, source,
+                lambda i, n=block_count, step=spread: fs.apply_patch(
+                    "bench.py", _search_replace_patch([(i + k * step) % function_count for k in range(n)], "exact")
+                ),
+                targets,
+            )
+        for label, shift in (("udiff_exact", 0), ("udiff_offset", 5)):
+            results[f"apply_patch/{size}/{label}"] = _run_case(
+                fs, source, lambda i, s=shift: fs.apply_patch("bench.py", _unified_diff(i, s)), targets,
+            )
+        results[f"_apply_patch_fuzzy/{size}/udiff_shifted"] = _run_case(
+            fs, source,
+            lambda i: fs._apply_patch_fuzzy("bench.py", _unified_diff(i, 40), PatchApplyError("benchmark")),
+            targets,
+        )
+    return results
+
+
+def _format_report(results: Dict[str, Dict[str, object]]) -> str:
+    lines = ["--- Patch Benchmark Report ---"]
+    for case, data in results.items():
+        layers = ", ".join(f"{name}={count}" for name, count in data["layers"].items()) or "-"
+        lines.append(
+            f"- {case:<55} ok={data['success_rate']:<4.0%} "
+            f"p50={data['p50_s'] * 1000:>8.2f}ms p95={data['p95_s'] * 1000:>8.2f}ms layers: {layers}"
+        )
+    return "\n".join(lines)
+
+
+def _find_regressions(results: Dict[str, Dict[str, object]], baseline: Dict[str, Dict[str, object]]) -> List[str]:
+    regressions = []
+    for case, actual in results.items():
+        expected = baseline.get(case)
+        if expected is None:
+            regressions.append(f"{case}: no baseline entry (rerun with VEBGEN_PATCH_BENCHMARK_FULL=1 VEBGEN_PATCH_BENCHMARK_UPDATE=1)")
+            continue
+        if actual["success_rate"] < expected["success_rate"]:
+            regressions.append(f"{case}: success rate {actual['success_rate']:.0%} < baseline {expected['success_rate']:.0%}")
+        if actual["layers"] != expected["layers"]:
+            regressions.append(f"{case}: layer hits {actual['layers']} != baseline {expected['layers']}")
+        allowed = max(expected["p95_s"] * LATENCY_REGRESSION_FACTOR, expected["p95_s"] + LATENCY_REGRESSION_SLACK_S)
+        if actual["p95_s"] > allowed:
+            regressions.append(f"{case}: p95 {actual['p95_s'] * 1000:.2f}ms > allowed {allowed * 1000:.2f}ms")
+    return regressions
+
+
+def test_patch_benchmark_against_baseline(tmp_path: Path):
+    """Runs the patch corpus, prints the report and fails on regressions against the baseline."""
+    full_run = os.environ.get("VEBGEN_PATCH_BENCHMARK_FULL") == "1"
+    sizes = list(DEFAULT_SIZES)
+    if full_run:
+        sizes.extend(FULL_SIZES)
+
+    results = _run_benchmark(tmp_path, sizes)
+    print("\n" + _format_report(results))
+
+    if os.environ.get("VEBGEN_PATCH_BENCHMARK_UPDATE") == "1":
+        BASELINE_PATH.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        pytest.skip(f"Baseline rewritten at {BASELINE_PATH}.")
+
+    baseline = json.loads(BASELINE_PATH.read_text(encoding="utf-8"))
+    regressions = _find_regressions(results, baseline)
+    assert not regressions, "Patch engine regressions:\n" + "\n".join(regressions)
+
+
+def test_regression_detection():
+    """The comparison flags missing cases, lower success rates, other layers and slower p95s, and tolerates noise."""
+    baseline = {"case": {"success_rate": 1.0, "layers": {}, "p50_s": 0.001, "p95_s": 0.002}}
+    assert not _find_regressions({"case": {"success_rate": 1.0, "layers": {}, "p50_s": 0.001, "p95_s": 0.004}}, baseline)
+    assert _find_regressions({"case": {"success_rate": 0.8, "layers": {}, "p50_s": 0.001, "p95_s": 0.002}}, baseline)
+    assert _find_regressions({"case": {"success_rate": 1.0, "layers": {}, "p50_s": 0.05, "p95_s": 0.05}}, baseline)
+    assert _find_regressions({"case": {"success_rate": 1.0, "layers": {"layer_1_exact": 1}, "p50_s": 0.001, "p95_s": 0.002}}, baseline)
+    assert _find_regressions({"other": {"success_rate": 1.0, "layers": {}, "p50_s": 0.001, "p95_s": 0.002}}, baseline)
+    assert not _find_regressions({}, baseline), "Baseline cases that were not run (e.g. full-run sizes) are not regressions."
@@ -1,4 +1,5 @@
 # backend/src/core/tests/test_performance_monitor.py
+import json
 import pytest
 import threading
 import time
@@ -153,4 +154,51 @@ class TestTimeFunctionDecorator:
         # The decorator should format the name as "ClassName.method_name"
         assert "MyClass.my_method" in performance_monitor.metrics
         metrics = performance_monitor.metrics["MyClass.my_method"]
-        assert metrics['calls'] == 1
\ No newline at end of file
+        assert metrics['calls'] == 1
+
+# --- Test Cases for Counters, Histograms and JSON Export ---
+
+class TestCountersAndHistograms:
+    """Tests for increment(), observe() and the JSON export."""
+
+    def test_increment_accumulates(self):
+        performance_monitor.increment("hits")
+        performance_monitor.increment("hits", 4)
+        assert performance_monitor.counters["hits"] == 5
+
+    def test_observe_buckets_by_lower_bound(self):
+        for value in (0.82, 0.825, 0.9, 0.0):
+            performance_monitor.observe("ratio", value, bucket_width=0.01)
+        buckets = performance_monitor.to_dict()["histograms"]["ratio"]["buckets"]
+        assert buckets == {"0": 1, "0.82": 2, "0.9": 1}
+
+    def test_disabled_monitor_does_not_count(self):
+        performance_monitor.enabled = False
+        performance_monitor.increment("hits")
+        performance_monitor.observe("ratio", 0.5)
+        assert not performance_monitor.counters
+        assert not performance_monitor.histograms
+
+    def test_export_json_round_trips(self, tmp_path):
+        performance_monitor.record("func", 0.5)
+        performance_monitor.increment("hits", 2)
+        performance_monitor.observe("ratio", 0.5, bucket_width=0.1)
+        out_path = tmp_path / "metrics" / "perf.json"
+
+        data = json.loads(performance_monitor.export_json(out_path))
+
+        assert json.loads(out_path.read_text(encoding="utf-8")) == data
+        assert data["timings"]["func"]["avg_time"] == pytest.approx(0.5)
+        assert data["counters"] == {"hits": 2}
+        assert data["histograms"]["ratio"] == {"bucket_width": 0.1, "buckets": {"0.5": 1}}
+
+    def test_reset_clears_counters_and_histograms(self):
+        performance_monitor.increment("hits")
+        performance_monitor.observe("ratio", 0.5)
+        performance_monitor.reset()
+        assert performance_monitor.to_dict() == {"timings": {}, "counters": {}, "histograms": {}}
+
+    def test_report_lists_counters(self):
+        performance_monitor.increment("patch.layer_1_exact.hits", 3)
+        assert "patch.layer_1_exact.hits" in performance_monitor.get_report()
+        assert "Count=3" in performance_monitor.get_report()
@@ -4,6 +4,7 @@ import pytest
 from pathlib import Path
 from src.core.file_system_manager import FileSystemManager
 from src.core.exceptions import PatchApplyError
+from src.core.performance_monitor import performance_monitor
 
 
 @pytest.fixture
@@ -102,4 +103,463 @@ def goodbye():
     error_msg = str(exc_info.value)
     assert "SearchReplaceNoExactMatch" in error_msg
     assert "similarity:" in error_msg
-    assert "Did you mean to match" in error_msg
\ No newline at end of file
+    assert "Did you mean to match" in error_msg
+
+def _random_file_lines(rng, count):
+    words = ["x", "y = 1", "return x", "pass", "", "def f():", "# note", "if a:"]
+    return [" " * rng.choice([0, 4, 8]) + rng.choice(words) for _ in range(count)]
+
+
+def test_line_index_matches_exhaustive_scans():
+    """The indexed layers 2-4 must pick the same window as a scan over every window."""
+    import random
+    from rapidfuzz import fuzz
+    from src.core.patch_matcher import LineIndex, strip_common_leading_whitespace
+
+    rng = random.Random(1234)
+    for _ in range(200):
+        lines = _random_file_lines(rng, rng.randint(5, 60))
+        start = rng.randrange(len(lines))
+        search_lines = lines[start:start + rng.randint(1, 6)]
+        search_lines = [
+            ("  " + line if rng.random() < 0.3 else line) if rng.random() < 0.8 else "mutated"
+            for line in search_lines
+        ]
+        search_block = "\n".join(search_lines)
+        index = LineIndex("\n".join(lines))
+        windows = range(len(lines) - len(search_lines) + 1)
+
+        expected_ws = next((i for i in windows if " ".join("\n".join(lines[i:i + len(search_lines)]).split())
+                            == " ".join(search_block.split())), None)
+        assert index.find_whitespace_insensitive(search_block) == expected_ws
+
+        expected_indent = next((i for i in windows if strip_common_leading_whitespace("\n".join(lines[i:i + len(search_lines)]))
+                                == strip_common_leading_whitespace(search_block)), None)
+        assert index.find_indentation_preserving(search_block) == expected_indent
+
+        best_idx, best_ratio = -1, 0.0
+        for i in windows:
+            ratio = fuzz.ratio(search_lines, lines[i:i + len(search_lines)]) / 100.0
+            if ratio > best_ratio:
+                best_idx, best_ratio = i, ratio
+        found_idx, found_ratio = index.find_fuzzy(search_lines, 0.6)
+        if best_ratio >= 0.6:
+            assert (found_idx, found_ratio) == (best_idx, best_ratio)
+        else:
+            assert found_ratio < 0.6
+
+
+def test_fuzzy_match_in_large_file(fs_manager: FileSystemManager):
+    """Layer 4 locates a slightly wrong SEARCH block in a 5,000-line file."""
+    body = "\n".join(f"def func_{i}(a, b):\n    return a + b + {i}\n" for i in range(1700))
+    fs_manager.write_file("big.py", body)
+
+    patch = """<<<<<<< SEARCH
+def func_1234(a, b):
+    return a + b + 1234
+
+def func_1235(a, b):
+    return a + b + 9999
+
+def func_1236(a, b):
+    return a + b + 1236
+=======
+def func_1234(a, b):
+    return a - b
+>>>>>>> REPLACE"""
+
+    fs_manager.apply_patch("big.py", patch)
+
+    result = fs_manager.read_file("big.py")
+    assert "def func_1234(a, b):\n    return a - b\n" in result
+    assert "def func_1235" not in result
+    assert "def func_1237(a, b):" in result
+
+
+def test_independent_blocks_are_applied_in_one_pass(fs_manager: FileSystemManager, monkeypatch):
+    """Independent blocks are located against the original file and spliced in once."""
+    fs_manager.write_file("views.py", "\n".join(f"def view_{i}():\n    return {i}\n" for i in range(50)))
+    patch = "\n\n".join(
+        f"<<<<<<< SEARCH\ndef view_{i}():\n    return {i}\n=======\ndef view_{i}():\n    return -{i}\n>>>>>>> REPLACE"
+        for i in (40, 3, 17)
+    )
+    monkeypatch.setattr(fs_manager, "_apply_single_search_replace",
+                        lambda *a, **k: pytest.fail("blocks were applied sequentially"))
+
+    fs_manager.apply_patch("views.py", patch)
+
+    result = fs_manager.read_file("views.py")
+    for i in (3, 17, 40):
+        assert f"def view_{i}():\n    return -{i}\n" in result
+    assert "def view_4():\n    return 4\n" in result
+
+
+def test_dependent_blocks_fall_back_to_sequential(fs_manager: FileSystemManager):
+    """A block that edits the output of an earlier block is applied after it."""
+    fs_manager.write_file("settings.py", "DEBUG = True\nALLOWED_HOSTS = []\n")
+    patch = """<<<<<<< SEARCH
+DEBUG = True
+=======
+DEBUG = False
+>>>>>>> REPLACE
+
+<<<<<<< SEARCH
+DEBUG = False
+=======
+DEBUG = env("DEBUG")
+>>>>>>> REPLACE"""
+
+    fs_manager.apply_patch("settings.py", patch)
+
+    assert fs_manager.read_file("settings.py") == 'DEBUG = env("DEBUG")\nALLOWED_HOSTS = []\n'
+
+
+def test_unmatched_block_fails_from_the_plan_without_rerunning(fs_manager: FileSystemManager, monkeypatch):
+    """A block the plan cannot locate is reported directly instead of re-running the patch sequentially."""
+    fs_manager.write_file("settings.py", "DEBUG = True\nALLOWED_HOSTS = []\n")
+    patch = """<<<<<<< SEARCH
+DEBUG = True
+=======
+DEBUG = False
+>>>>>>> REPLACE
+
+<<<<<<< SEARCH
+SECRET_KEY = "dev"
+=======
+SECRET_KEY = env("SECRET_KEY")
+>>>>>>> REPLACE"""
+    monkeypatch.setattr(fs_manager, "_apply_single_search_replace",
+                        lambda *a, **k: pytest.fail("the patch was re-run sequentially"))
+    performance_monitor.reset()
+
+    with pytest.raises(PatchApplyError, match="block #2 of 2 failed to match"):
+        fs_manager.apply_patch("settings.py", patch)
+
+    counters = performance_monitor.to_dict()["counters"]
+    performance_monitor.reset()
+    assert counters["patch.layer_1_exact.hits"] == 1
+    assert counters["patch.all_layers_failed"] == 1
+    assert fs_manager.read_file("settings.py") == "DEBUG = True\nALLOWED_HOSTS = []\n"
+
+
+def test_repeated_search_blocks_target_successive_occurrences(fs_manager: FileSystemManager):
+    """Two identical SEARCH blocks overlap in the original, so they replace the first two occurrences in turn."""
+    fs_manager.write_file("a.py", "x = 1\nx = 1\nx = 1\n")
+    patch = """<<<<<<< SEARCH
+x = 1
+=======
+x = 2
+>>>>>>> REPLACE
+
+<<<<<<< SEARCH
+x = 1
+=======
+x = 3
+>>>>>>> REPLACE"""
+
+    fs_manager.apply_patch("a.py", patch)
+
+    assert fs_manager.read_file("a.py") == "x = 2\nx = 3\nx = 1\n"
+
+
+STRUCTURAL_MODELS_PY = '''from django.db import models
+
+
+class Order(models.Model):
+    total = models.DecimalField(max_digits=8, decimal_places=2)
+
+    def save(self, *args, **kwargs):
+        self.total = self.compute_total()
+        super().save(*args, **kwargs)
+
+    def compute_total(self):
+        return sum(item.price * item.quantity for item in self.items.all())
+
+
+class Invoice(models.Model):
+    number = models.CharField(max_length=20)
+
+    @property
+    def label(self):
+        prefix = "INV"
+        year = self.created.year
+        return f"{prefix}-{year}-{self.number}"
+'''
+
+
+def test_structural_layer_replaces_stale_definition(fs_manager: FileSystemManager):
+    """Layer 5 finds a function by name when its SEARCH copy is too stale for the fuzzy layer."""
+    fs_manager.write_file("shop/models.py", STRUCTURAL_MODELS_PY)
+    patch = """<<<<<<< SEARCH
+    @property
+    def label(self):
+        prefix = "INV"
+        return f"{prefix}-{self.number}"
+=======
+    @property
+    def label(self):
+        return f"INV-{self.number}"
+>>>>>>> REPLACE"""
+
+    fs_manager.apply_patch("shop/models.py", patch)
+
+    result = fs_manager.read_file("shop/models.py")
+    assert '        return f"INV-{self.number}"\n' in result
+    assert "year = self.created.year" not in result
+    assert "def compute_total(self):" in result
+
+
+def test_structural_layer_prefers_matching_signature(fs_manager: FileSystemManager):
+    """Among same-named methods, the one whose signature matches the SEARCH header is patched."""
+    fs_manager.write_file("services.py", '''class A:
+    def run(self):
+        step_one()
+        step_two()
+        step_three()
+        return "a"
+
+
+class B:
+    def run(self, force=False):
+        step_one()
+        step_two()
+        step_three()
+        return "b"
+''')
+    patch = """<<<<<<< SEARCH
+def run(self, force=False):
+    step_1()
+    step_2()
+    return "b"
+=======
+def run(self, force=False):
+    return "patched"
+>>>>>>> REPLACE"""
+
+    fs_manager.apply_patch("services.py", patch)
+
+    result = fs_manager.read_file("services.py")
+    assert 'class B:\n    def run(self, force=False):\n        return "patched"\n' in result
+    assert 'return "a"' in result
+
+
+def test_structural_layer_refuses_ambiguous_methods(fs_manager: FileSystemManager):
+    """A SEARCH body matching neither of two same-named methods fails instead of overwriting one of them."""
+    models_py = '''class Order:
+    def __str__(self):
+        return f"Order {self.pk}"
+
+
+class Invoice:
+    def __str__(self):
+        return f"Invoice {self.pk}"
+'''
+    fs_manager.write_file("models.py", models_py)
+    patch = """<<<<<<< SEARCH
+def __str__(self):
+    return self.title
+=======
+def __str__(self):
+    return self.name
+>>>>>>> REPLACE"""
+
+    with pytest.raises(PatchApplyError):
+        fs_manager.apply_patch("models.py", patch)
+    assert fs_manager.read_file("models.py") == models_py
+
+
+def test_structural_layer_narrows_candidates_by_nested_definitions():
+    """Definitions nested under the SEARCH header select the candidate with the same qualified children."""
+    from src.core.patch_matcher import LineIndex
+
+    index = LineIndex('''class Report:
+    class Admin:
+        label = "admin"
+
+        def render(self):
+            return "report"
+
+
+class Summary:
+    class Admin:
+        label = "admin"
+
+        def total(self):
+            return 0
+''')
+    search_lines = ["class Admin:", "    label = 'admin'", "", "    def total(self):", "        return 1"]
+    match = index.find_python_structural(search_lines, 0.75)
+    assert match is not None and match.qualname == "Summary.Admin"
+    # Without the nested method, both Admin classes score alike and the match is refused.
+    assert index.find_python_structural(search_lines[:2], 0.75) is None
+
+
+def test_syntax_error_is_rejected_before_writing(fs_manager: FileSystemManager, monkeypatch):
+    """An invalid Python result is caught in memory; the file is never written."""
+    fs_manager.write_file("test.py", "def hello():\n    return 1\n")
+    monkeypatch.setattr(fs_manager, "write_file", lambda *a, **k: pytest.fail("invalid content was written"))
+    patch = """<<<<<<< SEARCH
+    return 1
+=======
+    return (1
+>>>>>>> REPLACE"""
+
+    with pytest.raises(PatchApplyError, match="Patch created syntax error"):
+        fs_manager.apply_patch("test.py", patch)
+
+
+def test_compile_only_errors_are_checked_when_the_patch_adds_them(fs_manager: FileSystemManager, monkeypatch):
+    """A bytecode compile runs only if the patch adds a construct the parser does not check."""
+    import builtins
+    fs_manager.write_file("test.py", "def hello():\n    return 1\n\nx = 1\n")
+    compiles = []
+    real_compile = builtins.compile
+    monkeypatch.setattr(builtins, "compile", lambda *args, **kwargs: compiles.append(kwargs.get("flags", 0)) or real_compile(*args, **kwargs))
+
+    fs_manager.apply_patch("test.py", "<<<<<<< SEARCH\n    return 1\n=======\n    return 2\n>>>>>>> REPLACE")
+    assert len(compiles) == 1, "Swapping one return for another needs no bytecode compile."
+
+    with pytest.raises(PatchApplyError, match="'return' outside function"):
+        fs_manager.apply_patch("test.py", "<<<<<<< SEARCH\nx = 1\n=======\nreturn x\n>>>>>>> REPLACE")
+    assert fs_manager.read_file("test.py") == "def hello():\n    return 2\n\nx = 1\n"
+
+
+def test_patch_returns_validated_ast(fs_manager: FileSystemManager):
+    """The module parsed during validation is handed back for reuse."""
+    fs_manager.write_file("test.py", "def hello():\n    return 1\n")
+    patch = """<<<<<<< SEARCH
+    return 1
+=======
+    return 2
+>>>>>>> REPLACE"""
+
+    diff_data = fs_manager.apply_patch("test.py", patch)
+
+    assert diff_data["write_event"].parsed_ast.body[0].name == "hello"
+    assert fs_manager.read_file("test.py") == "def hello():\n    return 2\n"
+
+
+def test_json_and_template_regressions_are_rejected(fs_manager: FileSystemManager):
+    """JSON and Django templates that were valid must stay valid."""
+    fs_manager.write_file("package.json", '{\n  "name": "app",\n  "private": true\n}\n')
+    fs_manager.write_file("base.html", "{% block content %}\n<p>Hi</p>\n{% endblock %}\n")
+
+    with pytest.raises(PatchApplyError, match="invalid JSON"):
+        fs_manager.apply_patch("package.json", '<<<<<<< SEARCH\n  "private": true\n=======\n  "private": true,\n>>>>>>> REPLACE')
+    with pytest.raises(PatchApplyError, match="unbalanced template tags: block"):
+        fs_manager.apply_patch("base.html", "<<<<<<< SEARCH\n{% endblock %}\n=======\n\n>>>>>>> REPLACE")
+
+    assert fs_manager.read_file("package.json").endswith('"private": true\n}\n')
+    assert fs_manager.read_file("base.html").endswith("{% endblock %}\n")
+
+
+def test_layer_outcomes_are_recorded_as_metrics(fs_manager: FileSystemManager):
+    """Each block records per-layer timings, its hit, the fuzzy ratio and the edit size."""
+    performance_monitor.reset()
+    fs_manager.write_file("test.py", 'def hello():\n    """Say hello."""\n    x = 1\n    y = 2\n    z = 3\n    return "world"\n')
+
+    fs_manager.apply_patch("test.py", """<<<<<<< SEARCH
+def hello():
+    \"\"\"Say hi.\"\"\"
+    x = 1
+    y = 2
+    z = 3
+    return "world"
+=======
+def hello():
+    return "universe"
+>>>>>>> REPLACE""")
+    with pytest.raises(PatchApplyError):
+        fs_manager.apply_patch("test.py", "<<<<<<< SEARCH\nnot in the file\n=======\nx\n>>>>>>> REPLACE")
+
+    metrics = performance_monitor.to_dict()
+    performance_monitor.reset()
+    assert metrics["counters"]["patch.layer_4_fuzzy.hits"] == 1
+    assert metrics["counters"]["patch.all_layers_failed"] == 1
+    assert "patch.layer_1_exact.hits" not in metrics["counters"]
+    assert metrics["counters"]["patch.chars_inserted"] == len('def hello():\n    return "universe"')
+    assert metrics["timings"]["patch.layer_1_exact"]["calls"] == 2
+    assert metrics["timings"]["patch.layer_4_fuzzy"]["calls"] == 2
+    assert sum(metrics["histograms"]["patch.layer_4_fuzzy.best_ratio"]["buckets"].values()) >= 1
+
+
+def test_metrics_count_only_the_pass_that_decided_the_outcome(fs_manager: FileSystemManager):
+    """An abandoned plan is not counted, and edits that were never written add no edit size."""
+    performance_monitor.reset()
+    fs_manager.write_file("test.py", "a = 1\nb = 2\nc = 3\n")
+
+    # Both blocks are located by the plan, but they overlap: the second one fails after the first.
+    with pytest.raises(PatchApplyError):
+        fs_manager.apply_patch("test.py", """<<<<<<< SEARCH
+a = 1
+b = 2
+=======
+a = 10
+>>>>>>> REPLACE
+
+<<<<<<< SEARCH
+b = 2
+c = 3
+=======
+c = 30
+>>>>>>> REPLACE""")
+
+    metrics = performance_monitor.to_dict()
+    performance_monitor.reset()
+    assert metrics["counters"]["patch.layer_1_exact.hits"] == 1
+    assert metrics["counters"]["patch.all_layers_failed"] == 1
+    assert "patch.chars_replaced" not in metrics["counters"]
+    assert "patch.chars_inserted" not in metrics["counters"]
+    assert fs_manager.read_file("test.py") == "a = 1\nb = 2\nc = 3\n"
+
+
+def test_failed_block_reuses_fuzzy_candidates_for_suggestion(fs_manager: FileSystemManager, monkeypatch):
+    """The error suggestion for an unmatched block rescans only layer 4's candidates, or the file if it had none."""
+    from src.core.patch_matcher import LineIndex
+
+    fs_manager.write_file("test.py", "x = 0\nw = 0\na = 1\nb = 2\nc = 3\nd = 4\ne = 5\nf = 6\n")
+    scans = []
+    original_score_windows = LineIndex._score_windows
+    monkeypatch.setattr(
+        LineIndex, "_score_windows",
+        lambda self, *args, **kwargs: scans.append((list(args[1]), kwargs.get("min_ratio", 0.0))) or original_score_windows(self, *args, **kwargs),
+    )
+
+    # Close to lines 3-8, but below the threshold. Its edited lines occur elsewhere, so it has fuzzy candidates.
+    near_miss = "a = 1\nb = 2\nx = 0\nd = 4\nw = 0\nf = 6"
+    with pytest.raises(PatchApplyError) as exc_info:
+        fs_manager.apply_patch("test.py", f"<<<<<<< SEARCH\n{near_miss}\n=======\npass\n>>>>>>> REPLACE")
+    assert "a = 1\nb = 2\nc = 3" in str(exc_info.value)
+    (matching_windows, matching_cutoff), (suggestion_windows, suggestion_cutoff) = scans
+    assert matching_cutoff == FileSystemManager.FUZZY_MATCH_THRESHOLD and suggestion_cutoff == 0.0
+    assert suggestion_windows == matching_windows
+
+    scans.clear()
+    missing = "no = 1\nsuch = 2\nlines = 3"  # No line occurs verbatim, so layer 4 scores nothing.
+    with pytest.raises(PatchApplyError) as exc_info:
+        fs_manager.apply_patch("test.py", f"<<<<<<< SEARCH\n{missing}\n=======\npass\n>>>>>>> REPLACE")
+    assert "(similarity: 0.0%)" in str(exc_info.value)
+    assert len(scans) == 1
+
+
+def test_fuzzy_scan_abandons_windows_below_the_threshold():
+    """Layer 4 only reports windows that reach the threshold; the nearest miss comes from closest_window."""
+    from src.core.patch_matcher import LineIndex
+
+    search_lines = ["a", "b", "x", "y", "z"]
+    assert LineIndex("a\nb\nc\nd\ne").find_fuzzy(search_lines, 0.2) == (0, 0.4)
+
+    index = LineIndex("a\nb\nc\nd\ne")
+    assert index.find_fuzzy(search_lines, 0.82) == (-1, 0.0)
+    assert index.closest_window(search_lines) == (0, 0.4)
+
+
+def test_closest_window_respects_the_scan_budget():
+    """Without fuzzy candidates to reuse, the suggestion scan stops once its line budget is spent."""
+    from src.core.patch_matcher import LineIndex
+
+    index = LineIndex("\n".join(["a", "b", "c", "d", "e", "target one", "target two"]))
+    search_lines = ["target one", "target 2"]
+
+    assert index.closest_window(search_lines) == (4, 0.5)
+    assert index.closest_window(search_lines, budget=2 * 3) == (-1, 0.0)
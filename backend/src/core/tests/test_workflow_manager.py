@@ -56,7 +56,10 @@ def mock_command_executor():
 @pytest.fixture
 def mock_code_intelligence_service():
     """Mocks the CodeIntelligenceService."""
-    return MagicMock(spec=CodeIntelligenceService)
+    mock = MagicMock(spec=CodeIntelligenceService)
+    # Batch parsing goes through the (mocked) `parse_file`, so tests can stub that alone.
+    mock.parse_files_in_parallel.side_effect = lambda files, **kwargs: {path: mock.parse_file(path, content) for path, content in files.items()}
+    return mock
 
 @pytest.fixture
 def workflow_manager(
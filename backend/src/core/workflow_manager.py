@@ -58,6 +58,8 @@ MAX_REMEDIATION_ATTEMPTS_FOR_TASK = 2 # Max attempts for a task to be remediated
 MAX_VALIDATION_ATTEMPTS = 2     # Max attempts to validate a task before failing
 LOG_PROMPT_SUMMARY_LENGTH = 200 # Max length for logging prompt summaries
 MAX_FEATURE_TEST_ATTEMPTS = 3   # Max attempts to generate and pass feature-level tests
+INITIAL_SCAN_MAX_WORKERS = None # Worker processes for the initial project scan (None: one per CPU core)
+INITIAL_SCAN_CHUNK_SIZE = 16    # Files sent to a scan worker at a time
 
 
 logger = logging.getLogger(__name__)
@@ -187,6 +189,8 @@ class WorkflowManager:
         self.default_case_temperature = default_case_temperature
         self.ui_communicator = ui_communicator
         self.code_intelligence_service = CodeIntelligenceService(self.file_system_manager.project_root)
+        # Files deleted through the manager (including by rollbacks) are dropped from the parse caches.
+        self.file_system_manager.add_file_removed_listener(self.code_intelligence_service.handle_file_removed)
         # --- NEW: Event for graceful shutdown ---
         self.stop_event_thread = threading.Event()
         self.stop_event = asyncio.Event()
@@ -266,11 +270,15 @@ class WorkflowManager:
             project_root = Path(self.project_state.root_path)
             file_summaries: Dict[str, str] = {}
 
+            # All tree scans go through the shared project file index.
+            file_index = self.file_system_manager.file_index
+            file_index.ensure_fresh()
+
             # Step 1: Scan Python files
             self.logger.info("Step 1/5: Scanning Python files...")
             python_files = [
-                f for f in project_root.rglob("*.py")
-                if not any(part in f.parts for part in ['venv', 'env', '.venv', '__pycache__', 'node_modules'])
+                project_root / rel_path
+                for rel_path in file_index.files(suffixes={".py"}, excluded_dirs={'env'})
             ]
             self.logger.info(f"Found {len(python_files)} Python files to analyze.")
 
@@ -278,29 +286,32 @@ class WorkflowManager:
             self.logger.info("Step 1.5/5: Scanning frontend files (HTML/CSS/JS)...")
             
             # Find HTML, CSS, and JS files, excluding common ignored directories
+            # (the index itself never contains node_modules, venv, .venv, __pycache__ or .git).
             excluded_dirs_for_scan = ['node_modules', 'venv', 'env', '.venv', '__pycache__', '.git', 'dist', 'build']
             
-            html_files = [f for f in project_root.rglob('*.html') if not any(part in f.parts for part in excluded_dirs_for_scan)]
-            css_files = [f for f in project_root.rglob('*.css') if not any(part in f.parts for part in excluded_dirs_for_scan)]
+            html_files = [project_root / p for p in file_index.files(suffixes={".html"}, excluded_dirs=excluded_dirs_for_scan)]
+            css_files = [project_root / p for p in file_index.files(suffixes={".css"}, excluded_dirs=excluded_dirs_for_scan)]
 
             # --- FIX: Intelligent JS file filtering to avoid large/minified/vendor files ---
             js_files = []
             # Add Django admin static files to the exclusion list for JS
             js_excluded_dirs = excluded_dirs_for_scan + ['staticfiles/admin', 'vendor', 'libs', 'library']
             
-            for js_file in project_root.rglob('**/*.js'):
+            for rel_js_path in file_index.files(suffixes={".js"}):
+                js_file = project_root / rel_js_path
                 # Skip if in an excluded directory
                 if any(excluded_dir in str(js_file) for excluded_dir in js_excluded_dirs):
                     continue
                 
                 # Skip minified files
                 if '.min.js' in js_file.name:
-                    logger.debug(f"Skipping minified JS file: {js_file.relative_to(project_root)}")
+                    logger.debug(f"Skipping minified JS file: {rel_js_path}")
                     continue
                 
                 # Skip very large files (>100KB is a good heuristic for vendor code)
-                if js_file.stat().st_size > 100_000:
-                    logger.debug(f"Skipping large JS file ({js_file.stat().st_size / 1024:.1f} KB): {js_file.relative_to(project_root)}")
+                js_size = file_index.get(rel_js_path).size
+                if js_size > 100_000:
+                    logger.debug(f"Skipping large JS file ({js_size / 1024:.1f} KB): {rel_js_path}")
                     continue
                 
                 js_files.append(js_file)
@@ -309,23 +320,36 @@ class WorkflowManager:
             all_files_to_scan = python_files + html_files + css_files + js_files
             logger.info(f"Found {len(html_files)} HTML, {len(css_files)} CSS, {len(js_files)} JS files. Total files to scan: {len(all_files_to_scan)}")
 
-            # Step 2: Parse each file and store FULL AST DATA
-            for idx, file_path in enumerate(all_files_to_scan, 1):
+            # Step 2: Parse every file (in worker processes, as parsing is CPU-bound) and store FULL AST DATA
+            file_contents: Dict[str, str] = {}
+            for file_path in all_files_to_scan:
+                relative_path = str(file_path.relative_to(project_root))
                 try:
-                    relative_path = str(file_path.relative_to(project_root))
-
-                    # Use CodeIntelligenceService to parse the file
                     file_content = self.file_system_manager.read_file(relative_path)
-                    if file_content is None:
-                        self.logger.warning(f"Skipping empty or unreadable file: {relative_path}")
-                        continue
+                except Exception as e:
+                    self.logger.warning(f"Failed to read file {file_path}: {e}")
+                    continue
+                if file_content is None:
+                    self.logger.warning(f"Skipping empty or unreadable file: {relative_path}")
+                    continue
+                file_contents[relative_path] = file_content
+
+            parsed_files = self.code_intelligence_service.parse_files_in_parallel(
+                file_contents,
+                max_workers=INITIAL_SCAN_MAX_WORKERS,
+                use_processes=True,
+                chunk_size=INITIAL_SCAN_CHUNK_SIZE,
+            )
 
+            # Merge the results in scan order.
+            for idx, relative_path in enumerate(file_contents, 1):
+                try:
                     # --- NEW: Add progress indicator logging ---
-                    if idx % 10 == 0 or idx == len(all_files_to_scan):
-                        progress_pct = (idx / len(all_files_to_scan)) * 100
-                        logger.info(f"Scan Progress: {idx}/{len(all_files_to_scan)} files parsed ({progress_pct:.1f}%).")
+                    if idx % 10 == 0 or idx == len(file_contents):
+                        progress_pct = (idx / len(file_contents)) * 100
+                        logger.info(f"Scan Progress: {idx}/{len(file_contents)} files merged ({progress_pct:.1f}%).")
 
-                    file_info = self.code_intelligence_service.parse_file(relative_path, file_content)
+                    file_info = parsed_files.get(relative_path)
 
                     if file_info:
                         # Update the project structure map with the detailed parsed info
@@ -346,7 +370,7 @@ class WorkflowManager:
                         self.logger.debug(f"Parsed: {summary}")
 
                 except Exception as e:
-                    self.logger.warning(f"Failed to parse file {file_path}: {e}")
+                    self.logger.warning(f"Failed to process parsed file {relative_path}: {e}")
                     continue
             
             # === END NEW/MODIFIED SECTION ===
@@ -1053,6 +1077,11 @@ class WorkflowManager:
         
         # --- NEW: Log performance report at the end of the workflow ---
         performance_monitor.log_report()
+        # Keep the raw counters and histograms (e.g. patch layer hits and fuzzy ratios) for offline tuning.
+        try:
+            performance_monitor.export_json(self.file_system_manager.project_root / ".vebgen" / "performance_metrics.json")
+        except OSError as e:
+            logger.warning(f"Could not export performance metrics: {e}")
         performance_monitor.reset() # Reset for the next run
 
         # Other helper methods like get_current_state_for_ui, save_project_state, etc. can remain.
@@ -1,6 +1,7 @@
 # backend/src/main.py
 import sys
 import logging
+import multiprocessing
 import platform
 import customtkinter as ctk
 from pathlib import Path # For potential log file path manipulation
@@ -122,6 +123,10 @@ def main():
 
 # --- Standard Python Entry Point Check ---
 if __name__ == "__main__":
+    # In the frozen (PyInstaller) build, a spawned worker process (e.g. the initial
+    # scan's parse pool) re-runs this executable; this hands it over to its worker
+    # task instead of starting another GUI. It does nothing when not frozen.
+    multiprocessing.freeze_support()
     # This ensures the main() function runs only when the script is executed directly
     # (not when imported as a module).
     main()